@@ -40,11 +40,15 @@ INSTALLED_APPS = [
     "reviews",
     "blog",
     "salesreport",
+    "jobs",
+    "emails",
 ]
 # Application definition
 
 
 MIDDLEWARE = [
+    # disabled unless PROFILING_ENABLED
+    "utils.profiling.QueryProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -93,6 +97,124 @@ else:
         )
     }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory is per process, use a shared backend (redis, memcached, database)
+# when running several workers so catalog invalidations reach all of them.
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default="avoberry"),
+    }
+}
+
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TIMEOUT = config("CATALOG_CACHE_TIMEOUT", cast=int, default=60 * 60)
+
+# Product search index, kept in memory by every process. A catalog change made
+# elsewhere is picked up by a background rebuild, at most once per interval
+# (seconds), the stale index keeps serving the searches meanwhile.
+SEARCH_INDEX_REBUILD_INTERVAL = config(
+    "SEARCH_INDEX_REBUILD_INTERVAL", cast=int, default=60
+)
+
+# Analytics dashboard snapshot, refreshed by the jobs worker once it is older
+# than this (seconds). Needs a shared cache backend to be seen by every worker.
+ANALYTICS_CACHE_ALIAS = "default"
+ANALYTICS_SNAPSHOT_TTL = config("ANALYTICS_SNAPSHOT_TTL", cast=int, default=5 * 60)
+
+# Admin dashboard metrics, also dropped when orders or customers are created
+DASHBOARD_METRICS_CACHE_ALIAS = "default"
+DASHBOARD_METRICS_TIMEOUT = config(
+    "DASHBOARD_METRICS_TIMEOUT", cast=int, default=60 * 60
+)
+
+# Active carts are kept in the cache and written to the database by a
+# `carts.flush` job this many seconds after the first unsaved change. The
+# cache must be shared by the web and jobs processes and outlive the debounce,
+# evicted carts lose changes. Off with a per-process backend (local memory),
+# carts are then written to the database on every change.
+CART_STORE_CACHE_ALIAS = "default"
+CART_WRITE_BEHIND = config(
+    "CART_WRITE_BEHIND",
+    cast=bool,
+    default=not CACHES["default"]["BACKEND"].endswith(("LocMemCache", "DummyCache")),
+)
+CART_STORE_TIMEOUT = config("CART_STORE_TIMEOUT", cast=int, default=7 * 24 * 60 * 60)
+CART_FLUSH_DEBOUNCE = config("CART_FLUSH_DEBOUNCE", cast=int, default=30)
+
+# Mercado Pago client, shared by every request of a worker process. The API
+# URL can point to a local fake gateway in development.
+MERCADO_PAGO_API_URL = config(
+    "MERCADO_PAGO_API_URL", default="https://api.mercadopago.com"
+)
+MERCADO_PAGO_CONNECT_TIMEOUT = config(
+    "MERCADO_PAGO_CONNECT_TIMEOUT", cast=float, default=3.05
+)
+MERCADO_PAGO_READ_TIMEOUT = config("MERCADO_PAGO_READ_TIMEOUT", cast=float, default=10)
+MERCADO_PAGO_MAX_RETRIES = config("MERCADO_PAGO_MAX_RETRIES", cast=int, default=2)
+MERCADO_PAGO_RETRY_BACKOFF = config(
+    "MERCADO_PAGO_RETRY_BACKOFF", cast=float, default=0.3
+)
+# seconds since the first attempt after which a call is not retried anymore
+MERCADO_PAGO_RETRY_BUDGET = config("MERCADO_PAGO_RETRY_BUDGET", cast=float, default=15)
+MERCADO_PAGO_POOL_SIZE = config("MERCADO_PAGO_POOL_SIZE", cast=int, default=10)
+
+# Outbox (emails app): emails are sent by the jobs worker in batches of this
+# size over one SMTP connection. Failed sends are retried after
+# EMAIL_OUTBOX_RETRY_BACKOFF seconds, doubled on every attempt.
+EMAIL_OUTBOX_BATCH_SIZE = config("EMAIL_OUTBOX_BATCH_SIZE", cast=int, default=100)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config("EMAIL_OUTBOX_MAX_ATTEMPTS", cast=int, default=5)
+EMAIL_OUTBOX_RETRY_BACKOFF = config(
+    "EMAIL_OUTBOX_RETRY_BACKOFF", cast=float, default=60
+)
+
+# Newsletter broadcasts (emails app) stream the recipients in chunks of
+# BROADCAST_CHUNK_SIZE and send at most BROADCAST_RATE_LIMIT emails per
+# second, 0 for no limit. The SMTP connection is renewed every
+# BROADCAST_MESSAGES_PER_CONNECTION emails and a job hands the rest of the
+# broadcast over to a new job after BROADCAST_TIME_LIMIT seconds.
+BROADCAST_CHUNK_SIZE = config("BROADCAST_CHUNK_SIZE", cast=int, default=2000)
+BROADCAST_RATE_LIMIT = config("BROADCAST_RATE_LIMIT", cast=float, default=10)
+BROADCAST_MESSAGES_PER_CONNECTION = config(
+    "BROADCAST_MESSAGES_PER_CONNECTION", cast=int, default=100
+)
+BROADCAST_TIME_LIMIT = config("BROADCAST_TIME_LIMIT", cast=int, default=5 * 60)
+
+# Mercado Pago notifications are processed by the jobs worker, a failing one
+# is retried this many times in total before the event is marked FAILED
+PAYMENT_EVENT_MAX_ATTEMPTS = config("PAYMENT_EVENT_MAX_ATTEMPTS", cast=int, default=5)
+
+# Per request SQL profiling, see /api/v2/dashboard/profiling/
+PROFILING_ENABLED = config("PROFILING_ENABLED", cast=bool, default=False)
+# requests running more queries are logged, 0 disables the warning
+PROFILING_QUERY_BUDGET = config("PROFILING_QUERY_BUDGET", cast=int, default=0)
+# a query repeated this many times in a request is reported as N+1
+PROFILING_DUPLICATE_THRESHOLD = config(
+    "PROFILING_DUPLICATE_THRESHOLD", cast=int, default=3
+)
+# requests kept per endpoint for the percentiles
+PROFILING_WINDOW = config("PROFILING_WINDOW", cast=int, default=500)
+
+# Bulk imports commit every N rows instead of holding one long transaction
+ORDERS_IMPORT_CHUNK_SIZE = config("ORDERS_IMPORT_CHUNK_SIZE", cast=int, default=1000)
+USERS_IMPORT_CHUNK_SIZE = config("USERS_IMPORT_CHUNK_SIZE", cast=int, default=1000)
+# processes hashing the passwords of imported users, 1 hashes them in-process
+USERS_IMPORT_HASH_WORKERS = config(
+    "USERS_IMPORT_HASH_WORKERS", cast=int, default=os.cpu_count() or 1
+)
+
+# Background jobs (python manage.py run_jobs)
+JOBS_WORKERS = config("JOBS_WORKERS", cast=int, default=2)
+JOBS_POLL_INTERVAL = config("JOBS_POLL_INTERVAL", cast=float, default=2.0)
+# RUNNING jobs without a heartbeat for this long are considered abandoned by a
+# dead worker
+JOBS_STALE_AFTER = config("JOBS_STALE_AFTER", cast=int, default=60 * 60)
+# seconds before the first retry of a failed job, doubled on every attempt
+JOBS_RETRY_BACKOFF = config("JOBS_RETRY_BACKOFF", cast=float, default=30)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -154,7 +276,8 @@ REST_FRAMEWORK = {
 }
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
+# Bigger uploads are spooled to a temp file, imports stream them from disk
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
 
 
 SIMPLE_JWT = {
@@ -4,6 +4,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.static import serve
 
+from utils.profiling import ProfilingStatsAPIView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/v2/", include("users.urls")),
@@ -16,6 +18,9 @@ urlpatterns = [
     path("api/v2/", include("reviews.urls")),
     path("api/v2/", include("blog.urls")),
     path("api/v2/", include("salesreport.urls")),
+    path("api/v2/", include("jobs.urls")),
+    path("api/v2/", include("emails.urls")),
+    path("api/v2/dashboard/profiling/", ProfilingStatsAPIView.as_view()),
 ]
 
 if settings.DEBUG:
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CartsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "carts"
+
+    def ready(self):
+        # Drop cached carts and order hashes when their rows change
+        import carts.signals
+
+        # Write-behind carts need a shared cache
+        import carts.checks
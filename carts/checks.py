@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from carts.services.cart_store import cache_is_shared, get_cart_cache_alias
+
+
+@register(Tags.caches)
+def check_cart_store_cache(app_configs, **kwargs):
+    """
+    Write-behind carts need a cache shared by the web and jobs processes, a
+    per-process cache keeps a different cart in each worker and the
+    `carts.flush` job finds nothing to write.
+    """
+    alias = get_cart_cache_alias()
+    if not getattr(settings, "CART_WRITE_BEHIND", False) or cache_is_shared(alias):
+        return []
+    return [
+        Error(
+            f"CART_WRITE_BEHIND needs a shared cache, the '{alias}' cache is "
+            f"local to each process ({settings.CACHES[alias]['BACKEND']}).",
+            hint="Set CACHE_BACKEND to a shared backend (redis, memcached, "
+            "database) or CART_WRITE_BEHIND=False.",
+            id="carts.E001",
+        )
+    ]
@@ -0,0 +1,7 @@
+from carts.services.cart_store import CartStore
+from jobs.services.job_queue import job_handler
+
+
+@job_handler("carts.flush")
+def flush_cart(job):
+    return {"products": CartStore().flush(job.payload["cart"])}
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:51
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicated_items(apps, schema_editor):
+    """
+    Keeps the oldest row of every (cart, product) pair with the summed
+    quantity, so the unique constraint can be created.
+    """
+    ProductCart = apps.get_model("carts", "ProductCart")
+    duplicated = (
+        ProductCart.objects.values("cart_id", "product_id")
+        .annotate(rows=Count("id"), keep=Min("id"), quantity=Sum("quantity"))
+        .filter(rows__gt=1)
+    )
+    for group in list(duplicated):
+        ProductCart.objects.filter(pk=group["keep"]).update(quantity=group["quantity"])
+        ProductCart.objects.filter(
+            cart_id=group["cart_id"], product_id=group["product_id"]
+        ).exclude(pk=group["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("carts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicated_items, migrations.RunPython.noop),
+    ]
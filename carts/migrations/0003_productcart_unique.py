@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("carts", "0002_merge_duplicated_cart_items"),
+        ("products", "0014_product_indexes"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="productcart",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "product"), name="unique_cart_product"
+            ),
+        ),
+    ]
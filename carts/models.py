@@ -27,5 +27,13 @@ class ProductCart(models.Model):
         verbose_name="unity",
     )
 
+    class Meta:
+        constraints = [
+            # a product appears once per cart, adding it again adds quantity
+            models.UniqueConstraint(
+                fields=["cart", "product"], name="unique_cart_product"
+            )
+        ]
+
     def __str__(self):
         return f"ProductCart: {self.product.name} x{self.quantity} in {self.cart.name}"
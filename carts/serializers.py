@@ -24,7 +24,9 @@ class ProductCartSerializer(serializers.ModelSerializer):
         quantity = validated_data.get("quantity", 0)
 
         # Buscar si el producto ya está en el carrito
-        existing_item = ProductCart.objects.filter(product=product).first()
+        existing_item = ProductCart.objects.filter(
+            cart=validated_data.get("cart"), product=product
+        ).first()
 
         if existing_item:
             existing_item.quantity += quantity  # Sumar la nueva cantidad
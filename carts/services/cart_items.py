@@ -0,0 +1,102 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from carts.models import ProductCart
+from products.models import Product
+
+
+class MissingProductsError(Exception):
+    def __init__(self, skus) -> None:
+        self.skus = sorted(skus)
+        super().__init__(f"Products not found for SKUs: {', '.join(self.skus)}")
+
+
+class CartItemsService:
+    """
+    Adds products to a cart with a fixed number of queries, whatever the
+    number of items:
+
+    1. the SKUs are resolved in one query,
+    2. the rows already in the cart are read in one query,
+    3. existing rows get their new quantity with one `bulk_update`,
+    4. new rows are written with one `bulk_create` in a savepoint. If a
+       concurrent request inserted one of them first, the (cart, product)
+       unique constraint rejects it and steps 2-4 run again for the new
+       rows only, so their quantity is added to the winner's row,
+    5. the resulting rows are read back for serialization in one query.
+
+    mode="add" sums the quantities to the ones in the cart, mode="set"
+    replaces them.
+    """
+
+    def __init__(self, cart) -> None:
+        self.cart = cart
+
+    def execute(self, items, mode: str = "add") -> list:
+        """
+        items: iterable of (sku, quantity), repeated SKUs are merged.
+        Returns the `ProductCart` rows of the given SKUs, products selected.
+        """
+        quantities = defaultdict(int)
+        for sku, quantity in items:
+            quantities[str(sku)] += int(quantity)
+        if not quantities:
+            return []
+
+        found = set(
+            Product.objects.filter(sku__in=quantities).values_list("sku", flat=True)
+        )
+        missing = set(quantities) - found
+        if missing:
+            raise MissingProductsError(missing)
+
+        with transaction.atomic():
+            pending = set(quantities)
+            while pending:
+                existing = self._existing(pending)
+                for sku, item in existing.items():
+                    item.quantity = (
+                        F("quantity") + quantities[sku]
+                        if mode == "add"
+                        else quantities[sku]
+                    )
+                ProductCart.objects.bulk_update(existing.values(), ["quantity"])
+
+                pending -= set(existing)
+                if not pending:
+                    break
+                try:
+                    with transaction.atomic():
+                        ProductCart.objects.bulk_create(
+                            [
+                                ProductCart(
+                                    cart=self.cart,
+                                    product_id=sku,
+                                    quantity=quantities[sku],
+                                )
+                                for sku in pending
+                            ]
+                        )
+                    pending = set()
+                except IntegrityError:
+                    # a concurrent request added one of them first
+                    continue
+
+            return list(
+                ProductCart.objects.filter(cart=self.cart, product_id__in=quantities)
+                .select_related("cart", "product")
+                .order_by("id")
+            )
+
+    def _existing(self, skus) -> dict:
+        """
+        SKU -> `ProductCart` row of the given products already in the cart.
+        """
+        return {
+            item.product_id: item
+            for item in ProductCart.objects.filter(
+                cart=self.cart, product_id__in=skus
+            ).only("id", "product_id")
+        }
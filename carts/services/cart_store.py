@@ -0,0 +1,355 @@
+import hashlib
+import json
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from carts.models import Cart, ProductCart
+from carts.services.cart_items import MissingProductsError
+from jobs.services.job_queue import enqueue
+from orders.models import OrderProduct
+from products.models import Product
+
+
+class CartBusyError(Exception):
+    def __init__(self, cart_id) -> None:
+        super().__init__(f"Cart {cart_id} is being changed, try again.")
+
+
+def content_hash(items) -> str:
+    """
+    Stable hash of a cart content, `items` maps SKU -> quantity.
+    Products with no quantity don't count.
+    """
+    content = sorted((str(sku), int(qty)) for sku, qty in items.items() if int(qty))
+    return hashlib.sha1(json.dumps(content).encode()).hexdigest()
+
+
+# backends that keep their entries in the memory of one process
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def get_cart_cache_alias() -> str:
+    return getattr(settings, "CART_STORE_CACHE_ALIAS", "default")
+
+
+def get_cart_cache():
+    return caches[get_cart_cache_alias()]
+
+
+def cache_is_shared(alias) -> bool:
+    return settings.CACHES[alias]["BACKEND"] not in LOCAL_CACHE_BACKENDS
+
+
+class CartStore:
+    """
+    Active carts live in the cache and are written to `Cart`/`ProductCart`
+    behind the requests (write-behind):
+
+    - every change updates the cached cart and, for the first change after a
+      flush, enqueues a `carts.flush` job delayed by `CART_FLUSH_DEBOUNCE`
+      seconds, so a burst of clicks ends up in a single batch of writes,
+    - `flush()` writes the whole cart in a fixed number of queries, checkout
+      calls it directly so the order is built from the saved cart.
+
+    Changes of a cached cart are serialized by a per-cart lock taken with
+    `cache.add`, which is atomic on every backend.
+
+    Cached state of a cart:
+        {"items": {sku: qty}, "ids": {sku: ProductCart id}, "hash": str,
+         "version": int, "dirty": bool}
+
+    The cache must outlive the debounce and be shared by the web and jobs
+    processes, a cart evicted before its flush loses the unsaved changes.
+    With `CART_WRITE_BEHIND` off (the default with a local memory cache, see
+    the `carts.E001` check) nothing is cached: every change is written to
+    the database under a lock of the cart row.
+    """
+
+    # seconds a lock is held at most (it expires if its holder dies) and
+    # waited for before giving up
+    LOCK_TIMEOUT = 5
+
+    def __init__(self) -> None:
+        self.cache = get_cart_cache()
+        self.timeout = getattr(settings, "CART_STORE_TIMEOUT", 7 * 24 * 60 * 60)
+        self.debounce = getattr(settings, "CART_FLUSH_DEBOUNCE", 30)
+        self.write_behind = getattr(settings, "CART_WRITE_BEHIND", False)
+
+    # ===============================
+    # Keys
+    # ===============================
+    def _key(self, cart_id) -> str:
+        return f"carts:{cart_id}"
+
+    def _flush_key(self, cart_id) -> str:
+        return f"carts:{cart_id}:flush"
+
+    def _lock_key(self, cart_id) -> str:
+        return f"carts:{cart_id}:lock"
+
+    def _order_key(self, order_id) -> str:
+        return f"carts:order:{order_id}:hash"
+
+    # ===============================
+    # Reads
+    # ===============================
+    def get(self, cart_id) -> dict:
+        if not self.write_behind:
+            return self._load(cart_id)
+        state = self.cache.get(self._key(cart_id))
+        if state is None:
+            state = self._load(cart_id)
+            # a cart cached meanwhile is newer than the rows
+            if not self.cache.add(self._key(cart_id), state, self.timeout):
+                state = self.cache.get(self._key(cart_id)) or state
+        return state
+
+    def _load(self, cart_id) -> dict:
+        items, ids = {}, {}
+        rows = ProductCart.objects.filter(cart_id=cart_id).values_list(
+            "id", "product_id", "quantity"
+        )
+        for pk, sku, quantity in rows:
+            items[sku] = quantity
+            ids[sku] = pk
+        return {
+            "items": items,
+            "ids": ids,
+            "hash": content_hash(items),
+            "version": 0,
+            "dirty": False,
+        }
+
+    def rows(self, cart, skus=None) -> list:
+        """
+        The cart content as `ProductCart` instances for serialization, in one
+        query. Products added since the last flush have no id yet.
+        """
+        state = self.get(cart.pk)
+        skus = list(state["items"] if skus is None else skus)
+        products = Product.objects.in_bulk(skus)
+        return [
+            ProductCart(
+                id=state["ids"].get(sku),
+                cart=cart,
+                product=products[sku],
+                quantity=state["items"][sku],
+            )
+            for sku in skus
+            if sku in products and sku in state["items"]
+        ]
+
+    def has_changed(self, cart_id, items) -> bool:
+        return self.get(cart_id)["hash"] != content_hash(items)
+
+    # ===============================
+    # Writes
+    # ===============================
+    def update(self, cart, items, mode: str = "add") -> list:
+        """
+        items: iterable of (sku, quantity), repeated SKUs are merged.
+        mode="add" sums the quantities, mode="set" replaces them (0 removes
+        the product). Returns the `rows()` of the given SKUs.
+        """
+        quantities = defaultdict(int)
+        for sku, quantity in items:
+            quantities[str(sku)] += int(quantity)
+        if not quantities:
+            return []
+
+        products = Product.objects.in_bulk(list(quantities))
+        missing = set(quantities) - set(products)
+        if missing:
+            raise MissingProductsError(missing)
+
+        with self._change(cart.pk) as state:
+            for sku, quantity in quantities.items():
+                if mode == "add":
+                    quantity += state["items"].get(sku, 0)
+                if quantity > 0:
+                    state["items"][sku] = quantity
+                else:
+                    state["items"].pop(sku, None)
+
+        return [
+            ProductCart(
+                id=state["ids"].get(sku),
+                cart=cart,
+                product=products[sku],
+                quantity=state["items"][sku],
+            )
+            for sku in quantities
+            if sku in state["items"]
+        ]
+
+    def remove(self, cart_id, skus) -> None:
+        with self._change(cart_id) as state:
+            for sku in skus:
+                state["items"].pop(str(sku), None)
+
+    @contextmanager
+    def _change(self, cart_id):
+        """
+        The state of a cart to change in place, saved on exit: in the cache
+        with a flush scheduled, or straight to the database.
+        """
+        if not self.write_behind:
+            with transaction.atomic():
+                # concurrent changes of the cart wait for each other
+                list(Cart.objects.select_for_update().filter(pk=cart_id).values("pk"))
+                state = self._load(cart_id)
+                yield state
+                state["ids"] = self._write(cart_id, state)
+            return
+
+        with self._lock(cart_id):
+            state = self.get(cart_id)
+            yield state
+            state["hash"] = content_hash(state["items"])
+            state["version"] += 1
+            state["dirty"] = True
+            self.cache.set(self._key(cart_id), state, self.timeout)
+        self.schedule_flush(cart_id)
+
+    @contextmanager
+    def _lock(self, cart_id):
+        """
+        Holds the lock of a cached cart, raises `CartBusyError` after
+        waiting `LOCK_TIMEOUT` seconds for it.
+        """
+        key, token = self._lock_key(cart_id), uuid.uuid4().hex
+        deadline = time.monotonic() + self.LOCK_TIMEOUT
+        while not self.cache.add(key, token, timeout=self.LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                raise CartBusyError(cart_id)
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            # an expired lock may belong to someone else now
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+
+    def schedule_flush(self, cart_id) -> bool:
+        """
+        Enqueues a delayed flush unless one is already waiting for this cart.
+        The marker expires on its own if no worker picks the job up.
+        """
+        if not self.cache.add(
+            self._flush_key(cart_id), True, timeout=max(self.debounce * 10, 60)
+        ):
+            return False
+        transaction.on_commit(
+            lambda: enqueue("carts.flush", {"cart": cart_id}, delay=self.debounce),
+            robust=True,
+        )
+        return True
+
+    def forget(self, cart_id) -> None:
+        """
+        Drops the cached cart, unsaved changes included.
+        """
+        self.cache.delete_many([self._key(cart_id), self._flush_key(cart_id)])
+
+    # ===============================
+    # Persistence
+    # ===============================
+    def flush(self, cart_id) -> int:
+        """
+        Writes the cached cart to the database in a fixed number of queries.
+        Returns the number of products in the cart, 0 when it was clean.
+        """
+        if not self.write_behind:
+            # every change is already in the database
+            return 0
+        # later changes schedule a new flush
+        self.cache.delete(self._flush_key(cart_id))
+
+        state = self.cache.get(self._key(cart_id))
+        if state is None or not state["dirty"]:
+            return 0
+        if not Cart.objects.filter(pk=cart_id).exists():
+            self.forget(cart_id)
+            return 0
+
+        ids = self._write(cart_id, state)
+
+        with self._lock(cart_id):
+            # a change that arrived meanwhile keeps the cart dirty
+            current = self.cache.get(self._key(cart_id))
+            if current is not None:
+                current["ids"] = ids
+                if current["version"] == state["version"]:
+                    current["dirty"] = False
+                self.cache.set(self._key(cart_id), current, self.timeout)
+        return len(state["items"])
+
+    def _write(self, cart_id, state) -> dict:
+        """
+        Writes the content of a cart state in a fixed number of queries.
+        Returns the ids of its rows, SKU -> `ProductCart` id.
+        """
+        items = state["items"]
+        # only the rows the state was loaded with or saved, a row written by
+        # something else is left alone
+        removed = [sku for sku in state["ids"] if sku not in items]
+        with transaction.atomic():
+            if removed:
+                ProductCart.objects.filter(
+                    cart_id=cart_id, product_id__in=removed
+                ).delete()
+            ProductCart.objects.bulk_create(
+                [
+                    ProductCart(cart_id=cart_id, product_id=sku, quantity=quantity)
+                    for sku, quantity in items.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["cart", "product"],
+                update_fields=["quantity"],
+            )
+        return dict(
+            ProductCart.objects.filter(
+                cart_id=cart_id, product_id__in=list(items)
+            ).values_list("product_id", "id")
+        )
+
+    def flush_user(self, user) -> int:
+        """
+        Flushes every cart of the user, checkout calls it before reading them.
+        """
+        return sum(
+            self.flush(cart_id)
+            for cart_id in Cart.objects.filter(user=user).values_list("pk", flat=True)
+        )
+
+    # ===============================
+    # Pending orders
+    # ===============================
+    def order_hash(self, order_id) -> str:
+        """
+        Content hash of an order, cached until one of its products changes.
+        """
+        key = self._order_key(order_id)
+        value = self.cache.get(key)
+        if value is None:
+            value = content_hash(
+                dict(
+                    OrderProduct.objects.filter(order_id=order_id).values_list(
+                        "product_id", "quantity"
+                    )
+                )
+            )
+            self.cache.set(key, value, self.timeout)
+        return value
+
+    def forget_order(self, order_id) -> None:
+        self.cache.delete(self._order_key(order_id))
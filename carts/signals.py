@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from carts.models import Cart
+from carts.services.cart_store import CartStore
+from orders.models import OrderProduct
+
+
+@receiver(post_delete, sender=Cart)
+def forget_deleted_cart(sender, instance, **kwargs):
+    CartStore().forget(instance.pk)
+
+
+@receiver(post_save, sender=OrderProduct)
+@receiver(post_delete, sender=OrderProduct)
+def forget_order_hash(sender, instance, **kwargs):
+    CartStore().forget_order(instance.order_id)
@@ -1,3 +1,420 @@
-from django.test import TestCase
+import random
+import threading
+import time
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from carts.checks import check_cart_store_cache
+from carts.models import Cart, ProductCart
+from carts.services.cart_items import CartItemsService, MissingProductsError
+from carts.services.cart_store import CartStore, content_hash
+from jobs.models import Job
+from jobs.services.job_queue import claim_next, run_job
+from orders.models import Order, OrderProduct
+from products.models import Category, Product
+from products.views import ProductCartCreateView, ProductCartUserList
+from users.models import User
+
+
+class CartTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        cls.user = User.objects.create_user(
+            username="buyer", email="buyer@test.com", dni="20000001"
+        )
+        cls.cart = Cart.objects.create(
+            user=cls.user, name="cart-1", description="Carrito"
+        )
+        for i in range(10):
+            Product.objects.create(
+                sku=f"SKU{i:03}",
+                name=f"Producto {i}",
+                description="Producto de prueba",
+                price=1000 + i,
+                category=category,
+            )
+
+
+class CartItemsTest(CartTestCase):
+    """
+    Cart items are written in a fixed number of queries and a product is
+    never duplicated in a cart.
+    """
+
+    def test_query_count_does_not_grow_with_items(self):
+        service = CartItemsService(self.cart)
+        with CaptureQueriesContext(connection) as one:
+            service.execute([("SKU000", 1)])
+
+        # nine new products and one already in the cart
+        with CaptureQueriesContext(connection) as ten:
+            items = service.execute([(f"SKU{i:03}", 2) for i in range(10)])
+        self.assertEqual(len(items), 10)
+
+        # the only extra query is the bulk update of the existing row
+        self.assertEqual(len(ten.captured_queries), len(one.captured_queries) + 1)
+
+    def test_quantities_are_merged(self):
+        service = CartItemsService(self.cart)
+        service.execute([("SKU001", 2)])
+        (item,) = service.execute([("SKU001", 3), ("SKU001", 1)])
+
+        self.assertEqual(item.quantity, 6)
+        self.assertEqual(
+            ProductCart.objects.filter(cart=self.cart, product_id="SKU001").count(), 1
+        )
+
+    def test_set_mode_replaces_quantities(self):
+        service = CartItemsService(self.cart)
+        service.execute([("SKU002", 4)])
+        (item,) = service.execute([("SKU002", 1)], mode="set")
+
+        self.assertEqual(item.quantity, 1)
+
+    def test_missing_product(self):
+        with self.assertRaises(MissingProductsError) as error:
+            CartItemsService(self.cart).execute([("SKU000", 1), ("NOPE", 1)])
+
+        self.assertEqual(error.exception.skus, ["NOPE"])
+        self.assertFalse(ProductCart.objects.filter(cart=self.cart).exists())
+
+    def test_concurrent_insert_is_added_to(self):
+        service = RacingCartItemsService(self.cart)
+        (item,) = service.execute([("SKU003", 3)])
+
+        self.assertEqual(item.quantity, 5)
+        self.assertEqual(
+            ProductCart.objects.filter(cart=self.cart, product_id="SKU003").count(), 1
+        )
+
+
+class RacingCartItemsService(CartItemsService):
+    """
+    Another request adds the product right after the cart was read.
+    """
+
+    raced = False
+
+    def _existing(self, skus):
+        existing = super()._existing(skus)
+        if not self.raced:
+            self.raced = True
+            for sku in skus:
+                ProductCart.objects.create(cart=self.cart, product_id=sku, quantity=2)
+        return existing
+
+
+class SlowCartItemsService(CartItemsService):
+    def _existing(self, skus):
+        existing = super()._existing(skus)
+        # widens the window between reading and inserting the rows
+        time.sleep(0.001)
+        return existing
+
+
+class CartItemsConcurrencyTest(TransactionTestCase):
+    """
+    Concurrent adds of the same product must never lose one another.
+    """
+
+    THREADS = 10
+
+    def setUp(self):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        user = User.objects.create_user(
+            username="buyer", email="buyer@test.com", dni="20000001"
+        )
+        self.cart = Cart.objects.create(user=user, name="cart-1", description="-")
+        Product.objects.create(
+            sku="HOT", name="Hot", description="Hot", price=1, category=category
+        )
+
+    def _worker(self, barrier):
+        barrier.wait()
+        try:
+            while True:
+                try:
+                    SlowCartItemsService(self.cart).execute([("HOT", 1)])
+                    return
+                except OperationalError:
+                    # SQLite allows one writer at a time, back off and try
+                    # again so the readers don't keep aborting each other
+                    time.sleep(random.random() / 100)
+        finally:
+            connection.close()
+
+    def test_concurrent_adds_are_all_counted(self):
+        barrier = threading.Barrier(self.THREADS)
+        threads = [
+            threading.Thread(target=self._worker, args=(barrier,))
+            for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(ProductCart.objects.get(cart=self.cart).quantity, self.THREADS)
+
+
+@override_settings(CART_WRITE_BEHIND=True)
+class CartStoreTest(CartTestCase):
+    """
+    Cart changes are kept in the cache and written in one debounced batch.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def _post_items(self, items):
+        return self.client.post(
+            "/api/v2/carts/items/create/",
+            {"data": {"cart_id": self.cart.name, "items": items}},
+            format="json",
+        )
+
+    def test_clicks_are_written_in_one_debounced_flush(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                response = self._post_items([{"product": f"SKU{i:03}", "quantity": 1}])
+                self.assertEqual(response.status_code, 201)
+            response = self._post_items([{"product": "SKU000", "quantity": 2}])
+
+        self.assertEqual(response.json()[0]["quantity"], 3)
+        self.assertFalse(ProductCart.objects.filter(cart=self.cart).exists())
+
+        (job,) = Job.objects.filter(kind="carts.flush")
+        self.assertEqual(job.payload, {"cart": self.cart.pk})
+        self.assertGreater(job.run_after, timezone.now())
+        # not claimed before the debounce
+        self.assertIsNone(claim_next("test"))
+
+        job.run_after = timezone.now()
+        job.save(update_fields=["run_after"])
+        run_job(claim_next("test"))
+
+        self.assertEqual(
+            dict(
+                ProductCart.objects.filter(cart=self.cart).values_list(
+                    "product_id", "quantity"
+                )
+            ),
+            {"SKU000": 3, "SKU001": 1, "SKU002": 1, "SKU003": 1, "SKU004": 1},
+        )
+        self.assertFalse(CartStore().get(self.cart.pk)["dirty"])
+
+    def test_flush_query_count_does_not_grow_with_items(self):
+        store = CartStore()
+        store.update(self.cart, [("SKU000", 1)])
+        with CaptureQueriesContext(connection) as one:
+            store.flush(self.cart.pk)
+
+        store.update(self.cart, [(f"SKU{i:03}", 1) for i in range(10)])
+        with CaptureQueriesContext(connection) as ten:
+            store.flush(self.cart.pk)
+
+        self.assertEqual(len(one.captured_queries), len(ten.captured_queries))
+        self.assertEqual(ProductCart.objects.filter(cart=self.cart).count(), 10)
+
+    def test_removed_products_are_deleted_on_flush(self):
+        store = CartStore()
+        store.update(self.cart, [("SKU000", 1), ("SKU001", 1)])
+        store.flush(self.cart.pk)
+        store.update(self.cart, [("SKU001", 0)], mode="set")
+        store.flush(self.cart.pk)
+
+        self.assertEqual(
+            list(
+                ProductCart.objects.filter(cart=self.cart).values_list(
+                    "product_id", flat=True
+                )
+            ),
+            ["SKU000"],
+        )
+
+    def test_missing_product(self):
+        response = self._post_items(
+            [
+                {"product": "SKU000", "quantity": 1},
+                {"product": "NOPE", "quantity": 1},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["message"], "Product with ID NOPE not found")
+        self.assertEqual(CartStore().get(self.cart.pk)["items"], {})
+
+    def test_has_changed_compares_hashes(self):
+        store = CartStore()
+        store.update(self.cart, [("SKU000", 2), ("SKU001", 1)])
+
+        self.assertFalse(store.has_changed(self.cart.pk, {"SKU001": 1, "SKU000": 2}))
+        self.assertTrue(store.has_changed(self.cart.pk, {"SKU000": 1}))
+
+    def test_order_hash_is_dropped_when_products_change(self):
+        order = Order.objects.create(id="O1", user=self.user)
+        OrderProduct.objects.create(
+            order=order, product_id="SKU000", price=1000, quantity=1
+        )
+        store = CartStore()
+        self.assertEqual(store.order_hash(order.pk), content_hash({"SKU000": 1}))
+
+        with self.assertNumQueries(0):
+            store.order_hash(order.pk)
+
+        OrderProduct.objects.filter(order=order).first().delete()
+        self.assertEqual(store.order_hash(order.pk), content_hash({}))
+
+    def test_product_cart_view_writes_through_the_store(self):
+        store = CartStore()
+        store.update(self.cart, [("SKU000", 1)])
+        factory = APIRequestFactory()
+
+        response = ProductCartCreateView.as_view()(
+            factory.post(
+                "/",
+                {"cart": self.cart.pk, "products": [{"sku": "SKU001", "quantity": 2}]},
+                format="json",
+            )
+        )
+        self.assertEqual(response.status_code, 201)
+
+        response = ProductCartUserList.as_view()(
+            factory.get("/", {"cart": self.cart.name, "user": self.user.pk})
+        )
+        self.assertEqual(
+            {item["product"]["sku"]: item["quantity"] for item in response.data},
+            {"SKU000": 1, "SKU001": 2},
+        )
+
+        store.flush(self.cart.pk)
+        self.assertEqual(
+            dict(
+                ProductCart.objects.filter(cart=self.cart).values_list(
+                    "product_id", "quantity"
+                )
+            ),
+            {"SKU000": 1, "SKU001": 2},
+        )
+
+    def test_flush_keeps_rows_the_cache_has_not_seen(self):
+        store = CartStore()
+        store.update(self.cart, [("SKU000", 1)])
+        ProductCart.objects.create(cart=self.cart, product_id="SKU001", quantity=2)
+
+        store.flush(self.cart.pk)
+
+        self.assertEqual(
+            dict(
+                ProductCart.objects.filter(cart=self.cart).values_list(
+                    "product_id", "quantity"
+                )
+            ),
+            {"SKU000": 1, "SKU001": 2},
+        )
+
+
+class CartStoreWriteThroughTest(CartTestCase):
+    """
+    Without a shared cache every cart change is written to the database.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_changes_are_written_without_a_flush_job(self):
+        store = CartStore()
+        with self.captureOnCommitCallbacks(execute=True):
+            store.update(self.cart, [("SKU000", 1), ("SKU001", 2)])
+            store.update(self.cart, [("SKU000", 2)])
+            store.remove(self.cart.pk, ["SKU001"])
+
+        self.assertEqual(
+            dict(
+                ProductCart.objects.filter(cart=self.cart).values_list(
+                    "product_id", "quantity"
+                )
+            ),
+            {"SKU000": 3},
+        )
+        self.assertFalse(Job.objects.filter(kind="carts.flush").exists())
+        self.assertIsNone(cache.get(f"carts:{self.cart.pk}"))
+
+    def test_rows_have_their_ids(self):
+        (row,) = CartStore().update(self.cart, [("SKU003", 1)])
+
+        self.assertEqual(row.id, ProductCart.objects.get(cart=self.cart).id)
+
+    def test_write_behind_needs_a_shared_cache(self):
+        with override_settings(CART_WRITE_BEHIND=True):
+            (error,) = check_cart_store_cache(None)
+        self.assertEqual(error.id, "carts.E001")
+
+        with override_settings(CART_WRITE_BEHIND=False):
+            self.assertEqual(check_cart_store_cache(None), [])
+
+
+class SlowCartStore(CartStore):
+    def get(self, cart_id):
+        state = super().get(cart_id)
+        # widens the window between reading and saving the cart
+        time.sleep(0.001)
+        return state
+
+
+@override_settings(CART_WRITE_BEHIND=True)
+class CartStoreConcurrencyTest(TransactionTestCase):
+    """
+    Concurrent changes of a cached cart must never lose one another.
+    """
+
+    THREADS = 10
+    ADDS_PER_THREAD = 10
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        user = User.objects.create_user(
+            username="buyer", email="buyer@test.com", dni="20000001"
+        )
+        self.cart = Cart.objects.create(user=user, name="cart-1", description="-")
+        Product.objects.create(
+            sku="HOT", name="Hot", description="Hot", price=1, category=category
+        )
+
+    def _worker(self, barrier):
+        barrier.wait()
+        try:
+            for _ in range(self.ADDS_PER_THREAD):
+                while True:
+                    try:
+                        SlowCartStore().update(self.cart, [("HOT", 1)])
+                        break
+                    except OperationalError:
+                        # SQLite allows one writer at a time, try again
+                        continue
+        finally:
+            connection.close()
+
+    def test_concurrent_adds_are_all_counted(self):
+        barrier = threading.Barrier(self.THREADS)
+        threads = [
+            threading.Thread(target=self._worker, args=(barrier,))
+            for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        total = self.THREADS * self.ADDS_PER_THREAD
+        self.assertEqual(CartStore().get(self.cart.pk)["items"], {"HOT": total})
+        CartStore().flush(self.cart.pk)
+        self.assertEqual(ProductCart.objects.get(cart=self.cart).quantity, total)
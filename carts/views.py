@@ -3,9 +3,10 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from carts.models import Cart, ProductCart
+from carts.models import Cart
 from carts.serializers import CartSerializer, ProductCartSerializer
-from products.models import Product
+from carts.services.cart_items import MissingProductsError
+from carts.services.cart_store import CartBusyError, CartStore
 from users.models import User
 
 
@@ -78,52 +79,37 @@ class CartItemCreateView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        for item in cart_items:
+            if not item.get("product") or not item.get("quantity"):
+                return Response(
+                    {"message": "Each item must have a product and quantity"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
         try:
             # Verificar si el carrito existe
             cart = Cart.objects.get(name=cart_id)
-            updated_items = []
-
-            for item in cart_items:
-                product_id = item.get("product")
-                quantity = item.get("quantity")
-
-                if not product_id or not quantity:
-                    return Response(
-                        {"message": "Each item must have a product and quantity"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                # Verificar si el producto existe
-                product = Product.objects.filter(sku=product_id).first()
-                if not product:
-                    return Response(
-                        {"message": f"Product with ID {product_id} not found"},
-                        status=status.HTTP_404_NOT_FOUND,
-                    )
-
-                # Buscar si el producto ya está en el carrito
-                product_cart, created = ProductCart.objects.get_or_create(
-                    cart=cart, product=product
-                )
-
-                if created:
-                    product_cart.quantity = quantity
-                else:
-                    product_cart.quantity += (
-                        quantity  # Incrementa la cantidad si ya existe
-                    )
 
-                product_cart.save()
-
-                updated_items.append(ProductCartSerializer(product_cart).data)
-
-            return Response(updated_items, status=status.HTTP_201_CREATED)
+            # Suma las cantidades en el carrito en caché, se guarda en la
+            # base de datos unos segundos después (ver CartStore)
+            updated_items = CartStore().update(
+                cart, ((item["product"], item["quantity"]) for item in cart_items)
+            )
+            serializer = ProductCartSerializer(updated_items, many=True)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+        except MissingProductsError as e:
+            return Response(
+                {"message": f"Product with ID {e.skus[0]} not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
         except Cart.DoesNotExist:
             return Response(
                 {"message": f"Cart with ID {cart_id} not found"},
                 status=status.HTTP_404_NOT_FOUND,
             )
+        except CartBusyError as e:
+            return Response({"message": str(e)}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response(
                 {"message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -0,0 +1,6 @@
+from django.contrib import admin
+
+from .models import Broadcast, OutboundEmail
+
+admin.site.register(OutboundEmail)
+admin.site.register(Broadcast)
@@ -0,0 +1,22 @@
+from django.conf import settings
+
+from emails.models import Broadcast
+from emails.services.broadcast import BroadcastService
+from emails.services.outbox import OutboxService
+from jobs.services.job_queue import job_handler
+
+
+@job_handler("emails.send")
+def send_emails(job):
+    return OutboxService().deliver()
+
+
+@job_handler("emails.broadcast")
+def send_broadcast(job):
+    broadcast = Broadcast.objects.get(pk=job.payload["broadcast"])
+    return BroadcastService(
+        broadcast,
+        time_limit=settings.BROADCAST_TIME_LIMIT,
+        # recipients added after the count can take `done` past `total`
+        on_progress=lambda done, total: job.set_progress(done * 100 / max(total, done)),
+    ).run()
@@ -0,0 +1,55 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from emails.models import Broadcast
+from emails.services.broadcast import BroadcastService, start_broadcast
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends a newsletter to every subscriber from this process. A broadcast "
+        "stopped halfway is resumed with --resume, without repeating emails."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subject", help="Subject of a new broadcast")
+        parser.add_argument(
+            "--context",
+            type=json.loads,
+            default={},
+            help='Shared template variables as JSON, e.g. {"title": ..., "body": ...}',
+        )
+        parser.add_argument("--template", help="Defaults to email/newsletter.html")
+        parser.add_argument("--resume", type=int, help="Id of a broadcast to resume")
+        parser.add_argument(
+            "--rate", type=float, help="Emails per second, 0 for no limit"
+        )
+
+    def handle(self, *args, **options):
+        if options["resume"]:
+            try:
+                broadcast = Broadcast.objects.get(pk=options["resume"])
+            except Broadcast.DoesNotExist:
+                raise CommandError(f"Broadcast {options['resume']} does not exist")
+        elif options["subject"]:
+            # sent from this process, no job
+            broadcast = start_broadcast(
+                options["subject"],
+                options["context"],
+                options["template"],
+                queue=False,
+            )
+        else:
+            raise CommandError("Either --subject or --resume is required")
+
+        started = time.perf_counter()
+        result = BroadcastService(broadcast, rate=options["rate"]).run()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Broadcast {result['broadcast']} {result['status']}: "
+                f"{result['sent']} sent, {result['deferred']} left to the outbox "
+                f"of {result['total']} in {time.perf_counter() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting in the outbox. Created by `queue_email()` and sent in
+    batches by the `emails.send` job.
+    """
+
+    STATUS = (
+        ("PENDING", "PENDING"),
+        ("SENDING", "SENDING"),
+        ("SENT", "SENT"),
+        ("FAILED", "FAILED"),
+    )
+
+    subject = models.CharField(max_length=255)
+    to = models.EmailField()
+    from_email = models.CharField(max_length=255)
+    template = models.CharField(max_length=255)
+    context = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS, default="PENDING")
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # not sent before this time, pushed back after every failed attempt
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            # the worker sends the pending emails that are due
+            models.Index(
+                fields=["status", "next_attempt_at"], name="email_status_next_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Email to {self.to} | {self.subject} | {self.status}"
+
+
+class Broadcast(models.Model):
+    """
+    A newsletter sent to every subscriber by the `emails.broadcast` job.
+    Recipients are handled in email order and `cursor` is the last one, a
+    resumed broadcast starts right after it.
+    """
+
+    STATUS = (
+        ("PENDING", "PENDING"),
+        ("RUNNING", "RUNNING"),
+        ("DONE", "DONE"),
+        ("CANCELLED", "CANCELLED"),
+    )
+
+    subject = models.CharField(max_length=255)
+    template = models.CharField(max_length=255, default="email/newsletter.html")
+    # shared by every recipient, `email` and `name` are added per recipient
+    context = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    from_email = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS, default="PENDING")
+
+    cursor = models.EmailField(blank=True)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    sent = models.PositiveIntegerField(default=0)
+    # failed sends handed over to the outbox, which retries them
+    deferred = models.PositiveIntegerField(default=0)
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="broadcasts",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Broadcast {self.pk} | {self.subject} | {self.status}"
@@ -0,0 +1,41 @@
+from django.template import TemplateDoesNotExist
+from rest_framework import serializers
+
+from .models import Broadcast
+from .services.outbox import compiled_template
+
+
+class BroadcastSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Broadcast
+        fields = [
+            "id",
+            "subject",
+            "template",
+            "context",
+            "status",
+            "total",
+            "sent",
+            "deferred",
+            "cursor",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = [
+            "status",
+            "total",
+            "sent",
+            "deferred",
+            "cursor",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+    def validate_template(self, value):
+        try:
+            compiled_template(value)
+        except TemplateDoesNotExist:
+            raise serializers.ValidationError(f"Template '{value}' does not exist")
+        return value
@@ -0,0 +1,240 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import CharField, F, Value
+from django.utils import timezone
+
+from emails.models import Broadcast
+from emails.services.outbox import (
+    DEFAULT_FROM_EMAIL,
+    compiled_template,
+    queue_email,
+    render_email,
+)
+from jobs.services.job_queue import enqueue
+from users.models import NewsletterSubscription, User
+
+logger = logging.getLogger(__name__)
+
+
+def newsletter_recipients(after: str = ""):
+    """
+    (email, name) of everyone receiving the newsletter, ordered by email and
+    starting after `after`: the subscriptions plus the active users with the
+    monthly newsletter on. An email in both comes out twice in a row.
+    """
+    subscriptions = (
+        NewsletterSubscription.objects.filter(email__gt=after)
+        .annotate(name=Value("", output_field=CharField()))
+        .values_list("email", "name")
+    )
+    users = User.objects.filter(
+        email__gt=after,
+        is_active=True,
+        profile_settings__monthly_newsletter=True,
+    ).values_list("email", "first_name")
+    return subscriptions.union(users).order_by("email")
+
+
+def count_newsletter_recipients() -> int:
+    subscriptions = NewsletterSubscription.objects.values("email")
+    users = User.objects.filter(
+        is_active=True, profile_settings__monthly_newsletter=True
+    ).exclude(email="")
+    return subscriptions.union(users.values("email")).count()
+
+
+def start_broadcast(
+    subject, context=None, template=None, user=None, queue=True
+) -> Broadcast:
+    """
+    Creates a broadcast and, unless `queue` is False, enqueues the job
+    sending it.
+    """
+    with transaction.atomic():
+        broadcast = Broadcast.objects.create(
+            subject=subject,
+            context=context or {},
+            template=template or Broadcast._meta.get_field("template").default,
+            from_email=DEFAULT_FROM_EMAIL,
+            created_by=user if user and user.is_authenticated else None,
+        )
+        if queue:
+            enqueue_broadcast(broadcast)
+    return broadcast
+
+
+def enqueue_broadcast(broadcast):
+    # a worker dying mid-run requeues the job, it resumes after the cursor
+    return enqueue("emails.broadcast", {"broadcast": broadcast.pk}, max_attempts=3)
+
+
+class BroadcastService:
+    """
+    Sends a broadcast to every newsletter recipient.
+
+    - Recipients are streamed with `iterator(chunk_size=...)` and keyset
+      pagination on the email, never loaded at once.
+    - The template is compiled once, only `email` and `name` change per
+      recipient.
+    - One SMTP connection is reused for `messages_per_connection` emails and
+      sends are paced to `rate` emails per second.
+    - Progress is checkpointed after every email, a run resumed after a
+      crash repeats at most the email being sent when it stopped.
+    - A failed send is handed over to the outbox, which retries it.
+    - With a `time_limit`, the rest of the broadcast is left to a new job
+      once it has elapsed, so a long send doesn't hold a worker.
+    """
+
+    def __init__(
+        self,
+        broadcast: Broadcast,
+        rate=None,
+        chunk_size=None,
+        messages_per_connection=None,
+        time_limit=None,
+        on_progress=None,
+    ) -> None:
+        self.broadcast = broadcast
+        self.rate = rate if rate is not None else settings.BROADCAST_RATE_LIMIT
+        self.chunk_size = chunk_size or settings.BROADCAST_CHUNK_SIZE
+        self.messages_per_connection = (
+            messages_per_connection or settings.BROADCAST_MESSAGES_PER_CONNECTION
+        )
+        self.time_limit = time_limit
+        # optional callable(done, total) called after each email
+        self.on_progress = on_progress
+
+    def run(self) -> dict:
+        broadcast = self.broadcast
+        if not self._start():
+            return self._result()
+
+        # a missing template fails before anything is sent
+        compiled_template(broadcast.template)
+        started = time.monotonic()
+        next_send = started
+        connection, on_connection = None, 0
+        previous = None
+        finished = True
+        shared = {
+            "subject": broadcast.subject,
+            "year": timezone.now().year,
+            **broadcast.context,
+        }
+
+        self.cursor = broadcast.cursor
+        try:
+            recipients = newsletter_recipients(after=self.cursor)
+            for email, name in recipients.iterator(chunk_size=self.chunk_size):
+                if email == previous:
+                    continue
+                previous = email
+
+                if self.time_limit and time.monotonic() - started > self.time_limit:
+                    finished = False
+                    break
+
+                if self.rate:
+                    next_send = max(next_send, time.monotonic())
+                    time.sleep(max(next_send - time.monotonic(), 0))
+                    next_send += 1 / self.rate
+
+                if connection is None or on_connection >= self.messages_per_connection:
+                    if connection is not None:
+                        connection.close()
+                    connection, on_connection = get_connection(), 0
+                    connection.open()
+
+                context = {**shared, "email": email, "name": name}
+                sent = self._send(email, context, connection)
+                on_connection += 1
+                if not sent:
+                    # the connection may be broken, open a new one
+                    connection.close()
+                    connection = None
+                if not self._checkpoint(email, sent):
+                    # cancelled, or another run took over
+                    return self._result()
+                if self.on_progress:
+                    self.on_progress(
+                        broadcast.sent + broadcast.deferred, broadcast.total
+                    )
+        finally:
+            if connection is not None:
+                connection.close()
+
+        if finished:
+            Broadcast.objects.filter(pk=broadcast.pk, status="RUNNING").update(
+                status="DONE", finished_at=timezone.now()
+            )
+        else:
+            enqueue_broadcast(broadcast)
+        return self._result()
+
+    def _start(self) -> bool:
+        broadcast = self.broadcast
+        if broadcast.status not in ("PENDING", "RUNNING"):
+            return False
+
+        fields = {"status": "RUNNING"}
+        if broadcast.started_at is None:
+            fields["started_at"] = timezone.now()
+        if broadcast.total is None:
+            fields["total"] = count_newsletter_recipients()
+        started = Broadcast.objects.filter(
+            pk=broadcast.pk, status__in=("PENDING", "RUNNING")
+        ).update(**fields)
+        for field, value in fields.items():
+            setattr(broadcast, field, value)
+        return bool(started)
+
+    def _send(self, email, context, connection) -> bool:
+        try:
+            html_content, text_content = render_email(self.broadcast.template, context)
+            message = EmailMultiAlternatives(
+                subject=self.broadcast.subject,
+                body=text_content,
+                from_email=self.broadcast.from_email,
+                to=[email],
+                connection=connection,
+            )
+            message.attach_alternative(html_content, "text/html")
+            message.send()
+            return True
+        except Exception as e:
+            logger.warning("Broadcast %s to %s failed: %s", self.broadcast.pk, email, e)
+            queue_email(
+                self.broadcast.subject,
+                email,
+                context,
+                self.broadcast.template,
+                from_email=self.broadcast.from_email,
+            )
+            return False
+
+    def _checkpoint(self, email, sent) -> bool:
+        """
+        Moves the cursor past `email`. False once the broadcast is no longer
+        running or its cursor was moved by another run of it.
+        """
+        counter = "sent" if sent else "deferred"
+        moved = Broadcast.objects.filter(
+            pk=self.broadcast.pk, status="RUNNING", cursor=self.cursor
+        ).update(cursor=email, **{counter: F(counter) + 1})
+        self.cursor = email
+        setattr(self.broadcast, counter, getattr(self.broadcast, counter) + 1)
+        return bool(moved)
+
+    def _result(self) -> dict:
+        self.broadcast.refresh_from_db()
+        return {
+            "broadcast": self.broadcast.pk,
+            "status": self.broadcast.status,
+            "total": self.broadcast.total,
+            "sent": self.broadcast.sent,
+            "deferred": self.broadcast.deferred,
+        }
@@ -0,0 +1,202 @@
+import logging
+import os
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template import engines
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from emails.models import OutboundEmail
+from jobs.models import Job
+from jobs.services.job_queue import enqueue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FROM_EMAIL = "no-reply@avoberry.com"
+# SENDING emails older than this were left behind by a dead worker
+STALE_AFTER = timedelta(minutes=15)
+
+
+@lru_cache(maxsize=None)
+def compiled_template(name: str):
+    """
+    Compiled email template, parsed once per process.
+    """
+    return get_template(name)
+
+
+def warm_email_templates() -> list:
+    """
+    Compiles every `email/*.html` template so the first batch doesn't pay
+    for it. Returns their names.
+    """
+    names = set()
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            folder = os.path.join(directory, "email")
+            if os.path.isdir(folder):
+                names.update(
+                    f"email/{name}"
+                    for name in os.listdir(folder)
+                    if name.endswith(".html")
+                )
+    for name in sorted(names):
+        compiled_template(name)
+    return sorted(names)
+
+
+def render_email(template: str, context: dict) -> tuple:
+    """
+    (html, plain text) bodies of an email.
+    """
+    html_content = compiled_template(template).render(context)
+    return html_content, strip_tags(html_content)
+
+
+def queue_email(
+    subject: str, to: str, context: dict, template: str, from_email=None
+) -> OutboundEmail:
+    """
+    Puts an email in the outbox, the request doesn't wait for SMTP.
+    `context` is stored as JSON and rendered by the worker.
+    """
+    email = OutboundEmail.objects.create(
+        subject=subject,
+        to=to,
+        from_email=from_email or DEFAULT_FROM_EMAIL,
+        template=template,
+        context=context,
+    )
+    transaction.on_commit(schedule_delivery, robust=True)
+    return email
+
+
+def schedule_delivery(delay=None) -> bool:
+    """
+    Enqueues an `emails.send` job unless one is already waiting to run
+    before the given delay.
+    """
+    run_after = timezone.now() + timedelta(seconds=delay or 0)
+    waiting = Job.objects.filter(kind="emails.send", status="PENDING").exclude(
+        run_after__gt=run_after
+    )
+    if waiting.exists():
+        return False
+    enqueue("emails.send", delay=delay)
+    return True
+
+
+class OutboxService:
+    """
+    Sends the due emails of the outbox in batches, reusing one SMTP
+    connection for the whole run.
+
+    - Emails are claimed with a conditional update, two workers never send
+      the same one.
+    - A failed email is retried with exponential backoff, up to
+      `EMAIL_OUTBOX_MAX_ATTEMPTS` attempts, then marked FAILED.
+    - When only retries are left, a delayed job is scheduled for the next
+      one.
+    """
+
+    def __init__(self, batch_size=None, max_attempts=None, backoff=None) -> None:
+        self.batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+        self.backoff = (
+            backoff if backoff is not None else settings.EMAIL_OUTBOX_RETRY_BACKOFF
+        )
+
+    def deliver(self) -> dict:
+        self.requeue_stale()
+        warm_email_templates()
+        result = {"sent": 0, "retrying": 0, "failed": 0}
+
+        connection = get_connection()
+        try:
+            while batch := self.claim_batch():
+                for email in batch:
+                    result[self.send(email, connection)] += 1
+        finally:
+            connection.close()
+
+        next_retry = (
+            OutboundEmail.objects.filter(status="PENDING")
+            .order_by("next_attempt_at")
+            .values_list("next_attempt_at", flat=True)
+            .first()
+        )
+        if next_retry is not None:
+            delay = max((next_retry - timezone.now()).total_seconds(), 0)
+            schedule_delivery(delay=delay)
+        return result
+
+    def claim_batch(self) -> list:
+        now = timezone.now()
+        ids = list(
+            OutboundEmail.objects.filter(status="PENDING", next_attempt_at__lte=now)
+            .order_by("next_attempt_at")
+            .values_list("pk", flat=True)[: self.batch_size]
+        )
+        if not ids:
+            return []
+
+        # only the rows still pending are ours
+        OutboundEmail.objects.filter(pk__in=ids, status="PENDING").update(
+            status="SENDING", claimed_at=now
+        )
+        return list(
+            OutboundEmail.objects.filter(pk__in=ids, status="SENDING", claimed_at=now)
+        )
+
+    def send(self, email: OutboundEmail, connection) -> str:
+        email.attempts += 1
+        try:
+            # no-op while the connection is open, reconnects after a failure
+            connection.open()
+            html_content, text_content = render_email(email.template, email.context)
+            message = EmailMultiAlternatives(
+                subject=email.subject,
+                body=text_content,
+                from_email=email.from_email,
+                to=[email.to],
+                connection=connection,
+            )
+            message.attach_alternative(html_content, "text/html")
+            message.send()
+        except Exception as e:
+            logger.warning("Email %s to %s failed: %s", email.pk, email.to, e)
+            # the connection may be broken, the next email opens a new one
+            connection.close()
+            email.last_error = str(e)
+            if email.attempts >= self.max_attempts:
+                email.status = "FAILED"
+            else:
+                email.status = "PENDING"
+                email.next_attempt_at = timezone.now() + timedelta(
+                    seconds=self.backoff * 2 ** (email.attempts - 1)
+                )
+        else:
+            email.status = "SENT"
+            email.sent_at = timezone.now()
+            email.last_error = ""
+
+        email.save(
+            update_fields=[
+                "status",
+                "attempts",
+                "last_error",
+                "next_attempt_at",
+                "sent_at",
+            ]
+        )
+        return {"SENT": "sent", "PENDING": "retrying", "FAILED": "failed"}[email.status]
+
+    def requeue_stale(self) -> int:
+        return OutboundEmail.objects.filter(
+            status="SENDING", claimed_at__lt=timezone.now() - STALE_AFTER
+        ).update(status="PENDING")
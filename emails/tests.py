@@ -0,0 +1,270 @@
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from emails.models import Broadcast, OutboundEmail
+from emails.services.broadcast import BroadcastService, start_broadcast
+from emails.services.outbox import OutboxService, queue_email
+from jobs.models import Job
+from jobs.services.job_queue import claim_next, run_job
+from users.models import NewsletterSubscription, User, UserProfileSettings
+
+
+class CountingBackend(EmailBackend):
+    """
+    locmem backend counting the connections opened, failing for the
+    addresses in `failing`.
+    """
+
+    opened = 0
+    failing = set()
+
+    def open(self):
+        if not getattr(self, "is_open", False):
+            self.is_open = True
+            CountingBackend.opened += 1
+            return True
+        return False
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.failing:
+                raise ConnectionError("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND="emails.tests.CountingBackend")
+class OutboxTest(TestCase):
+    def setUp(self):
+        CountingBackend.opened = 0
+        CountingBackend.failing = set()
+
+    def _queue(self, to, count=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                queue_email(
+                    "Bienvenido",
+                    to,
+                    {"user": f"User {i}", "year": 2026},
+                    "email/welcome-email.html",
+                )
+
+    def test_requests_only_queue(self):
+        self._queue("client@test.com", count=3)
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(status="PENDING").count(), 3)
+        # one job sends them all
+        self.assertEqual(Job.objects.filter(kind="emails.send").count(), 1)
+
+    def test_batches_reuse_one_connection(self):
+        self._queue("client@test.com", count=5)
+
+        result = OutboxService(batch_size=2).deliver()
+
+        self.assertEqual(result, {"sent": 5, "retrying": 0, "failed": 0})
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertIn("Hola User", mail.outbox[0].alternatives[0][0])
+        self.assertFalse(OutboundEmail.objects.exclude(status="SENT").exists())
+
+    def test_failed_emails_are_retried_with_backoff(self):
+        CountingBackend.failing = {"broken@test.com"}
+        self._queue("broken@test.com")
+        self._queue("client@test.com")
+
+        with self.assertLogs("emails.services.outbox", "WARNING"):
+            run_job(claim_next("test"))
+
+        self.assertEqual(len(mail.outbox), 1)
+        email = OutboundEmail.objects.get(to="broken@test.com")
+        self.assertEqual(email.status, "PENDING")
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        # a delayed job for the retry
+        delayed = Job.objects.filter(kind="emails.send", run_after__isnull=False)
+        self.assertEqual(delayed.count(), 1)
+
+    def test_emails_fail_after_the_last_attempt(self):
+        CountingBackend.failing = {"broken@test.com"}
+        self._queue("broken@test.com")
+
+        with self.assertLogs("emails.services.outbox", "WARNING"):
+            result = OutboxService(max_attempts=3, backoff=0).deliver()
+
+        self.assertEqual(result, {"sent": 0, "retrying": 2, "failed": 1})
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, "FAILED")
+        self.assertEqual(email.attempts, 3)
+
+    def test_worker_sends_the_queue(self):
+        self._queue("client@test.com", count=2)
+
+        run_job(claim_next("test"))
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ["client@test.com"])
+        self.assertEqual(mail.outbox[0].from_email, "no-reply@avoberry.com")
+
+
+@override_settings(EMAIL_BACKEND="emails.tests.CountingBackend")
+class BroadcastTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for email in ["ana@test.com", "both@test.com", "zoe@test.com"]:
+            NewsletterSubscription.objects.create(email=email)
+        users = [
+            ("carla@test.com", "Carla", True),
+            ("both@test.com", "Beto", True),
+            ("off@test.com", "Omar", False),
+        ]
+        for i, (email, name, newsletter) in enumerate(users):
+            user = User.objects.create_user(
+                username=f"reader{i}", email=email, first_name=name, dni=f"3000000{i}"
+            )
+            UserProfileSettings.objects.create(user=user, monthly_newsletter=newsletter)
+
+    def setUp(self):
+        CountingBackend.opened = 0
+        CountingBackend.failing = set()
+
+    def _start(self):
+        return start_broadcast(
+            "Novedades de octubre",
+            {"title": "Cosecha de temporada", "body": "Llegaron las fresas."},
+            queue=False,
+        )
+
+    def test_sends_once_to_every_subscriber(self):
+        broadcast = self._start()
+
+        result = BroadcastService(broadcast, rate=0, chunk_size=2).run()
+
+        recipients = [message.to[0] for message in mail.outbox]
+        self.assertEqual(
+            recipients,
+            ["ana@test.com", "both@test.com", "carla@test.com", "zoe@test.com"],
+        )
+        self.assertEqual(
+            result,
+            {
+                "broadcast": broadcast.pk,
+                "status": "DONE",
+                "total": 4,
+                "sent": 4,
+                "deferred": 0,
+            },
+        )
+        self.assertEqual(CountingBackend.opened, 1)
+        html = mail.outbox[2].alternatives[0][0]
+        self.assertIn("Hola Carla", html)
+        self.assertIn("Llegaron las fresas.", html)
+
+    def test_progress_is_reported_per_email(self):
+        broadcast = self._start()
+        progress = []
+
+        BroadcastService(
+            broadcast, rate=0, on_progress=lambda *args: progress.append(args)
+        ).run()
+
+        self.assertEqual(progress, [(1, 4), (2, 4), (3, 4), (4, 4)])
+
+    def test_connection_is_renewed(self):
+        broadcast = self._start()
+
+        BroadcastService(broadcast, rate=0, messages_per_connection=3).run()
+
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(CountingBackend.opened, 2)
+
+    def test_resumes_after_the_checkpoint(self):
+        broadcast = self._start()
+        # a previous run died after sending to both@test.com
+        Broadcast.objects.filter(pk=broadcast.pk).update(
+            status="RUNNING", cursor="both@test.com", sent=2, total=4
+        )
+        broadcast.refresh_from_db()
+
+        result = BroadcastService(broadcast, rate=0).run()
+
+        self.assertEqual(
+            [message.to[0] for message in mail.outbox],
+            ["carla@test.com", "zoe@test.com"],
+        )
+        self.assertEqual(result["sent"], 4)
+        self.assertEqual(result["status"], "DONE")
+
+    def test_failed_sends_go_to_the_outbox(self):
+        CountingBackend.failing = {"carla@test.com"}
+        broadcast = self._start()
+
+        with self.assertLogs("emails.services.broadcast", "WARNING"):
+            result = BroadcastService(broadcast, rate=0).run()
+
+        self.assertEqual((result["sent"], result["deferred"]), (3, 1))
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to, "carla@test.com")
+        self.assertEqual(email.context["name"], "Carla")
+
+    def test_time_limit_hands_over_to_a_new_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcast = start_broadcast("Novedades", {"body": "Hola"})
+
+        with override_settings(BROADCAST_TIME_LIMIT=0.05, BROADCAST_RATE_LIMIT=40):
+            run_job(claim_next("test"))
+
+        broadcast.refresh_from_db()
+        self.assertEqual(broadcast.status, "RUNNING")
+        self.assertTrue(0 < broadcast.sent < 4)
+        self.assertEqual(
+            Job.objects.filter(kind="emails.broadcast", status="PENDING").count(), 1
+        )
+
+        run_job(claim_next("test"))
+
+        broadcast.refresh_from_db()
+        self.assertEqual(broadcast.status, "DONE")
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(len({message.to[0] for message in mail.outbox}), 4)
+
+    def test_cancelled_broadcast_stops(self):
+        broadcast = self._start()
+        Broadcast.objects.filter(pk=broadcast.pk).update(status="CANCELLED")
+        broadcast.refresh_from_db()
+
+        result = BroadcastService(broadcast, rate=0).run()
+
+        self.assertEqual(result["status"], "CANCELLED")
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_api_starts_a_broadcast(self):
+        admin = User.objects.create_superuser(
+            username="admin", email="admin@test.com", password="x", dni="30000009"
+        )
+        self.client.force_login(admin)
+
+        response = self.client.post(
+            "/api/v2/dashboard/newsletter/broadcasts/",
+            {"subject": "Novedades", "context": {"body": "Hola"}},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "PENDING")
+        self.assertTrue(
+            Job.objects.filter(
+                kind="emails.broadcast", payload={"broadcast": response.json()["id"]}
+            ).exists()
+        )
+
+        response = self.client.post(
+            "/api/v2/dashboard/newsletter/broadcasts/",
+            {"subject": "Novedades", "template": "email/missing.html"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from .views import BroadcastDetailAPIView, BroadcastListAPIView
+
+urlpatterns = [
+    path("dashboard/newsletter/broadcasts/", BroadcastListAPIView.as_view()),
+    path(
+        "dashboard/newsletter/broadcasts/<int:broadcast_id>/",
+        BroadcastDetailAPIView.as_view(),
+    ),
+]
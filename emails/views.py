@@ -0,0 +1,58 @@
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Broadcast
+from .serializers import BroadcastSerializer
+from .services.broadcast import start_broadcast
+
+
+class BroadcastListAPIView(APIView):
+    """
+    GET lists the newsletter broadcasts with their progress, newest first.
+    POST starts a new one: `subject`, `context` ({"title", "body", "cta_url",
+    "cta_text"} for the default template) and optionally `template`.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        paginator = LimitOffsetPagination()
+        paginated_queryset = paginator.paginate_queryset(
+            Broadcast.objects.all(), request
+        )
+        serializer = BroadcastSerializer(paginated_queryset, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def post(self, request):
+        serializer = BroadcastSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        broadcast = start_broadcast(user=request.user, **serializer.validated_data)
+        return Response(
+            BroadcastSerializer(broadcast).data, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class BroadcastDetailAPIView(APIView):
+    """
+    GET returns the progress of a broadcast, DELETE cancels it. The emails
+    already sent stay sent.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, broadcast_id):
+        broadcast = get_object_or_404(Broadcast, pk=broadcast_id)
+        return Response(BroadcastSerializer(broadcast).data, status=status.HTTP_200_OK)
+
+    def delete(self, request, broadcast_id):
+        broadcast = get_object_or_404(Broadcast, pk=broadcast_id)
+        Broadcast.objects.filter(
+            pk=broadcast.pk, status__in=("PENDING", "RUNNING")
+        ).update(status="CANCELLED")
+        broadcast.refresh_from_db()
+        return Response(BroadcastSerializer(broadcast).data, status=status.HTTP_200_OK)
@@ -0,0 +1,67 @@
+import os
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from jobs.services.job_queue import claim_next, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Runs the queued background jobs (imports, reports) with a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.JOBS_WORKERS)
+        parser.add_argument(
+            "--poll-interval", type=float, default=settings.JOBS_POLL_INTERVAL
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run the pending jobs and exit instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda *_: self.stopping.set())
+
+        workers = max(options["workers"], 1)
+        name = f"{socket.gethostname()}:{os.getpid()}"
+        slots = threading.Semaphore(workers)
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale jobs")
+        self.stdout.write(f"Worker {name} started with {workers} threads")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while not self.stopping.is_set():
+                slots.acquire()
+                job = claim_next(f"{name}:{threading.get_ident()}")
+                if job is None:
+                    slots.release()
+                    if options["once"]:
+                        break
+                    self.stopping.wait(options["poll_interval"])
+                    continue
+
+                self.stdout.write(f"Running job {job.pk} ({job.kind})")
+                future = pool.submit(self._run, job)
+                future.add_done_callback(lambda _: slots.release())
+
+        connection.close()
+        self.stdout.write(f"Worker {name} stopped")
+
+    def _run(self, job):
+        close_old_connections()
+        try:
+            job = run_job(job)
+            self.stdout.write(f"Job {job.pk} finished: {job.status}")
+        finally:
+            # every thread has its own connection
+            connection.close()
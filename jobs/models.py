@@ -0,0 +1,78 @@
+import uuid
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    A unit of background work stored in the database.
+    Created by `enqueue()` and executed by the `run_jobs` worker.
+    """
+
+    # a running job writes its heartbeat at most this often
+    HEARTBEAT_INTERVAL = timedelta(seconds=10)
+
+    STATUS = (
+        ("PENDING", "PENDING"),
+        ("RUNNING", "RUNNING"),
+        ("SUCCEEDED", "SUCCEEDED"),
+        ("FAILED", "FAILED"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS, default="PENDING")
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=1)
+    worker = models.CharField(max_length=100, blank=True)
+
+    created_by = models.ForeignKey(
+        "users.User", null=True, blank=True, on_delete=models.SET_NULL
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    # delayed jobs are not claimed before this time
+    run_after = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # touched by the running job, a stale one means its worker is gone
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            # the worker polls the oldest pending jobs
+            models.Index(fields=["status", "created_at"], name="job_status_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} | {self.kind} | {self.status} | {self.progress}%"
+
+    def set_progress(self, progress: int) -> None:
+        progress = max(0, min(int(progress), 100))
+        if progress == self.progress:
+            self.heartbeat()
+            return
+        self.progress, self.heartbeat_at = progress, timezone.now()
+        Job.objects.filter(pk=self.pk).update(
+            progress=self.progress, heartbeat_at=self.heartbeat_at
+        )
+
+    def heartbeat(self) -> None:
+        """
+        Tells `requeue_stale_jobs()` the job is still running. Long handlers
+        call it as they make progress, it writes at most once per
+        `HEARTBEAT_INTERVAL`.
+        """
+        now = timezone.now()
+        if self.heartbeat_at and now - self.heartbeat_at < self.HEARTBEAT_INTERVAL:
+            return
+        self.heartbeat_at = now
+        Job.objects.filter(pk=self.pk).update(heartbeat_at=now)
@@ -0,0 +1,158 @@
+import logging
+import os
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F, Q
+from django.utils import timezone
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+# kind -> callable(job) returning a JSON serializable result
+JOB_HANDLERS = {}
+
+
+def job_handler(kind: str):
+    """
+    Registers the decorated function as the handler of `kind` jobs.
+
+    Usage (inside `<app>/jobs.py`, autodiscovered by the jobs app):
+        @job_handler("products.import")
+        def import_products(job): ...
+    """
+
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+
+    return decorator
+
+
+def enqueue(
+    kind: str, payload: dict = None, user=None, max_attempts: int = 1, delay=None
+) -> Job:
+    """
+    `delay` (seconds) keeps the job from being claimed until it has elapsed.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind '{kind}'")
+
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        created_by=user if user and user.is_authenticated else None,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay) if delay else None,
+    )
+
+
+def claim_next(worker: str):
+    """
+    Marks the oldest pending job as running and returns it, `None` if there
+    is nothing to do. The conditional UPDATE makes the claim safe between
+    workers on any database, no row locks needed.
+    """
+    while True:
+        candidate = (
+            Job.objects.filter(status="PENDING")
+            .filter(Q(run_after__isnull=True) | Q(run_after__lte=timezone.now()))
+            .order_by("created_at")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if candidate is None:
+            return None
+
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=candidate, status="PENDING").update(
+            status="RUNNING",
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=candidate)
+        # another worker took it first, try the next one
+
+
+def run_job(job: Job) -> Job:
+    """
+    Executes a claimed job and stores its result or error.
+    """
+    handler = JOB_HANDLERS.get(job.kind)
+
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind '{job.kind}'")
+        job.result = handler(job)
+        job.status = "SUCCEEDED"
+        job.progress = 100
+        job.error = ""
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job.pk, job.kind)
+        job.error = f"{e}\n\n{traceback.format_exc()}"
+        # retry later if there are attempts left, backing off exponentially
+        if job.attempts < job.max_attempts:
+            job.status = "PENDING"
+            backoff = settings.JOBS_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            job.run_after = timezone.now() + timedelta(seconds=backoff)
+        else:
+            job.status = "FAILED"
+
+    job.finished_at = timezone.now()
+    job.save(
+        update_fields=[
+            "result",
+            "status",
+            "progress",
+            "error",
+            "run_after",
+            "finished_at",
+        ]
+    )
+    return job
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Jobs left RUNNING by a dead worker go back to the queue (or fail when they
+    have no attempts left) once their heartbeat is older than
+    `JOBS_STALE_AFTER` seconds. A job still running keeps it fresh through
+    `Job.set_progress()` and `Job.heartbeat()`.
+    """
+    limit = timezone.now() - timedelta(seconds=settings.JOBS_STALE_AFTER)
+    stale = Job.objects.filter(status="RUNNING").filter(
+        Q(heartbeat_at__lt=limit)
+        # claimed before jobs had a heartbeat
+        | Q(heartbeat_at__isnull=True, started_at__lt=limit)
+    )
+
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status="FAILED", error="Worker stopped while running the job"
+    )
+    requeued = stale.update(status="PENDING")
+    return failed + requeued
+
+
+def save_upload(file) -> str:
+    """
+    Copies an uploaded file to the default storage so a worker can read it
+    after the request is gone. Returns its storage name.
+    """
+    name = os.path.basename(file.name or "upload")
+    return default_storage.save(f"jobs/uploads/{uuid.uuid4().hex}/{name}", file)
+
+
+def open_upload(name: str):
+    return default_storage.open(name, "rb")
+
+
+def delete_upload(name: str) -> None:
+    if name:
+        default_storage.delete(name)
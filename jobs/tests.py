@@ -0,0 +1,240 @@
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from jobs.models import Job
+from jobs.services.job_queue import (
+    claim_next,
+    enqueue,
+    job_handler,
+    requeue_stale_jobs,
+    run_job,
+)
+from products.models import Product
+from users.models import User
+
+
+@job_handler("tests.echo")
+def echo(job):
+    if job.payload.get("fail"):
+        raise RuntimeError("boom")
+    return job.payload
+
+
+class JobQueueTest(TestCase):
+    def test_unknown_kinds_are_rejected(self):
+        with self.assertRaises(ValueError):
+            enqueue("tests.unknown")
+
+    def test_jobs_are_claimed_oldest_first_and_once(self):
+        first = enqueue("tests.echo", {"n": 1})
+        second = enqueue("tests.echo", {"n": 2})
+        Job.objects.filter(pk=second.pk).update(
+            created_at=first.created_at + timedelta(seconds=1)
+        )
+
+        job = claim_next("a")
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual((job.status, job.worker, job.attempts), ("RUNNING", "a", 1))
+        self.assertEqual(claim_next("b").pk, second.pk)
+        self.assertIsNone(claim_next("c"))
+
+    def test_delayed_jobs_wait(self):
+        job = enqueue("tests.echo", delay=60)
+        self.assertIsNone(claim_next("a"))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(claim_next("a").pk, job.pk)
+
+    def test_results_are_stored(self):
+        enqueue("tests.echo", {"n": 1})
+
+        job = run_job(claim_next("a"))
+
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.result, job.progress), ("SUCCEEDED", {"n": 1}, 100)
+        )
+        self.assertIsNotNone(job.finished_at)
+
+    @override_settings(JOBS_RETRY_BACKOFF=30)
+    def test_failures_are_retried_until_they_fail(self):
+        enqueue("tests.echo", {"fail": True}, max_attempts=2)
+
+        with self.assertLogs("jobs.services.job_queue", "ERROR"):
+            job = run_job(claim_next("a"))
+        self.assertEqual(job.status, "PENDING")
+        self.assertIn("boom", job.error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=25))
+        self.assertIsNone(claim_next("a"))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs("jobs.services.job_queue", "ERROR"):
+            job = run_job(claim_next("a"))
+        self.assertEqual((job.status, job.attempts), ("FAILED", 2))
+        self.assertIsNone(claim_next("a"))
+
+    @override_settings(JOBS_STALE_AFTER=60)
+    def test_stale_jobs_are_requeued_or_failed(self):
+        retried = enqueue("tests.echo", max_attempts=2)
+        exhausted = enqueue("tests.echo")
+        running = enqueue("tests.echo")
+        for job in (retried, exhausted, running):
+            claim_next("dead")
+        Job.objects.exclude(pk=running.pk).update(
+            heartbeat_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        self.assertEqual(requeue_stale_jobs(), 2)
+
+        statuses = dict(Job.objects.values_list("pk", "status"))
+        self.assertEqual(statuses[retried.pk], "PENDING")
+        self.assertEqual(statuses[exhausted.pk], "FAILED")
+        self.assertEqual(statuses[running.pk], "RUNNING")
+
+    @override_settings(JOBS_STALE_AFTER=60)
+    def test_long_running_jobs_with_a_heartbeat_are_kept(self):
+        enqueue("tests.echo")
+        job = claim_next("alive")
+        # started long ago, the heartbeat written on claim is stale too
+        past = timezone.now() - timedelta(minutes=5)
+        Job.objects.filter(pk=job.pk).update(started_at=past, heartbeat_at=past)
+        job.refresh_from_db()
+
+        job.set_progress(40)
+        self.assertEqual(requeue_stale_jobs(), 0)
+
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=past)
+        job.refresh_from_db()
+        job.heartbeat()
+        self.assertEqual(requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), ("RUNNING", 40))
+
+    def test_heartbeat_writes_are_throttled(self):
+        enqueue("tests.echo")
+        job = claim_next("a")
+
+        with self.assertNumQueries(0):
+            job.heartbeat()
+            job.set_progress(0)
+        with self.assertNumQueries(1):
+            job.set_progress(10)
+
+
+class JobEndpointsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@test.com", dni="1", role="admin"
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_async_import_is_accepted_and_reported(self):
+        content = (
+            "sku,name,description,price,discount_price,purchase_price,stock,"
+            "category,score,recommended,best_seller,tag,quality,weight,slug\n"
+            "P1,Fresa,Fresa,10,,5,3,,,,,Org,primera,1,\n"
+        )
+        file = SimpleUploadedFile(
+            "products.csv", content.encode(), content_type="text/csv"
+        )
+
+        response = self.client.post(
+            "/api/v2/dashboard/products/import/?async=true", {"file": file}
+        )
+
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get(pk=response.json()["job_id"])
+        self.assertEqual((job.kind, job.created_by), ("products.import", self.admin))
+        self.assertTrue(response.json()["status_url"].endswith(f"/jobs/{job.pk}/"))
+        self.assertFalse(Product.objects.exists())
+
+        status_url = f"/api/v2/dashboard/jobs/{job.pk}/"
+        self.assertEqual(self.client.get(status_url).json()["status"], "PENDING")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            run_job(claim_next("test"))
+
+        data = self.client.get(status_url).json()
+        self.assertEqual(data["status"], "SUCCEEDED")
+        self.assertEqual(data["result"]["created"], 1)
+        self.assertTrue(Product.objects.filter(sku="P1").exists())
+
+    def test_status_endpoint(self):
+        job = enqueue("tests.echo")
+
+        self.assertEqual(
+            self.client.get(f"/api/v2/dashboard/jobs/{job.pk}/").json()["kind"],
+            "tests.echo",
+        )
+        response = self.client.get("/api/v2/dashboard/jobs/?kind=tests.echo")
+        self.assertEqual(response.json()["count"], 1)
+        self.assertEqual(
+            self.client.get(
+                "/api/v2/dashboard/jobs/00000000-0000-0000-0000-000000000000/"
+            ).status_code,
+            404,
+        )
+
+        self.client.force_authenticate(None)
+        self.assertEqual(
+            self.client.get(f"/api/v2/dashboard/jobs/{job.pk}/").status_code, 401
+        )
+
+
+class ClaimConcurrencyTest(TransactionTestCase):
+    """
+    Workers claiming at the same time never get the same job.
+    """
+
+    JOBS = 30
+    WORKERS = 6
+
+    def _worker(self, name, barrier, claimed):
+        barrier.wait()
+        try:
+            while True:
+                try:
+                    job = claim_next(name)
+                except OperationalError:
+                    # SQLite allows one writer at a time, try again
+                    continue
+                if job is None:
+                    return
+                claimed.append(job.pk)
+        finally:
+            connection.close()
+
+    def test_every_job_is_claimed_once(self):
+        for n in range(self.JOBS):
+            enqueue("tests.echo", {"n": n})
+
+        barrier = threading.Barrier(self.WORKERS)
+        claimed = []
+        threads = [
+            threading.Thread(target=self._worker, args=(f"w{i}", barrier, claimed))
+            for i in range(self.WORKERS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(claimed), self.JOBS)
+        self.assertEqual(len(set(claimed)), self.JOBS)
+        self.assertFalse(Job.objects.exclude(status="RUNNING").exists())
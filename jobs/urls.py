@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .views import JobDetailAPIView, JobListAPIView
+
+urlpatterns = [
+    path("dashboard/jobs/", JobListAPIView.as_view()),
+    path("dashboard/jobs/<uuid:job_id>/", JobDetailAPIView.as_view()),
+]
@@ -0,0 +1,64 @@
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Job
+from .serializers import JobSerializer
+
+
+def is_async_request(request) -> bool:
+    """
+    Endpoints that support background jobs run them when `?async=true`.
+    """
+    return request.query_params.get("async", "").lower() in ("true", "1", "yes")
+
+
+def job_accepted_response(request, job) -> Response:
+    """
+    `202 Accepted` response returned by the endpoints that enqueue a job.
+    """
+    return Response(
+        {
+            "job_id": job.pk,
+            "status": job.status,
+            "status_url": request.build_absolute_uri(f"/api/v2/dashboard/jobs/{job.pk}/"),
+        },
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+class JobListAPIView(APIView):
+    """
+    Lists the background jobs, newest first.
+    Filters: `status` and `kind`.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        queryset = Job.objects.all()
+
+        if request.query_params.get("status"):
+            queryset = queryset.filter(status=request.query_params["status"].upper())
+        if request.query_params.get("kind"):
+            queryset = queryset.filter(kind=request.query_params["kind"])
+
+        paginator = LimitOffsetPagination()
+        paginated_queryset = paginator.paginate_queryset(queryset, request)
+        serializer = JobSerializer(paginated_queryset, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class JobDetailAPIView(APIView):
+    """
+    Status, progress and result of a job.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(Job, pk=job_id)
+        return Response(JobSerializer(job).data, status=status.HTTP_200_OK)
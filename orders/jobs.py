@@ -0,0 +1,22 @@
+from jobs.services.job_queue import delete_upload, job_handler, open_upload
+from orders.services.orders_handler import OrdersFileParser, OrdersUploadFileService
+
+
+@job_handler("orders.import")
+def import_orders(job):
+    name, items_name = job.payload["file"], job.payload.get("items_file")
+    try:
+        with open_upload(name) as file:
+            items_file = open_upload(items_name) if items_name else None
+            try:
+                orders, items = OrdersFileParser().parse(file, items_file)
+                service = OrdersUploadFileService(
+                    on_progress=lambda done, total: job.set_progress(done * 100 / total)
+                )
+                return service.execute(orders, items)
+            finally:
+                if items_file:
+                    items_file.close()
+    finally:
+        delete_upload(name)
+        delete_upload(items_name)
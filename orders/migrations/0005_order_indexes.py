@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0004_alter_order_options_and_more"),
+        ("products", "0014_product_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["status", "user"], name="order_status_user_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="order_created_at_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orderproduct",
+            index=models.Index(
+                fields=["order", "product"], name="orderproduct_order_prod_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(
+                fields=["product", "created_at"], name="stockmovement_prod_date_idx"
+            ),
+        ),
+    ]
@@ -1,21 +1,77 @@
 import random
 import string
+from django.core.exceptions import ValidationError
 from django.db import models
 
 from products.models import Product, UnitOfMeasure
 
+# random picks of the letters of an ID, and rounds of checks against the
+# database, before giving up
+ORDER_ID_ATTEMPTS = 10
 
-def generate_order_id(user_dni):
+
+class OrderIdsExhaustedError(ValidationError):
+    def __init__(self, suffix) -> None:
+        self.suffix = suffix
+        super().__init__(f"Every order ID ending in {suffix} is already taken")
+
+
+def generate_order_id(user_dni, letters=None):
     suffix = str(user_dni)[-5:]
-    letters = "".join(random.choices(string.ascii_uppercase, k=2))
+    letters = letters or "".join(random.choices(string.ascii_uppercase, k=2))
     return f"AVB{letters}{suffix}"
 
 
 def generate_unique_order_id(user_dni):
-    while True:
-        custom_id = generate_order_id(user_dni)
-        if not Order.objects.filter(id=custom_id).exists():
-            return custom_id
+    return generate_unique_order_ids([user_dni])[0]
+
+
+def generate_unique_order_ids(user_dnis) -> list:
+    """
+    Bulk version of `generate_unique_order_id`: returns one unique ID per dni,
+    checking the candidates against the database in one query per round.
+
+    There are only 26² IDs per dni suffix. Raises `OrderIdsExhaustedError`
+    when they are all used, or still taken after `ORDER_ID_ATTEMPTS` rounds.
+    """
+    ids = [None] * len(user_dnis)
+    # generated in this call or found in the database
+    excluded = set()
+    pending = list(range(len(user_dnis)))
+
+    for _ in range(ORDER_ID_ATTEMPTS):
+        for i in pending:
+            ids[i] = _free_order_id(user_dnis[i], excluded)
+            excluded.add(ids[i])
+
+        taken = set(
+            Order.objects.filter(id__in=[ids[i] for i in pending]).values_list(
+                "id", flat=True
+            )
+        )
+        pending = [i for i in pending if ids[i] in taken]
+        if not pending:
+            return ids
+
+    raise OrderIdsExhaustedError(str(user_dnis[pending[0]])[-5:])
+
+
+def _free_order_id(user_dni, excluded) -> str:
+    for _ in range(ORDER_ID_ATTEMPTS):
+        candidate = generate_order_id(user_dni)
+        if candidate not in excluded:
+            return candidate
+
+    # most IDs of this suffix are used, pick one of the rest
+    free = [
+        candidate
+        for first in string.ascii_uppercase
+        for second in string.ascii_uppercase
+        if (candidate := generate_order_id(user_dni, first + second)) not in excluded
+    ]
+    if not free:
+        raise OrderIdsExhaustedError(str(user_dni)[-5:])
+    return random.choice(free)
 
 
 class Order(models.Model):
@@ -73,6 +129,11 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "user"], name="order_status_user_idx"),
+            # default ordering and keyset pagination ("-created_at", "-id")
+            models.Index(fields=["-created_at", "-id"], name="order_created_at_idx"),
+        ]
 
 
 class OrderProduct(models.Model):
@@ -88,6 +149,11 @@ class OrderProduct(models.Model):
         verbose_name="unity",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["order", "product"], name="orderproduct_order_prod_idx"),
+        ]
+
     def __str__(self):
         return f"OrderProduct: {self.product.name} (x{self.quantity}) in Order {self.order.pk}"
 
@@ -115,6 +181,13 @@ class StockMovement(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["product", "created_at"], name="stockmovement_prod_date_idx"
+            ),
+        ]
+
     def __str__(self):
         sign = "+" if self.movement_type == "IN" else "-"
         return f"{self.product.name} {sign}{self.quantity}"
@@ -1,15 +1,28 @@
-from io import BytesIO
+import os
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
 from datetime import datetime
+from django.conf import settings
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.db.models import F, Sum, FloatField
 from django.db.models.functions import Coalesce
+from django.utils import timezone
 from rest_framework import serializers
-from openpyxl import load_workbook
 from django.contrib.auth import get_user_model
 
-from orders.models import Order, OrderProduct, StockMovement
+from orders.models import (
+    Order,
+    OrderProduct,
+    generate_unique_order_ids,
+)
 from products.models import Product, UnitOfMeasure
+from products.services.inventory import InventoryService, StockLine
+from salesreport.services.rollups import mark_orders_dirty
+from users.services.dashboard_metrics import invalidate_dashboard_metrics
+from utils.ingestion import batched, is_csv, iter_rows
 
 User = get_user_model()
 
@@ -114,6 +127,15 @@ def validate_excel_data(orders_sheet, items_sheet):
 
 class OrdersFileSerializer(serializers.Serializer):
     file = serializers.FileField()
+    # CSV has a single sheet, the `OrderProduct` rows come in a second file
+    items_file = serializers.FileField(required=False)
+
+    def validate(self, attrs):
+        if is_csv(attrs["file"]) and not attrs.get("items_file"):
+            raise serializers.ValidationError(
+                {"items_file": "Required when the orders file is a CSV."}
+            )
+        return attrs
 
 
 class UploadOrderFileSerializer(serializers.Serializer):
@@ -121,40 +143,170 @@ class UploadOrderFileSerializer(serializers.Serializer):
 
 
 class OrdersFileParser:
-
-    def parse(self, file) -> tuple:
-        workbook = load_workbook(
-            filename=BytesIO(file.read()), read_only=True, data_only=True
+    """
+    Returns lazy row iterators for the `Orders` and `OrderProduct` sheets of an
+    .xlsx file, or for two CSV files (orders and items).
+    The iterators share the upload, consume them one after the other.
+    """
+
+    def parse(self, file, items_file=None) -> tuple:
+        if is_csv(file):
+            return iter_rows(file), iter_rows(items_file)
+
+        return iter_rows(file, sheet="Orders"), iter_rows(file, sheet="OrderProduct")
+
+
+class OrdersSpool:
+    """
+    Temporary SQLite file holding the parsed rows of an orders import, items
+    indexed by order ID. The import reads the orders back one chunk at a
+    time, with the items of that chunk, instead of keeping the whole file
+    in memory.
+    """
+
+    ORDER_FIELDS = (
+        "id",
+        "user_dni",
+        "status",
+        "discount_applied",
+        "discount_type",
+        "discount_value",
+        "shipping_cost",
+    )
+    ITEM_FIELDS = ("order_id", "sku", "price", "quantity", "unit_id")
+    # old SQLite versions allow 999 parameters per statement
+    MAX_PARAMS = 500
+    # rows repeating an order ID update the same order, the last one wins
+    LAST_ORDERS = (
+        "FROM orders WHERE id IS NULL "
+        "OR line IN (SELECT MAX(line) FROM orders GROUP BY id)"
+    )
+
+    def __init__(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = sqlite3.connect(os.path.join(self.directory.name, "orders.sqlite3"))
+        self.db.executescript(f"""
+            CREATE TABLE orders (line INTEGER PRIMARY KEY, {", ".join(self.ORDER_FIELDS)});
+            CREATE TABLE items ({", ".join(self.ITEM_FIELDS)});
+            CREATE INDEX items_order_id ON items (order_id);
+            """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+        self.directory.cleanup()
+
+    def add_orders(self, rows) -> int:
+        return self._insert("orders", self.ORDER_FIELDS, rows)
+
+    def add_items(self, items) -> int:
+        return self._insert("items", self.ITEM_FIELDS, items)
+
+    def count_orders(self) -> int:
+        return self.db.execute(f"SELECT COUNT(*) {self.LAST_ORDERS}").fetchone()[0]
+
+    def iter_orders(self, size: int):
+        """
+        Yields the orders in lists of `size`, in file order.
+        """
+        cursor = self.db.execute(
+            f"SELECT {', '.join(self.ORDER_FIELDS)} {self.LAST_ORDERS} ORDER BY line"
         )
+        while batch := cursor.fetchmany(size):
+            rows = [dict(zip(self.ORDER_FIELDS, values)) for values in batch]
+            for row in rows:
+                row["discount_applied"] = bool(row["discount_applied"])
+            yield rows
 
-        orders_sheet = workbook["Orders"]
-        order_items_sheet = workbook["OrderProduct"]
-
-        return orders_sheet, order_items_sheet
+    def items_for(self, order_ids) -> dict:
+        """
+        Order ID -> items of the given orders, in file order.
+        """
+        items = defaultdict(list)
+        for ids in batched(order_ids, self.MAX_PARAMS):
+            cursor = self.db.execute(
+                f"SELECT {', '.join(self.ITEM_FIELDS)} FROM items "
+                f"WHERE order_id IN ({', '.join('?' * len(ids))}) ORDER BY rowid",
+                ids,
+            )
+            for values in cursor:
+                item = dict(zip(self.ITEM_FIELDS, values))
+                items[item.pop("order_id")].append(item)
+        return items
+
+    def _insert(self, table: str, fields: tuple, rows) -> int:
+        sql = (
+            f"INSERT INTO {table} ({', '.join(fields)}) "
+            f"VALUES ({', '.join('?' * len(fields))})"
+        )
+        count = 0
+        for batch in batched(rows):
+            self.db.executemany(
+                sql, [[row[field] for field in fields] for row in batch]
+            )
+            count += len(batch)
+        return count
 
 
 class OrdersUploadFileService:
-
-    def execute(self, orders_sheet, items_sheet) -> dict:
-        with transaction.atomic():
-            orders_map = self._create_or_update_orders(orders_sheet)
-            order_items = self._create_order_items(items_sheet, orders_map)
-            self._calculate_totals(orders_map)
-            items_map = [
-                {"sku": item.product.sku, "quantity": item.quantity}
-                for item in order_items
-            ]
-            self._update_products_stock(items_map)
+    """
+    Imports the `Orders` and `OrderProduct` sheets with set-based queries.
+
+    - The rows are parsed as they are read and spooled to an `OrdersSpool`,
+      only one chunk of orders and their items is in memory at a time.
+    - Users, products and existing orders of a chunk are resolved with one
+      `__in` query each, new order IDs are generated in memory.
+    - Orders, items and stock movements are written with `bulk_create` /
+      `bulk_update` and totals are computed from the parsed rows.
+    - Work is committed every `chunk_size` orders, so a big file doesn't hold
+      one long transaction.
+    """
+
+    INVALID_STOCK_STATUS = ("CANCELLED", "RETURNED", "FAILED")
+
+    def __init__(self, chunk_size: int = None, on_progress=None) -> None:
+        self.chunk_size = chunk_size or settings.ORDERS_IMPORT_CHUNK_SIZE
+        # optional callable(done_orders, total_orders) called after each chunk
+        self.on_progress = on_progress
+
+    def execute(self, orders_rows, items_rows) -> dict:
+        started = time.perf_counter()
+        self.skipped = 0
+
+        with OrdersSpool() as spool:
+            rows = spool.add_orders(self._parse_orders(orders_rows))
+            rows += spool.add_items(self._parse_items(items_rows))
+            total = spool.count_orders()
+            units = UnitOfMeasure.objects.in_bulk()
+
+            done = orders_count = items_count = 0
+            for chunk in spool.iter_orders(self.chunk_size):
+                with transaction.atomic():
+                    orders, items = self._import_chunk(chunk, spool, units)
+                orders_count += orders
+                items_count += items
+                done += len(chunk)
+                if self.on_progress:
+                    self.on_progress(done, total)
+
+        elapsed = time.perf_counter() - started
 
         return {
-            "orders": len(orders_map),
-            "items": len(order_items),
+            "orders": orders_count,
+            "items": items_count,
+            "skipped_rows": self.skipped,
+            "rows": rows,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed else rows,
         }
 
-    def _create_or_update_orders(self, orders_sheet) -> dict:
-        orders_map = {}
-
-        for row in orders_sheet.iter_rows(min_row=2, values_only=True):
+    def _parse_orders(self, orders_rows):
+        for row in orders_rows:
 
             if not any(row):
                 continue
@@ -169,20 +321,16 @@ class OrdersUploadFileService:
                     discount_value,
                     shipping_cost,
                 ) = row
-            except ValueError:
+                user_dni = str(int(user_dni))
+            except (ValueError, TypeError):
+                self.skipped += 1
                 continue
 
-            try:
-                user = User.objects.get(dni=str(int(user_dni)))
-            except (User.DoesNotExist, ValueError, TypeError):
-                continue
-
-            discount_applied_bool = discount_applied in (True, "TRUE", "True", "true")
-
-            order_data = {
-                "user": user,
+            yield {
+                "id": str(order_id) if order_id else None,
+                "user_dni": user_dni,
                 "status": status,
-                "discount_applied": discount_applied_bool,
+                "discount_applied": discount_applied in (True, "TRUE", "True", "true"),
                 "discount_type": discount_type,
                 "discount_value": float(discount_value) if discount_value else 0.0,
                 "shipping_cost": (
@@ -190,120 +338,155 @@ class OrdersUploadFileService:
                 ),
             }
 
-            if order_id:
-                order, _ = Order.objects.update_or_create(
-                    id=order_id,
-                    defaults=order_data,
-                )
-            else:
-                order = Order.objects.create(**order_data)
-
-            orders_map[order.id] = order
-
-        return orders_map
-
-    def _create_order_items(self, items_sheet, orders_map) -> list:
-        order_products = []
-
-        product_cache = {p.sku: p for p in Product.objects.all()}
-        unit_cache = {u.id: u for u in UnitOfMeasure.objects.all()}
-
-        for row in items_sheet.iter_rows(min_row=2, values_only=True):
+    def _parse_items(self, items_rows):
+        for row in items_rows:
 
             if not any(cell for cell in row[:5] if cell not in (None, "")):
                 continue
 
             if len(row) < 5:
+                self.skipped += 1
                 continue
 
             order_id, product_sku, price, quantity, measure_unit_id = row[:5]
 
-            if order_id not in orders_map:
-                continue
-
-            if product_sku not in product_cache:
-                continue
-
             try:
                 price = float(price)
                 quantity = int(quantity)
             except (TypeError, ValueError):
+                self.skipped += 1
                 continue
 
-            unit = None
-            if measure_unit_id:
-                try:
-                    unit = unit_cache.get(int(measure_unit_id))
-                except (ValueError, TypeError):
-                    pass
-
-            order_products.append(
-                OrderProduct(
-                    order=orders_map[order_id],
-                    product=product_cache[product_sku],
-                    price=price,
-                    quantity=quantity,
-                    measure_unity=unit,
-                )
-            )
-
-        # create a stock movement register
-        stock_movements = []
+            try:
+                unit_id = int(measure_unit_id) if measure_unit_id else None
+            except (ValueError, TypeError):
+                unit_id = None
+
+            yield {
+                "order_id": str(order_id),
+                "sku": product_sku,
+                "price": price,
+                "quantity": quantity,
+                "unit_id": unit_id,
+            }
 
-        for item in order_products:
+    def _import_chunk(self, rows, spool, units) -> tuple:
+        users = User.objects.in_bulk(
+            {row["user_dni"] for row in rows}, field_name="dni"
+        )
+        valid_rows = [row for row in rows if row["user_dni"] in users]
+        self.skipped += len(rows) - len(valid_rows)
+        rows = valid_rows
+        if not rows:
+            return 0, 0
+
+        items_by_order = spool.items_for([row["id"] for row in rows if row["id"]])
+        products = Product.objects.in_bulk(
+            {item["sku"] for items in items_by_order.values() for item in items}
+        )
 
-            # avoid create a register when order.status isn't validad
-            if item.order.status in ("CANCELLED", "RETURNED", "FAILLED"):
-                continue
-            stock_movements.append(
-                StockMovement(
-                    product=item.product,
-                    movement_type="OUT",
-                    quantity=item.quantity,
-                    reason=f"Stock movement by a related order {item.order.id}",
-                    related_order=item.order,
+        # Orders without ID get one generated in memory
+        new_ids = generate_unique_order_ids(
+            [row["user_dni"] for row in rows if not row["id"]]
+        )
+        new_ids = iter(new_ids)
+        for row in rows:
+            if not row["id"]:
+                row["id"] = next(new_ids)
+
+        existing = set(
+            Order.objects.filter(id__in=[row["id"] for row in rows]).values_list(
+                "id", flat=True
+            )
+        )
+        # Updated orders keep the items they already had
+        previous_subtotals = dict(
+            OrderProduct.objects.filter(order_id__in=existing)
+            .values("order_id")
+            .annotate(
+                total=Coalesce(
+                    Sum(F("price") * F("quantity"), output_field=FloatField()), 0.0
                 )
             )
+            .values_list("order_id", "total")
+        )
 
-        if order_products:
-            StockMovement.objects.bulk_create(stock_movements)
-            OrderProduct.objects.bulk_create(order_products)
-
-        return order_products
-
-    def _calculate_totals(self, orders_map):
-
-        for order in orders_map.values():
+        now = timezone.now()
+        to_create, to_update, order_items = [], [], []
+        for row in rows:
+            order = Order(
+                id=row["id"],
+                user=users[row["user_dni"]],
+                status=row["status"],
+                discount_applied=row["discount_applied"],
+                discount_type=row["discount_type"],
+                discount_value=row["discount_value"],
+                shipping_cost=row["shipping_cost"],
+                last_updated=now,
+            )
 
-            subtotal = OrderProduct.objects.filter(order=order).aggregate(
-                total=Coalesce(
-                    Sum(F("price") * F("quantity"), output_field=FloatField()), 0.0
+            subtotal = previous_subtotals.get(order.id, 0.0)
+            for item in items_by_order.get(order.id, ()):
+                product = products.get(item["sku"])
+                if product is None:
+                    continue
+                subtotal += item["price"] * item["quantity"]
+                order_items.append(
+                    OrderProduct(
+                        order=order,
+                        product=product,
+                        price=item["price"],
+                        quantity=item["quantity"],
+                        measure_unity=units.get(item["unit_id"]),
+                    )
                 )
-            )["total"]
 
             # Apply discount
             if order.discount_applied:
                 subtotal -= order.discount_value
+            order.subtotal = round(subtotal, 2)
+            order.total = round(subtotal + order.shipping_cost, 2)
+
+            (to_update if order.id in existing else to_create).append(order)
+
+        Order.objects.bulk_create(to_create)
+        Order.objects.bulk_update(
+            to_update,
+            fields=[
+                "user",
+                "status",
+                "discount_applied",
+                "discount_type",
+                "discount_value",
+                "shipping_cost",
+                "subtotal",
+                "total",
+                "last_updated",
+            ],
+        )
+        OrderProduct.objects.bulk_create(order_items)
+        self._create_stock_movements(order_items)
+        # bulk writes don't send the signals that keep the rollups and the
+        # dashboard metrics updated
+        mark_orders_dirty(row["id"] for row in rows)
+        transaction.on_commit(invalidate_dashboard_metrics)
 
-            total = subtotal + order.shipping_cost
-
-            order.subtotal = subtotal
-            order.total = total
-            order.save(update_fields=["subtotal", "total"])
+        return len(rows), len(order_items)
 
-    def _update_products_stock(self, items) -> None:
+    def _create_stock_movements(self, order_items) -> None:
         """
-        Updates the `Product` stock when we are creating a new `Order`
+        Takes the items out of the stock, registering their `StockMovement`.
+        Only what is available is discounted.
         """
-        skus = [item["sku"] for item in items]
-        items_stock = [item["quantity"] for item in items]
-        altered_products = Product.objects.filter(sku__in=skus)
-
-        updated_products = []
-
-        for i, item in enumerate(altered_products):
-            # TODO: what can happens if available stock is not enough ?
-            product = item
-            product.stock = item.stock - items_stock[i]
-            updated_products.append(product)
-        Product.objects.bulk_update(updated_products, fields=["stock"])
+        lines = [
+            StockLine(
+                item.product_id,
+                item.quantity,
+                order=item.order,
+                reason=f"Stock movement by a related order {item.order.id}",
+            )
+            for item in order_items
+            # avoid create a register when order.status isn't valid
+            if item.order.status not in self.INVALID_STOCK_STATUS
+        ]
+        InventoryService().reserve(lines, partial=True)
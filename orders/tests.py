@@ -1,3 +1,291 @@
-from django.test import TestCase
+import io
+import string
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+
+from orders.models import (
+    Order,
+    OrderIdsExhaustedError,
+    OrderProduct,
+    StockMovement,
+    generate_order_id,
+    generate_unique_order_ids,
+)
+from orders.services.orders_handler import OrdersFileParser, OrdersUploadFileService
+from products.models import Category, Product
+from users.models import User
+from utils.ingestion import iter_rows
+
+
+def order_row(order_id, dni, status="PENDING", shipping_cost=8000):
+    return (order_id, dni, status, "FALSE", "NONE", 0, shipping_cost)
+
+
+def item_row(order_id, sku, price=1000, quantity=1):
+    return (order_id, sku, price, quantity, None)
+
+
+ORDER_HEADER = (
+    "order_id",
+    "user_dni",
+    "status",
+    "discount_applied",
+    "discount_type",
+    "discount_value",
+    "shipping_cost",
+)
+ITEM_HEADER = ("order_id", "product_id", "price", "quantity", "measure_unit_id")
+
+
+def xlsx_file(orders, items):
+    workbook = Workbook()
+    for title, header, rows in (
+        ("Orders", ORDER_HEADER, orders),
+        ("OrderProduct", ITEM_HEADER, items),
+    ):
+        sheet = workbook.create_sheet(title)
+        for row in (header, *rows):
+            sheet.append(row)
+    stream = io.BytesIO()
+    workbook.save(stream)
+    return SimpleUploadedFile("orders.xlsx", stream.getvalue())
+
+
+def csv_file(name, header, rows):
+    lines = [header, *rows]
+    content = "\n".join(
+        ",".join("" if cell is None else str(cell) for cell in line) for line in lines
+    )
+    return SimpleUploadedFile(name, content.encode(), content_type="text/csv")
+
+
+class OrdersImportTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        cls.user = User.objects.create_user(
+            username="buyer", email="buyer@test.com", dni="30000001"
+        )
+        for i in range(3):
+            Product.objects.create(
+                sku=f"SKU{i}",
+                name=f"Producto {i}",
+                description="Producto",
+                price=1000,
+                stock=100,
+                category=category,
+            )
+
+
+class OrdersUploadFileServiceTest(OrdersImportTestCase):
+    def test_orders_and_items_are_imported(self):
+        result = OrdersUploadFileService().execute(
+            [order_row("O1", 30000001), order_row(None, "30000001")],
+            [
+                item_row("O1", "SKU0", quantity=2),
+                item_row("O1", "SKU1", price=500),
+            ],
+        )
+
+        self.assertEqual(
+            (result["orders"], result["items"], result["skipped_rows"]), (2, 2, 0)
+        )
+        self.assertEqual(result["rows"], 4)
+        order = Order.objects.get(pk="O1")
+        self.assertEqual((order.subtotal, order.total), (2500, 10500))
+        generated = Order.objects.exclude(pk="O1").get()
+        self.assertRegex(generated.pk, r"^AVB[A-Z]{2}00001$")
+        self.assertEqual(Product.objects.get(sku="SKU0").stock, 98)
+        self.assertEqual(StockMovement.objects.filter(related_order=order).count(), 2)
+
+    def test_repeated_order_ids_update_the_same_order(self):
+        service = OrdersUploadFileService()
+        service.execute([order_row("O1", 30000001)], [item_row("O1", "SKU0")])
+
+        result = service.execute(
+            [order_row("O1", 30000001), order_row("O1", 30000001, status="SHIPPED")],
+            [item_row("O1", "SKU1", price=500)],
+        )
+
+        self.assertEqual(result["orders"], 1)
+        order = Order.objects.get(pk="O1")
+        self.assertEqual(order.status, "SHIPPED")
+        # the items already in the order are kept
+        self.assertEqual(order.subtotal, 1500)
+        self.assertEqual(OrderProduct.objects.filter(order=order).count(), 2)
+
+    def test_invalid_rows_are_skipped(self):
+        result = OrdersUploadFileService().execute(
+            [
+                order_row("O1", 30000001),
+                order_row("O2", "not-a-dni"),
+                (None,) * 7,
+            ],
+            [
+                item_row("O1", "SKU0"),
+                item_row("O1", "SKU1", price="free"),
+                ("O1", "SKU2"),
+                (None,) * 5,
+            ],
+        )
+
+        self.assertEqual((result["orders"], result["skipped_rows"]), (1, 3))
+        self.assertEqual(
+            list(OrderProduct.objects.values_list("product_id", flat=True)), ["SKU0"]
+        )
+
+    def test_unknown_users_and_products_are_skipped(self):
+        result = OrdersUploadFileService().execute(
+            [order_row("O1", 30000001), order_row("O2", 99999999)],
+            [item_row("O1", "SKU0"), item_row("O1", "NOPE"), item_row("O2", "SKU0")],
+        )
+
+        self.assertEqual(
+            (result["orders"], result["items"], result["skipped_rows"]), (1, 1, 1)
+        )
+        self.assertEqual(list(Order.objects.values_list("pk", flat=True)), ["O1"])
+        self.assertEqual(Order.objects.get().subtotal, 1000)
+
+    def test_queries_per_chunk_do_not_grow_with_the_orders(self):
+        def rows(prefix, count):
+            orders = [order_row(f"{prefix}{i}", 30000001) for i in range(count)]
+            items = [
+                item_row(f"{prefix}{i}", f"SKU{n}")
+                for i in range(count)
+                for n in range(3)
+            ]
+            return orders, items
+
+        with CaptureQueriesContext(connection) as small:
+            OrdersUploadFileService(chunk_size=50).execute(*rows("A", 2))
+        with CaptureQueriesContext(connection) as big:
+            OrdersUploadFileService(chunk_size=50).execute(*rows("B", 40))
+        with CaptureQueriesContext(connection) as chunked:
+            OrdersUploadFileService(chunk_size=20).execute(*rows("C", 40))
+
+        self.assertEqual(len(small.captured_queries), len(big.captured_queries))
+        # the lookups shared by every chunk run once
+        per_chunk = len(chunked.captured_queries) - len(big.captured_queries)
+        self.assertGreater(per_chunk, 0)
+        self.assertLess(per_chunk, len(big.captured_queries))
+        self.assertEqual(Order.objects.count(), 82)
+
+    def test_progress_is_reported_per_chunk(self):
+        progress = []
+        OrdersUploadFileService(
+            chunk_size=2, on_progress=lambda done, total: progress.append((done, total))
+        ).execute([order_row(f"O{i}", 30000001) for i in range(5)], [])
+
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+
+
+class OrdersFileImportTest(OrdersImportTestCase):
+    url = "/api/v2/dashboard/orders/import/"
+
+    def test_xlsx_is_streamed_in_chunks(self):
+        file = xlsx_file(
+            [order_row(f"X{i}", 30000001) for i in range(5)],
+            [item_row(f"X{i}", "SKU0") for i in range(5)],
+        )
+        progress = []
+
+        with mock.patch(
+            "orders.services.orders_handler.iter_rows", wraps=iter_rows
+        ) as reader:
+            result = OrdersUploadFileService(
+                chunk_size=2,
+                on_progress=lambda done, total: progress.append((done, total)),
+            ).execute(*OrdersFileParser().parse(file))
+
+        self.assertEqual(
+            [call.kwargs["sheet"] for call in reader.call_args_list],
+            ["Orders", "OrderProduct"],
+        )
+        self.assertEqual(
+            (result["orders"], result["items"], result["rows"]), (5, 5, 10)
+        )
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+        self.assertEqual(OrderProduct.objects.filter(order_id="X4").count(), 1)
+
+    def test_csv_orders_with_an_items_file(self):
+        response = APIClient().post(
+            self.url,
+            {
+                "file": csv_file(
+                    "orders.csv", ORDER_HEADER, [order_row("C1", 30000001)]
+                ),
+                "items_file": csv_file(
+                    "items.csv",
+                    ITEM_HEADER,
+                    [item_row("C1", "SKU0", quantity=3), item_row("C1", "SKU1")],
+                ),
+            },
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()["orders"], response.json()["items"]), (1, 2))
+        self.assertEqual(Order.objects.get(pk="C1").subtotal, 4000)
+
+    def test_csv_orders_need_an_items_file(self):
+        response = APIClient().post(
+            self.url,
+            {"file": csv_file("orders.csv", ORDER_HEADER, [order_row("C1", 1)])},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("items_file", response.json())
+
+
+class OrdersImportChunkTest(TransactionTestCase):
+    """
+    Every chunk is committed on its own, a failure keeps the chunks before it.
+    """
+
+    def test_failed_chunk_keeps_the_committed_ones(self):
+        User.objects.create_user(
+            username="buyer", email="buyer@test.com", dni="30000001"
+        )
+        service = OrdersUploadFileService(chunk_size=2)
+
+        with mock.patch.object(
+            service, "_create_stock_movements", side_effect=[None, RuntimeError]
+        ), self.assertRaises(RuntimeError):
+            service.execute([order_row(f"O{i}", 30000001) for i in range(4)], [])
+
+        self.assertEqual(
+            sorted(Order.objects.values_list("pk", flat=True)), ["O0", "O1"]
+        )
+
+
+class OrderIdTest(TestCase):
+    def test_ids_are_unique_within_a_call(self):
+        ids = generate_unique_order_ids(["30000001"] * 676)
+
+        self.assertEqual(len(set(ids)), 676)
+
+    def test_more_ids_than_the_suffix_allows(self):
+        with self.assertRaises(OrderIdsExhaustedError) as error:
+            generate_unique_order_ids(["30000001"] * 677)
+
+        self.assertEqual(error.exception.suffix, "00001")
+
+    def test_suffix_taken_in_the_database(self):
+        user = User.objects.create_user(
+            username="buyer", email="buyer@test.com", dni="30000001"
+        )
+        Order.objects.bulk_create(
+            Order(id=generate_order_id(user.dni, a + b), user=user)
+            for a in string.ascii_uppercase
+            for b in string.ascii_uppercase
+        )
+
+        with self.assertRaises(OrderIdsExhaustedError):
+            generate_unique_order_ids([user.dni])
+        # another suffix is still free
+        self.assertEqual(len(generate_unique_order_ids(["30000002"])), 1)
@@ -1,5 +1,7 @@
 from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import status
+from rest_framework.exceptions import APIException
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView, Response
@@ -15,22 +17,42 @@ from payments.models import Payment
 from products.models import UnitOfMeasure, Product
 from products.permissions import CanViewOrder
 from users.models import User
+from users.services.user_counters import with_user_counters
+from utils.pagination import get_list_paginator
+from jobs.services.job_queue import enqueue, save_upload
+from jobs.views import is_async_request, job_accepted_response
+from salesreport.services.rollups import mark_orders_dirty
 
 SHIPPING_COST = 8000
 
 
+def user_details_prefetch():
+    # `OrderSerializer.user_details` counters for every user of the page at once
+    return Prefetch("user", queryset=with_user_counters(User.objects.all()))
+
+
 class OrdersFileUploadAPIView(APIView):
     # permission_classes = [IsAdminUser]
 
     def post(self, request):
-        file = request.data.get("file")
-
         serializer = OrdersFileSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        if is_async_request(request):
+            items_file = serializer.validated_data.get("items_file")
+            payload = {
+                "file": save_upload(serializer.validated_data["file"]),
+                "items_file": save_upload(items_file) if items_file else None,
+            }
+            job = enqueue("orders.import", payload, user=request.user)
+            return job_accepted_response(request, job)
+
         try:
             file_parser = OrdersFileParser()
-            orders, items = file_parser.parse(file)
+            orders, items = file_parser.parse(
+                serializer.validated_data["file"],
+                serializer.validated_data.get("items_file"),
+            )
             service = OrdersUploadFileService()
             results = service.execute(orders, items)
 
@@ -127,6 +149,7 @@ class AdminOrdersAPIView(APIView):
             order.save()
 
             OrderProduct.objects.bulk_create(order_items)
+            mark_orders_dirty([order.id])
 
         # handle Payment creation
         if data["is_paid"]:
@@ -191,11 +214,14 @@ class AdminOrdersAPIView(APIView):
 
     def get(self, request):
         try:
-            queryset = Order.objects.all()
-            paginator = LimitOffsetPagination()
+            queryset = Order.objects.prefetch_related(user_details_prefetch())
+            paginator = get_list_paginator(request, ordering=("-created_at", "-id"))
             paginated_queryset = paginator.paginate_queryset(queryset, request)
             serializer = OrderSerializer(paginated_queryset, many=True)
             return paginator.get_paginated_response(serializer.data)
+        except APIException:
+            # an invalid cursor is a client error
+            raise
         except Exception as e:
             return Response(
                 {"message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -254,7 +280,9 @@ class OrderUserList(APIView):
 
         try:
             user = User.objects.get(dni=user_id)
-            orders = Order.objects.filter(user=user)
+            orders = Order.objects.filter(user=user).prefetch_related(
+                user_details_prefetch()
+            )
             serializer = OrderSerializer(orders, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except User.DoesNotExist:
@@ -277,7 +305,9 @@ class OrderDashboardDetailsView(APIView):
             )
 
         try:
-            order = Order.objects.get(pk=order_id)
+            order = Order.objects.prefetch_related(user_details_prefetch()).get(
+                pk=order_id
+            )
 
             # Verify Object-Level permissions
             self.check_object_permissions(request, order)
@@ -1,4 +1,4 @@
 from django.contrib import admin
-from payments.models import Payment, Coupon
+from payments.models import Payment, PaymentEvent, Coupon
 
-admin.site.register([Payment, Coupon])
+admin.site.register([Payment, PaymentEvent, Coupon])
@@ -0,0 +1,11 @@
+from jobs.services.job_queue import job_handler
+from payments.models import PaymentEvent
+from payments.services.payment_events import PaymentEventService
+
+
+@job_handler("payments.webhook")
+def process_payment_event(job):
+    event = PaymentEvent.objects.get(pk=job.payload["event"])
+    return PaymentEventService().process(
+        event, last_attempt=job.attempts >= job.max_attempts
+    )
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0005_order_indexes"),
+        ("payments", "0006_alter_payment_payment_id"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["payment_status", "payment_date"],
+                name="payment_status_date_idx",
+            ),
+        ),
+    ]
@@ -64,6 +64,42 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment {self.payment_id} | {self.payment_status} | ${self.payment_amount} | Order {self.order.id}"
 
+    class Meta:
+        indexes = [
+            # SalesReportService: approved payments in a date range
+            models.Index(
+                fields=["payment_status", "payment_date"], name="payment_status_date_idx"
+            ),
+        ]
+
+
+class PaymentEvent(models.Model):
+    """
+    A Mercado Pago payment notification, stored as received and processed
+    later by the `payments.webhook` job. One row per payment: redeliveries
+    and updates of the same payment reuse it.
+    """
+
+    STATUS = (
+        ("RECEIVED", "RECEIVED"),  # waiting for the worker
+        ("PROCESSING", "PROCESSING"),
+        ("PROCESSED", "PROCESSED"),
+        ("FAILED", "FAILED"),
+    )
+
+    payment_id = models.CharField(max_length=50, unique=True)
+    action = models.CharField(max_length=50, blank=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS, default="RECEIVED")
+    error = models.TextField(blank=True)
+    deliveries = models.PositiveIntegerField(default=1)
+    email_sent = models.BooleanField(default=False)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Payment event {self.payment_id} | {self.status} | {self.deliveries} deliveries"
+
 
 class Coupon(models.Model):
     created_by = models.ForeignKey(
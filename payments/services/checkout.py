@@ -0,0 +1,164 @@
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from carts.models import Cart
+from carts.services.cart_items import MissingProductsError
+from carts.services.cart_store import CartStore
+from orders.models import Order, OrderProduct
+from products.models import Product
+from salesreport.services.rollups import mark_orders_dirty
+from users.models import ReferralDiscount, User
+
+
+class CheckoutService:
+    """
+    Prepares the pending order of a checkout with a fixed number of queries,
+    whatever the number of items:
+
+    - the products are fetched once,
+    - order lines and cart lines are upserted in bulk,
+    - first purchase and a valid referral discount are read together and the
+      discount is consumed with a conditional update,
+    - the order totals are saved once.
+
+    items: [{"id": sku, "unit_price": ..., "quantity": ...}], as sent by the
+    checkout page. Repeated SKUs are merged.
+    """
+
+    def __init__(self, user, shipping_cost) -> None:
+        self.user = user
+        self.shipping_cost = shipping_cost
+
+    def prepare(self, items) -> tuple:
+        """
+        Returns the pending order and the items of the payment preference.
+        Raises `MissingProductsError` for unknown SKUs.
+        """
+        lines = OrderedDict()
+        for item in items:
+            line = lines.setdefault(
+                str(item["id"]), {"unit_price": item["unit_price"], "quantity": 0}
+            )
+            line["quantity"] += item["quantity"]
+
+        products = Product.objects.in_bulk(list(lines))
+        missing = set(lines) - set(products)
+        if missing:
+            raise MissingProductsError(missing)
+
+        first_purchase, discount = self._customer_status()
+
+        with transaction.atomic():
+            order, _ = Order.objects.get_or_create(user=self.user, status="PENDING")
+            self._save_order_lines(order, lines)
+            self._save_cart_lines(lines)
+
+            subtotal = sum(
+                line["unit_price"] * line["quantity"] for line in lines.values()
+            )
+            processed_items = [
+                {
+                    "id": sku,
+                    "title": products[sku].name,
+                    "quantity": line["quantity"],
+                    "currency_id": "COP",
+                    "unit_price": line["unit_price"],
+                }
+                for sku, line in lines.items()
+            ]
+
+            order.discount_applied = False
+            order.discount_value = 0
+            order.discount_type = "NONE"
+            if discount and subtotal and self._consume(discount):
+                order.discount_applied = True
+                order.discount_type = "FIRST_PURCHASE" if first_purchase else "REFERRAL"
+                order.discount_value = round(subtotal * 0.10, 2)
+
+                # Ajustar los precios unitarios proporcionalmente
+                descuento_unitario = (subtotal - order.discount_value) / subtotal
+                for item in processed_items:
+                    item["unit_price"] = round(
+                        item["unit_price"] * descuento_unitario, 2
+                    )
+
+            order.subtotal = subtotal
+            order.total = round(subtotal - order.discount_value, 2)
+            order.shipping_cost = 0 if first_purchase else self.shipping_cost
+            order.save()
+
+            # bulk writes don't send the OrderProduct signals
+            mark_orders_dirty([order.id])
+            transaction.on_commit(
+                lambda: CartStore().forget_order(order.id), robust=True
+            )
+
+        return order, processed_items
+
+    def _customer_status(self) -> tuple:
+        """
+        (first purchase, id of a valid referral discount or None) in one query.
+        Orders other than the pending one count as previous purchases.
+        """
+        status = (
+            User.objects.filter(pk=self.user.pk)
+            .annotate(
+                has_orders=Exists(
+                    Order.objects.filter(user=OuterRef("pk")).exclude(status="PENDING")
+                ),
+                discount_id=ReferralDiscount.objects.filter(
+                    user=OuterRef("pk"),
+                    has_discount=True,
+                    expires_at__gt=timezone.now(),
+                ).values("pk")[:1],
+            )
+            .values("has_orders", "discount_id")
+            .get()
+        )
+        return not status["has_orders"], status["discount_id"]
+
+    def _consume(self, discount_id) -> bool:
+        """
+        Marks the discount as used, False if another checkout used it first.
+        """
+        return bool(
+            ReferralDiscount.objects.filter(pk=discount_id, has_discount=True).update(
+                has_discount=False, expires_at=None
+            )
+        )
+
+    def _save_order_lines(self, order, lines) -> None:
+        existing = {}
+        for line in OrderProduct.objects.filter(
+            order=order, product_id__in=list(lines)
+        ).only("id", "product_id"):
+            existing.setdefault(line.product_id, line)
+
+        for sku, line in existing.items():
+            line.quantity = lines[sku]["quantity"]
+        OrderProduct.objects.bulk_update(existing.values(), ["quantity"])
+
+        OrderProduct.objects.bulk_create(
+            [
+                OrderProduct(
+                    order=order,
+                    product_id=sku,
+                    price=line["unit_price"],
+                    quantity=line["quantity"],
+                )
+                for sku, line in lines.items()
+                if sku not in existing
+            ]
+        )
+
+    def _save_cart_lines(self, lines) -> None:
+        store = CartStore()
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        # under the lock of the cart, unsaved changes of other products stay
+        store.update(
+            cart, ((sku, line["quantity"]) for sku, line in lines.items()), mode="set"
+        )
+        transaction.on_commit(lambda: store.flush(cart.pk), robust=True)
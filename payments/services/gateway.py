@@ -0,0 +1,223 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from urllib.parse import urlsplit
+
+import mercadopago
+import requests
+from decouple import config
+from django.conf import settings
+from mercadopago.http import HttpClient
+from requests.adapters import HTTPAdapter
+
+from utils.stats import percentiles
+
+logger = logging.getLogger(__name__)
+
+SDK_BASE_URL = "https://api.mercadopago.com"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# path segments with digits, but the API version
+_IDS = re.compile(r"/(?!v\d+(?:/|$))[^/]*\d[^/]*")
+
+
+class GatewayStats:
+    """
+    Rolling latency of the last `window` gateway calls of this worker
+    process, per method and path (ids collapsed), and the count of their
+    outcomes: status codes, "error" or "timeout".
+    """
+
+    METRICS = ("latency_ms", "attempts")
+
+    def __init__(self, window: int = 500) -> None:
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+        self.outcomes = defaultdict(Counter)
+
+    def record(self, endpoint: str, sample: dict, outcome: str) -> None:
+        with self.lock:
+            self.samples[endpoint].append(sample)
+            self.outcomes[endpoint][outcome] += 1
+
+    def reset(self) -> None:
+        with self.lock:
+            self.samples.clear()
+            self.outcomes.clear()
+
+    def summary(self) -> dict:
+        with self.lock:
+            snapshot = {
+                endpoint: (list(samples), dict(self.outcomes[endpoint]))
+                for endpoint, samples in self.samples.items()
+            }
+
+        return {
+            endpoint: {
+                "requests": len(samples),
+                **{
+                    metric: percentiles([s[metric] for s in samples])
+                    for metric in self.METRICS
+                },
+                "outcomes": outcomes,
+            }
+            for endpoint, (samples, outcomes) in sorted(snapshot.items())
+        }
+
+
+gateway_stats = GatewayStats(getattr(settings, "PROFILING_WINDOW", 500))
+
+
+class PooledHttpClient(HttpClient):
+    """
+    `mercadopago.SDK` transport sharing one keep-alive connection pool
+    between calls, instead of a new session (and TLS handshake) per call.
+
+    - (connect, read) timeouts come from the settings, the SDK's 60s
+      `connection_timeout` is ignored.
+    - Failed calls (connection errors, timeouts, 429 and 5xx) are retried
+      with exponential backoff, at most `max_retries` times and never past
+      `retry_budget` seconds since the first attempt. POSTs are only retried
+      with an idempotency key (the SDK sends one with every call) or when
+      they surely never reached the server.
+    - Every call is recorded in `gateway_stats`.
+    """
+
+    def __init__(
+        self,
+        base_url=None,
+        connect_timeout=3.05,
+        read_timeout=10,
+        max_retries=2,
+        backoff=0.3,
+        retry_budget=15,
+        pool_size=10,
+    ) -> None:
+        self.base_url = (base_url or SDK_BASE_URL).rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.retry_budget = retry_budget
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            base_url=getattr(settings, "MERCADO_PAGO_API_URL", None),
+            connect_timeout=getattr(settings, "MERCADO_PAGO_CONNECT_TIMEOUT", 3.05),
+            read_timeout=getattr(settings, "MERCADO_PAGO_READ_TIMEOUT", 10),
+            max_retries=getattr(settings, "MERCADO_PAGO_MAX_RETRIES", 2),
+            backoff=getattr(settings, "MERCADO_PAGO_RETRY_BACKOFF", 0.3),
+            retry_budget=getattr(settings, "MERCADO_PAGO_RETRY_BUDGET", 15),
+            pool_size=getattr(settings, "MERCADO_PAGO_POOL_SIZE", 10),
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        # the SDK's timeout and retries are replaced by ours
+        kwargs.pop("timeout", None)
+        if url.startswith(SDK_BASE_URL):
+            url = self.base_url + url[len(SDK_BASE_URL) :]
+        headers = {k.lower() for k in kwargs.get("headers") or {}}
+        idempotent = method != "POST" or "x-idempotency-key" in headers
+
+        endpoint = f"{method} {_IDS.sub('/:id', urlsplit(url).path)}"
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_error = None
+            try:
+                api_result = self.session.request(
+                    method, url, timeout=self.timeout, **kwargs
+                )
+                if api_result.status_code not in RETRY_STATUSES or not idempotent:
+                    break
+                retry_error = f"status {api_result.status_code}"
+            except requests.ConnectionError as e:
+                # only a connect timeout surely never reached the server
+                if not idempotent and not isinstance(e, requests.ConnectTimeout):
+                    self._record(endpoint, started, attempt, "error")
+                    raise
+                retry_error, api_result = e, None
+            except requests.Timeout as e:
+                if not idempotent:
+                    self._record(endpoint, started, attempt, "timeout")
+                    raise
+                retry_error, api_result = e, None
+
+            delay = self.backoff * (2 ** (attempt - 1))
+            elapsed = time.perf_counter() - started
+            if attempt > self.max_retries or elapsed + delay > self.retry_budget:
+                if api_result is not None:
+                    break
+                outcome = (
+                    "timeout" if isinstance(retry_error, requests.Timeout) else "error"
+                )
+                self._record(endpoint, started, attempt, outcome)
+                raise retry_error
+            logger.info(
+                "Retrying %s after %s (attempt %s)", endpoint, retry_error, attempt
+            )
+            time.sleep(delay)
+
+        self._record(endpoint, started, attempt, api_result.status_code)
+        response = {"status": api_result.status_code, "response": None}
+        if api_result.status_code != 204 and api_result.content:
+            try:
+                response["response"] = api_result.json()
+            except ValueError:
+                logger.warning("Invalid JSON from %s", endpoint)
+        return response
+
+    def _record(self, endpoint, started, attempts, outcome) -> None:
+        latency = (time.perf_counter() - started) * 1000
+        gateway_stats.record(
+            endpoint, {"latency_ms": latency, "attempts": attempts}, str(outcome)
+        )
+        if outcome == "error" or outcome == "timeout":
+            logger.warning(
+                "%s failed after %s attempts in %.1fms", endpoint, attempts, latency
+            )
+
+
+_sdk = None
+_sdk_pid = None
+_sdk_lock = threading.Lock()
+
+
+def get_sdk() -> mercadopago.SDK:
+    """
+    The process-wide Mercado Pago SDK, created on first use. Forked workers
+    build their own so they don't share sockets with the parent.
+    """
+    global _sdk, _sdk_pid
+    if _sdk is None or _sdk_pid != os.getpid():
+        with _sdk_lock:
+            if _sdk is None or _sdk_pid != os.getpid():
+                _sdk = mercadopago.SDK(
+                    config("MERCADO_PAGO_ACCESS_TOKEN"),
+                    http_client=PooledHttpClient.from_settings(),
+                )
+                _sdk_pid = os.getpid()
+    return _sdk
+
+
+def reset_sdk() -> None:
+    """
+    Closes the pooled connections, the next `get_sdk()` starts over.
+    """
+    global _sdk
+    with _sdk_lock:
+        if _sdk is not None:
+            _sdk.http_client.close()
+        _sdk = None
@@ -0,0 +1,326 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.formats import date_format
+
+from jobs.services.job_queue import enqueue
+from orders.models import Order, OrderProduct
+from payments.models import Payment, PaymentEvent
+from payments.services.gateway import get_sdk
+from products.models import Product
+from shipments.models import DeliveryAddress, Shipment
+from utils.utils import send_email, update_bestseller_status
+
+
+class PermanentEventError(Exception):
+    """
+    The event can't be processed and retrying won't help.
+    """
+
+
+def extract_payment_data(payment_data: dict) -> dict:
+    payer_info = payment_data.get("payer", {})
+    additional_info = payment_data.get("additional_info", {})
+    shipping_info = additional_info.get("payer", {}).get("address", {})
+    transaction_details = payment_data.get("transaction_details", {})
+
+    return {
+        "payment_id": payment_data.get("id"),
+        "order_id": payment_data.get("order", {}).get("id"),
+        "external_reference": payment_data.get("external_reference"),
+        "status": payment_data.get("status"),
+        "status_detail": payment_data.get("status_detail"),
+        "date_approved": payment_data.get("date_approved"),
+        # Totales
+        "transaction_amount": payment_data.get("transaction_amount"),  # Solo productos
+        "shipping_amount": payment_data.get("shipping_amount"),  # Solo envío
+        "total_paid_amount": transaction_details.get(
+            "total_paid_amount"
+        ),  # Total con envío
+        "net_received_amount": transaction_details.get("net_received_amount"),
+        "currency_id": payment_data.get("currency_id"),
+        # Métodos de pago
+        "payment_type_id": payment_data.get("payment_type_id"),
+        "payment_method_id": payment_data.get("payment_method_id"),
+        # Info del comprador
+        "payer_email": payer_info.get("email"),
+        "payer_id": payer_info.get("id"),
+        "payer_identification_type": payer_info.get("identification", {}).get("type"),
+        "payer_identification_number": payer_info.get("identification", {}).get(
+            "number"
+        ),
+        # Dirección del comprador
+        "payer_street_name": shipping_info.get("street_name"),
+        "payer_street_number": shipping_info.get("street_number"),
+        "payer_zip_code": shipping_info.get("zip_code"),
+        # Productos comprados
+        "items": additional_info.get("items", []),
+    }
+
+
+class PaymentEventService:
+    """
+    Mercado Pago payment notifications are stored and acknowledged right away
+    (`receive()`), then processed by the `payments.webhook` job (`process()`)
+    so provider or SMTP latency never makes the webhook time out.
+
+    Processing is safe to repeat: the payment is upserted, the shipment is
+    only created once, the stock and best sellers only move when the payment
+    is first registered, and the confirmation email is only sent once.
+
+    An event is processed by one job at a time: a redelivery only queues a
+    new job once the event is PROCESSED or FAILED. One that arrives while it
+    is waiting or processing is counted in `deliveries`, and a run that
+    finishes with more deliveries than it started with queues the event
+    again.
+    """
+
+    def receive(self, payment_id, data: dict) -> bool:
+        """
+        Stores the notification of a payment, deduplicated on its id, and
+        queues its processing. Returns False for a redelivery of an event
+        still waiting for or in the hands of the worker.
+        """
+        # the event and its job are stored together, none is lost
+        with transaction.atomic():
+            event, created = PaymentEvent.objects.get_or_create(
+                payment_id=str(payment_id),
+                defaults={"action": data.get("action") or "", "payload": data},
+            )
+            if not created and not self._redeliver(event, data):
+                return False
+
+            self.schedule(event.pk)
+            return True
+
+    def _redeliver(self, event, data) -> bool:
+        """
+        Counts a redelivery. Returns True when the event was done and goes
+        back to the queue, False when a job still has it.
+        """
+        changes = {
+            "action": data.get("action") or "",
+            "payload": data,
+            "deliveries": F("deliveries") + 1,
+        }
+        events = PaymentEvent.objects.filter(pk=event.pk)
+        # each UPDATE checks the status it changes, a run finishing in
+        # between makes the first one miss and the loop try again
+        while True:
+            # the payment may have changed since it was processed
+            if events.filter(status__in=["PROCESSED", "FAILED"]).update(
+                status="RECEIVED", error="", **changes
+            ):
+                return True
+            # the worker fetches the latest state anyway, or runs again
+            # when it finishes (see `_finish`)
+            if events.filter(status__in=["RECEIVED", "PROCESSING"]).update(**changes):
+                return False
+
+    def schedule(self, event_id):
+        return enqueue(
+            "payments.webhook",
+            {"event": event_id},
+            max_attempts=getattr(settings, "PAYMENT_EVENT_MAX_ATTEMPTS", 5),
+        )
+
+    def process(self, event: PaymentEvent, last_attempt: bool = True) -> dict:
+        """
+        Raises on failures worth a retry, the event is only marked FAILED on
+        the last attempt or when retrying won't help.
+        """
+        PaymentEvent.objects.filter(pk=event.pk).update(status="PROCESSING")
+        try:
+            result = self._process(event)
+        except PermanentEventError as e:
+            self._finish(event, "FAILED", str(e))
+            return {"status": "FAILED", "error": str(e)}
+        except Exception as e:
+            if last_attempt:
+                self._finish(event, "FAILED", str(e))
+            else:
+                PaymentEvent.objects.filter(pk=event.pk).update(error=str(e))
+            raise
+
+        self._finish(event, "PROCESSED")
+        return result
+
+    def _finish(self, event, status, error="") -> None:
+        event.status = status
+        event.error = error
+        event.processed_at = timezone.now()
+        finished = PaymentEvent.objects.filter(
+            pk=event.pk, deliveries=event.deliveries
+        ).update(
+            status=status,
+            error=error,
+            processed_at=event.processed_at,
+            email_sent=event.email_sent,
+        )
+        if not finished:
+            # redelivered while processing, the payment may have changed
+            # after it was fetched: one more run, after this one
+            event.status = "RECEIVED"
+            PaymentEvent.objects.filter(pk=event.pk).update(
+                status="RECEIVED",
+                error=error,
+                processed_at=event.processed_at,
+                email_sent=event.email_sent,
+            )
+            self.schedule(event.pk)
+
+    def _process(self, event: PaymentEvent) -> dict:
+        response = get_sdk().payment().get(event.payment_id)
+        payment_data = response.get("response") or {}
+        if response["status"] in (400, 401, 403, 404):
+            raise PermanentEventError(f"Error getting payment data: {response}")
+        if response["status"] >= 400 or not payment_data:
+            raise ValueError(f"Error getting payment data: {response}")
+
+        info = extract_payment_data(payment_data)
+        order = (
+            Order.objects.select_related("user")
+            .filter(id=info["external_reference"])
+            .first()
+        )
+        if not order:
+            raise PermanentEventError("Order not found")
+
+        with transaction.atomic():
+            payment_obj, created = self._save_payment(order, info)
+            order.status = "PROCESSING"
+            order.total = round(order.subtotal + order.shipping_cost, 2)
+            order.save()
+
+            shipping_address = self._save_shipment(order, info)
+
+            # The stock is discounted by the Payment post_save signal
+            if created:
+                skus = [item.get("id") for item in info.get("items", [])]
+                products = Product.objects.in_bulk(skus)
+                for sku in skus:
+                    if sku not in products:
+                        raise PermanentEventError(
+                            f"Producto con SKU {sku} no encontrado"
+                        )
+                    update_bestseller_status(products[sku], 1)
+
+        if not event.email_sent:
+            self._send_confirmation(event, order, info, payment_obj, shipping_address)
+
+        return {"status": info.get("status"), "order": order.id}
+
+    def _save_payment(self, order, info) -> tuple:
+        return Payment.objects.update_or_create(
+            order=order,
+            defaults={
+                "payment_id": info.get("payment_id"),
+                "mercado_pago_order_id": info.get("order_id") or "None",
+                "external_reference": info.get("external_reference") or "None",
+                "payment_status": (info.get("status") or "APPROVED").upper(),
+                "status_detail": info.get("status_detail") or "APPROVED",
+                "payment_amount": round(float(info.get("total_paid_amount") or 0), 2),
+                "net_received_amount": round(
+                    float(info.get("net_received_amount") or 0), 2
+                ),
+                "taxes_amount": round(
+                    (
+                        float(info.get("total_paid_amount") or 0)
+                        - float(info.get("net_received_amount") or 0)
+                    ),
+                    2,
+                ),
+                "currency_id": info.get("currency_id") or "COP",
+                "payment_method": (
+                    info.get("payment_method_id") or "ACCOUNT_MONEY"
+                ).upper(),
+                "payment_type": (info.get("payment_type_id") or "CASH").upper(),
+                "payment_date": info.get("date_approved") or timezone.now(),
+                "payer_email": info.get("payer_email") or "None",
+                "payer_id": str(info.get("payer_id") or "None"),
+                "payer_identification_type": info.get("payer_identification_type")
+                or "None",
+                "payer_identification_number": info.get("payer_identification_number")
+                or "None",
+                "payer_street_name": info.get("payer_street_name") or "None",
+                "payer_street_number": str(info.get("payer_street_number") or "None"),
+                "payer_zip_code": info.get("payer_zip_code") or "None",
+            },
+        )
+
+    def _save_shipment(self, order, info):
+        shipment = Shipment.objects.filter(order=order).first()
+        if shipment:
+            return shipment
+
+        shipment_address = DeliveryAddress.objects.filter(
+            pk=int(info.get("payer_street_number") or 0)
+        ).first()
+        if not shipment_address:
+            raise PermanentEventError("Not address related with the user")
+
+        return Shipment.objects.create(
+            customer=order.user,
+            order=order,
+            shipment_address=shipment_address.street,
+            shipment_city=shipment_address.city,
+            zip_code=shipment_address.zip_code,
+        )
+
+    def _send_confirmation(self, event, order, info, payment_obj, shipping_address):
+        # prepare data to send email when payment is success, stored as JSON
+        # in the outbox until the worker renders it
+        items = [
+            {
+                "product": {
+                    "name": item.product.name,
+                    "main_image": str(item.product.main_image or ""),
+                },
+                "quantity": item.quantity,
+                "price": item.price,
+            }
+            for item in OrderProduct.objects.filter(order=order).select_related(
+                "product"
+            )
+        ]
+        context = {
+            "user": event.payload.get("first_name"),
+            "subscriber_name": event.payload.get("email"),
+            "site_url": "https://avoberry.vercel.app/",
+            "year": datetime.datetime.now().year,
+            "order_date": date_format(
+                timezone.localtime(order.created_at), "DATETIME_FORMAT"
+            ),
+            "customer_name": f"{order.user.first_name} {order.user.last_name}",
+            "payment_method": info["payment_method_id"],
+            "delivery_date": "Pending",
+            "subtotal": payment_obj.payment_amount,
+            "shipping_cost": info["shipping_amount"],
+            "discount": order.discount_value,
+            "total": info["total_paid_amount"],
+            "shipping_address": {
+                "shipment_address": shipping_address.shipment_address
+            },
+            "phone": order.user.phone,
+            "tracking_number": shipping_address.id,
+            "order_url": "https://avoberry.vercel.app/",
+            "faq_url": "https://avoberry.vercel.app/contact",
+            "contact_url": "https://avoberry.vercel.app/contact",
+            "order_items": items,
+            "image_url": "https://ecommerce-api-v2-production.up.railway.app",
+        }
+        response = send_email(
+            "Gracias por tu compra",
+            f"{order.user.email}",
+            [],
+            context,
+            "email/order-confirmation.html",
+            success_message="Your purchase was created successfully",
+        )
+        if response.status_code >= 400:
+            raise RuntimeError(response.data.get("error"))
+        event.email_sent = True
+        PaymentEvent.objects.filter(pk=event.pk).update(email_sent=True)
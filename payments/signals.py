@@ -1,26 +1,25 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from orders.models import OrderProduct, StockMovement
+from orders.models import OrderProduct
 from payments.models import Payment
+from products.services.inventory import InventoryService, StockLine
 
 
 @receiver(post_save, sender=Payment)
 def save_stock_movement(sender, instance, created, **kwargs):
+    """
+    Takes the order items out of the stock when its payment is registered.
+    Only what is available is discounted, the `StockMovement` rows record the
+    units that actually left.
+    """
     if created:
         order = instance.order
-        order_products = OrderProduct.objects.filter(order=order)
-        stock_movements = []
+        order_products = OrderProduct.objects.filter(order=order).values_list(
+            "product_id", "quantity"
+        )
 
-        for op in order_products:
-            product = op.product
-            stock_movements.append(
-                StockMovement(
-                    product=product,
-                    movement_type="OUT",
-                    quantity=op.quantity,
-                    reason="SALE",
-                    related_order=order,
-                )
-            )
-
-        StockMovement.objects.bulk_create(stock_movements)
+        InventoryService().reserve(
+            [StockLine(sku, quantity, order=order) for sku, quantity in order_products],
+            reason="SALE",
+            partial=True,
+        )
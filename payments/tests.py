@@ -0,0 +1,458 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import mercadopago
+import requests
+from django.db import connection
+from django.core import mail
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from carts.models import Cart, ProductCart
+from carts.services.cart_items import MissingProductsError
+from carts.services.cart_store import CartStore
+from orders.models import Order, OrderProduct
+from payments.services.checkout import CheckoutService
+from jobs.models import Job
+from jobs.services.job_queue import claim_next, run_job
+from payments.models import Payment, PaymentEvent
+from payments.services.gateway import PooledHttpClient, gateway_stats, reset_sdk
+from payments.services.payment_events import PaymentEventService
+from shipments.models import DeliveryAddress, Shipment
+from products.models import Category, Product
+from users.models import ReferralDiscount, User
+
+
+class CheckoutServiceTest(TestCase):
+    """
+    Checkout preparation runs a fixed number of queries, whatever the number
+    of items.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        for i in range(10):
+            Product.objects.create(
+                sku=f"SKU{i:03}",
+                name=f"Producto {i}",
+                description="Producto de prueba",
+                price=1000,
+                category=category,
+            )
+
+    def _user(self, dni):
+        return User.objects.create_user(
+            username=f"user{dni}", email=f"{dni}@test.com", dni=dni
+        )
+
+    def _items(self, count, quantity=1):
+        return [
+            {"id": f"SKU{i:03}", "unit_price": 1000, "quantity": quantity}
+            for i in range(count)
+        ]
+
+    def test_query_count_does_not_grow_with_items(self):
+        counts = []
+        for dni, size in (("30000001", 1), ("30000002", 10)):
+            service = CheckoutService(self._user(dni), shipping_cost=5000)
+            with CaptureQueriesContext(connection) as context:
+                service.prepare(self._items(size))
+            counts.append(len(context.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_lines_and_totals(self):
+        user = self._user("30000003")
+        service = CheckoutService(user, shipping_cost=5000)
+        service.prepare(self._items(3))
+        order, items = service.prepare(
+            self._items(2, quantity=2)
+            + [{"id": "SKU000", "unit_price": 1000, "quantity": 1}]
+        )
+
+        self.assertEqual(Order.objects.filter(user=user).count(), 1)
+        self.assertEqual(
+            dict(
+                OrderProduct.objects.filter(order=order).values_list(
+                    "product_id", "quantity"
+                )
+            ),
+            {"SKU000": 3, "SKU001": 2, "SKU002": 1},
+        )
+        self.assertEqual(
+            dict(
+                ProductCart.objects.filter(cart__user=user).values_list(
+                    "product_id", "quantity"
+                )
+            ),
+            {"SKU000": 3, "SKU001": 2, "SKU002": 1},
+        )
+        self.assertEqual([item["quantity"] for item in items], [3, 2])
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, 5000)
+        # no previous orders
+        self.assertEqual(order.shipping_cost, 0)
+
+    @override_settings(CART_WRITE_BEHIND=True)
+    def test_cached_cart_is_updated_and_saved(self):
+        user = self._user("30000006")
+        cart = Cart.objects.create(user=user, name="cart", description="-")
+        store = CartStore()
+        store.forget(cart.pk)
+        # a change not flushed yet
+        store.update(cart, [("SKU005", 4), ("SKU000", 7)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CheckoutService(user, shipping_cost=5000).prepare(self._items(2))
+            # a change arriving before the checkout commits is kept
+            store.update(cart, [("SKU009", 2)])
+
+        expected = {"SKU000": 1, "SKU001": 1, "SKU005": 4, "SKU009": 2}
+        state = store.get(cart.pk)
+        self.assertEqual((state["items"], state["dirty"]), (expected, False))
+        self.assertEqual(
+            dict(
+                ProductCart.objects.filter(cart=cart).values_list(
+                    "product_id", "quantity"
+                )
+            ),
+            expected,
+        )
+
+    def test_referral_discount_is_used_once(self):
+        user = self._user("30000004")
+        Order.objects.create(id="PAID1", user=user, status="PROCESSING")
+        ReferralDiscount.objects.create(
+            user=user,
+            has_discount=True,
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+
+        order, items = CheckoutService(user, shipping_cost=5000).prepare(self._items(1))
+        self.assertTrue(order.discount_applied)
+        self.assertEqual(order.discount_type, "REFERRAL")
+        self.assertEqual(order.discount_value, 100)
+        self.assertEqual(order.shipping_cost, 5000)
+        self.assertEqual(items[0]["unit_price"], 900)
+
+        order, _ = CheckoutService(user, shipping_cost=5000).prepare(self._items(1))
+        self.assertFalse(order.discount_applied)
+
+    def test_missing_product(self):
+        user = self._user("30000005")
+        with self.assertRaises(MissingProductsError):
+            CheckoutService(user, shipping_cost=5000).prepare(
+                [{"id": "NOPE", "unit_price": 1000, "quantity": 1}]
+            )
+
+        self.assertFalse(Order.objects.filter(user=user).exists())
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    """
+    Answers with the next scripted (status, delay) of the server, 200 once
+    the script is over. Records the client port of every request.
+    """
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def _answer(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        server.requests.append((self.command, self.path, self.client_address[1]))
+        status_code, delay = server.script.pop(0) if server.script else (200, 0)
+        time.sleep(delay)
+
+        body = json.dumps(
+            getattr(server, "body", None) or {"id": 1, "status": "approved"}
+        ).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _answer
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGatewayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients that gave up on a slow answer close the socket
+        pass
+
+
+class PooledHttpClientTest(SimpleTestCase):
+    """
+    The Mercado Pago client against a local fake gateway.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeGatewayServer(("127.0.0.1", 0), FakeGatewayHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.script = []
+        gateway_stats.reset()
+        self.client = PooledHttpClient(
+            base_url=self.base_url, read_timeout=0.5, backoff=0.01
+        )
+        self.addCleanup(self.client.close)
+        self.sdk = mercadopago.SDK("TEST-TOKEN", http_client=self.client)
+
+    def test_connections_are_reused(self):
+        for _ in range(3):
+            response = self.sdk.payment().get(123)
+            self.assertEqual(response["status"], 200)
+            self.assertEqual(response["response"]["status"], "approved")
+
+        ports = {port for _, _, port in self.server.requests}
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(ports), 1)
+        self.assertEqual(self.server.requests[0][:2], ("GET", "/v1/payments/123"))
+
+    def test_server_errors_are_retried(self):
+        self.server.script = [(503, 0), (502, 0)]
+
+        response = self.sdk.payment().get(123)
+
+        self.assertEqual(response["status"], 200)
+        self.assertEqual(len(self.server.requests), 3)
+        stats = gateway_stats.summary()["GET /v1/payments/:id"]
+        self.assertEqual(stats["attempts"]["max"], 3)
+        self.assertEqual(stats["outcomes"], {"200": 1})
+
+    def test_retries_are_bounded(self):
+        self.server.script = [(500, 0)] * 5
+
+        response = self.sdk.payment().get(123)
+
+        self.assertEqual(response["status"], 500)
+        # first attempt and two retries
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_post_without_idempotency_key_is_not_retried(self):
+        self.server.script = [(500, 0)]
+
+        response = self.client.post(f"{self.base_url}/v1/payments", headers={})
+
+        self.assertEqual(response["status"], 500)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_read_timeout(self):
+        self.server.script = [(200, 1)] * 3
+
+        started = time.perf_counter()
+        with self.assertRaises(requests.Timeout), self.assertLogs(
+            "payments.services.gateway", "WARNING"
+        ):
+            self.sdk.payment().get(123)
+
+        # three attempts of 0.5s, not the SDK's 60s
+        self.assertLess(time.perf_counter() - started, 3)
+        stats = gateway_stats.summary()["GET /v1/payments/:id"]
+        self.assertEqual(stats["outcomes"], {"timeout": 1})
+
+
+class PaymentWebhookTest(TestCase):
+    """
+    The webhook only stores the event, the worker registers the payment.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeGatewayServer(("127.0.0.1", 0), FakeGatewayHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        Product.objects.create(
+            sku="SKU000",
+            name="Producto",
+            description="Producto de prueba",
+            price=1000,
+            stock=10,
+            category=category,
+        )
+        cls.user = User.objects.create_user(
+            username="buyer", email="buyer@test.com", dni="40000001"
+        )
+        cls.address = DeliveryAddress.objects.create(
+            customer=cls.user,
+            street="Calle 1",
+            zip_code="110111",
+            quarter="Centro",
+            recipient="Buyer",
+        )
+        cls.order = Order.objects.create(id="WEBHOOK1", user=cls.user, subtotal=2000)
+        OrderProduct.objects.create(
+            order=cls.order, product_id="SKU000", price=1000, quantity=2
+        )
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.script = []
+        self.server.body = {
+            "id": 555,
+            "status": "approved",
+            "external_reference": self.order.id,
+            "payment_method_id": "visa",
+            "payment_type_id": "credit_card",
+            "shipping_amount": 0,
+            "transaction_details": {
+                "total_paid_amount": 2000,
+                "net_received_amount": 1900,
+            },
+            "additional_info": {
+                "payer": {"address": {"street_number": self.address.pk}},
+                "items": [{"id": "SKU000"}],
+            },
+        }
+        settings = override_settings(
+            MERCADO_PAGO_API_URL=f"http://127.0.0.1:{self.server.server_address[1]}",
+            MERCADO_PAGO_RETRY_BACKOFF=0.01,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reset_sdk()
+        self.addCleanup(reset_sdk)
+
+    def _notify(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                "/api/v2/webhook/mercadopago/",
+                {"type": "payment", "action": "payment.created", "data": {"id": "555"}},
+                content_type="application/json",
+            )
+
+    def _run_jobs(self):
+        # the confirmation email is queued on commit and sent by its own job
+        while True:
+            with self.captureOnCommitCallbacks(execute=True):
+                job = claim_next("test")
+                if job:
+                    run_job(job)
+            if job is None:
+                break
+
+    def test_webhook_acknowledges_without_calling_the_provider(self):
+        response = self._notify()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.requests, [])
+        self.assertFalse(Payment.objects.exists())
+        event = PaymentEvent.objects.get()
+        self.assertEqual(event.status, "RECEIVED")
+        self.assertEqual(Job.objects.filter(kind="payments.webhook").count(), 1)
+
+    def test_redelivery_of_a_queued_event_is_deduplicated(self):
+        self._notify()
+        response = self._notify()
+
+        self.assertTrue(response.json()["duplicated"])
+        self.assertEqual(PaymentEvent.objects.get().deliveries, 2)
+        self.assertEqual(Job.objects.filter(kind="payments.webhook").count(), 1)
+
+    def test_worker_registers_the_payment_once(self):
+        self._notify()
+        self._run_jobs()
+
+        event = PaymentEvent.objects.get()
+        self.assertEqual(event.status, "PROCESSED")
+        self.assertTrue(event.email_sent)
+        self.assertEqual(Payment.objects.get().payment_id, 555)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "PROCESSING")
+        self.assertEqual(Shipment.objects.get().order_id, self.order.id)
+        self.assertEqual(len(mail.outbox), 1)
+
+        # a later notification of the same payment is processed again safely
+        self._notify()
+        self._run_jobs()
+
+        self.assertEqual(PaymentEvent.objects.get().status, "PROCESSED")
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(Shipment.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_redelivery_while_processing_runs_after_it(self):
+        self._notify()
+        process = PaymentEventService._process
+        redelivered = []
+
+        def redelivered_meanwhile(service, event):
+            if not redelivered:
+                redelivered.append(self._notify())
+                # no second job may process the event at the same time
+                self.assertFalse(
+                    Job.objects.filter(
+                        kind="payments.webhook", status="PENDING"
+                    ).exists()
+                )
+            return process(service, event)
+
+        with mock.patch.object(
+            PaymentEventService,
+            "_process",
+            autospec=True,
+            side_effect=redelivered_meanwhile,
+        ) as patched:
+            self._run_jobs()
+
+        self.assertTrue(redelivered[0].json()["duplicated"])
+        # processed again once the first run was over
+        self.assertEqual(patched.call_count, 2)
+        self.assertEqual(Job.objects.filter(kind="payments.webhook").count(), 2)
+        event = PaymentEvent.objects.get()
+        self.assertEqual((event.status, event.deliveries), ("PROCESSED", 2))
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_provider_errors_are_retried_later(self):
+        self.server.script = [(500, 0)] * 3
+        self._notify()
+        with self.assertLogs("jobs.services.job_queue", "ERROR"):
+            self._run_jobs()
+
+        job = Job.objects.get(kind="payments.webhook")
+        self.assertEqual(job.status, "PENDING")
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(PaymentEvent.objects.get().status, "PROCESSING")
+        self.assertFalse(Payment.objects.exists())
+
+        job.run_after = timezone.now()
+        job.save(update_fields=["run_after"])
+        self._run_jobs()
+
+        self.assertEqual(PaymentEvent.objects.get().status, "PROCESSED")
+        self.assertTrue(Payment.objects.exists())
@@ -10,6 +10,7 @@ from payments.views import (
     CouponsCreateView,
     CouponUpdateView,
     CouponDeleteView,
+    GatewayStatsAPIView,
 )
 
 urlpatterns = [
@@ -23,6 +24,9 @@ urlpatterns = [
         MercadoPagoWebhookView.as_view(),
         name="mercadopago-webhook",
     ),
+    path(
+        "dashboard/payments/gateway/", GatewayStatsAPIView.as_view()
+    ),  # latency of the Mercado Pago calls
     # ---------------------------- Coupons endpoints -----------------------
     path(
         "coupons/", CouponsAdminRetrieveView.as_view()
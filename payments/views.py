@@ -1,117 +1,35 @@
-import datetime
 import uuid
 
 import mercadopago
 from decouple import config
-from django.db.transaction import atomic
-from django.utils import timezone
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.views import APIView, Response
 
-from carts.models import Cart, ProductCart
-from orders.models import Order, OrderProduct
+from carts.services.cart_items import MissingProductsError
+from orders.models import Order
 from payments.models import Payment, Coupon
-from products.models import Product
 from products.permissions import AdminPermissions
-from shipments.models import Shipment, DeliveryAddress
-from users.models import ReferralDiscount
-from utils.utils import send_email, update_bestseller_status, is_first_purchase
 from .serializers import PaymentSerializer, CouponSerializer
+from .services.checkout import CheckoutService
+from .services.gateway import gateway_stats, get_sdk
+from .services.payment_events import PaymentEventService
 
-MP_ACCESS_TOKEN = config("MERCADO_PAGO_ACCESS_TOKEN")
 SHIPPING_COST = config("SHIPPING_COST", cast=int, default=5000)
 
 
 class CreatePaymentPreference(APIView):
     def post(self, request):
-        sdk = mercadopago.SDK(MP_ACCESS_TOKEN)
+        sdk = get_sdk()
         user = request.user
         items = request.data.get("items", [])
         shipping_info = request.data.pop("shipping_info", None)
         notification_url = request.data.get("notification_url")
 
-        order, _ = Order.objects.get_or_create(user=user, status="PENDING")
-        cart, _ = Cart.objects.get_or_create(user=user)
-
-        subtotal = 0
-        discount_value = 0
-        discount_applied = False
-        discount_type = "NONE"
-        shipping_cost = 0 if is_first_purchase(user) else SHIPPING_COST
-
-        processed_items = []
-
-        for item in items:
-            product = Product.objects.get(sku=item["id"])
-
-            unit_price = item["unit_price"]
-            quantity = item["quantity"]
-            item_total = unit_price * quantity
-            subtotal += item_total
-
-            # OrderProduct
-            order_product, created = OrderProduct.objects.get_or_create(
-                order=order,
-                product=product,
-                defaults={"price": unit_price, "quantity": quantity},
-            )
-            if not created:
-                order_product.quantity = quantity
-                order_product.save()
-
-            # ProductCart
-            product_cart, created = ProductCart.objects.get_or_create(
-                cart=cart, product=product, defaults={"quantity": quantity}
-            )
-            if not created:
-                product_cart.quantity = quantity
-                product_cart.save()
-
-            processed_items.append(
-                {
-                    "id": item["id"],
-                    "title": product.name,
-                    "quantity": quantity,
-                    "currency_id": "COP",
-                    "unit_price": unit_price,
-                }
-            )
-
-        # Verificamos y aplicamos descuento si existe
         try:
-            discount = ReferralDiscount.objects.get(user=user)
-            if discount.is_valid():
-                discount_applied = True
-                discount_type = (
-                    "FIRST_PURCHASE" if is_first_purchase(user) else "REFERRAL"
-                )
-                discount_value = round(subtotal * 0.10, 2)
-
-                # Ajustar los precios unitarios proporcionalmente
-                descuento_unitario = (subtotal - discount_value) / subtotal
-                for item in processed_items:
-                    item["unit_price"] = round(
-                        item["unit_price"] * descuento_unitario, 2
-                    )
-
-                # Marcar el descuento como usado
-                discount.has_discount = False
-                discount.expires_at = None
-                discount.save()
-
-        except ReferralDiscount.DoesNotExist:
-            pass  # No discount
-
-        total = round(subtotal - discount_value, 2)
-
-        order.subtotal = subtotal
-        order.discount_applied = discount_applied
-        order.discount_value = discount_value
-        order.discount_type = discount_type
-        order.total = total
-        order.shipping_cost = shipping_cost
-        order.save()
+            order, processed_items = CheckoutService(user, SHIPPING_COST).prepare(items)
+        except MissingProductsError as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
 
         preference_data = {
             "items": processed_items,
@@ -177,6 +95,11 @@ class CreatePaymentPreference(APIView):
 
 
 class MercadoPagoWebhookView(APIView):
+    """
+    Stores the notification and answers right away, the payment is fetched
+    and registered by the `payments.webhook` job (see PaymentEventService).
+    """
+
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
@@ -192,210 +115,28 @@ class MercadoPagoWebhookView(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            try:
-                sdk = mercadopago.SDK(MP_ACCESS_TOKEN)
-                payment = sdk.payment().get(payment_id)
-                payment_data = payment.get("response", {})
-                if not payment_data:
-                    raise ValueError("Empty payment data")
-            except Exception as e:
-                return Response(
-                    {"error": f"Error getting payment data: {str(e)}"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
-
-            info = self.extract_payment_data(payment_data)
-            order = Order.objects.filter(id=info["external_reference"]).first()
-            if not order:
-                return Response(
-                    {"error": "Command not found"}, status=status.HTTP_404_NOT_FOUND
-                )
-
-            # Create or update the Payment
-            payment_obj, created = Payment.objects.update_or_create(
-                order=order,
-                defaults={
-                    "payment_id": info.get("payment_id"),
-                    "mercado_pago_order_id": info.get("order_id") or "None",
-                    "external_reference": info.get("external_reference") or "None",
-                    "payment_status": (info.get("status") or "APPROVED").upper(),
-                    "status_detail": info.get("status_detail") or "APPROVED",
-                    "payment_amount": round(
-                        float(info.get("total_paid_amount") or 0), 2
-                    ),
-                    "net_received_amount": round(
-                        float(info.get("net_received_amount") or 0), 2
-                    ),
-                    "taxes_amount": round(
-                        (
-                            float(info.get("total_paid_amount") or 0)
-                            - float(info.get("net_received_amount") or 0)
-                        ),
-                        2,
-                    ),
-                    "currency_id": info.get("currency_id") or "COP",
-                    "payment_method": (
-                        info.get("payment_method_id") or "ACCOUNT_MONEY"
-                    ).upper(),
-                    "payment_type": (info.get("payment_type_id") or "CASH").upper(),
-                    "payment_date": info.get("date_approved") or timezone.now(),
-                    "payer_email": info.get("payer_email") or "None",
-                    "payer_id": str(info.get("payer_id") or "None"),
-                    "payer_identification_type": info.get("payer_identification_type")
-                    or "None",
-                    "payer_identification_number": info.get(
-                        "payer_identification_number"
-                    )
-                    or "None",
-                    "payer_street_name": info.get("payer_street_name") or "None",
-                    "payer_street_number": str(
-                        info.get("payer_street_number") or "None"
-                    ),
-                    "payer_zip_code": info.get("payer_zip_code") or "None",
-                },
-            )
-            subtotal = order.subtotal
-            shipping_cost = order.shipping_cost
-            total = round(subtotal + shipping_cost, 2)
-            order.status = "PROCESSING"
-            order.total = total
-            order.save()
-
-            # Create shipment
-            try:
-                shipment_address = DeliveryAddress.objects.get(
-                    pk=int(info.get("payer_street_number"))
-                )
-            except DeliveryAddress.DoesNotExist:
-                return Response(
-                    {"error": "Not address related with the user"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
-
-            shipping_address = Shipment.objects.create(
-                customer=order.user,
-                order=order,
-                shipment_address=shipment_address.street,
-                shipment_city=shipment_address.city,
-                zip_code=shipment_address.zip_code,
-            )
-
-            with atomic():
-                for item in info.get("items", []):
-                    sku = item.get("id")
-                    quantity = int(item.get("quantity", 0))
-                    try:
-                        product = Product.objects.select_for_update().get(sku=sku)
-                        update_bestseller_status(product, 1)
-
-                        # Only what is available is discounted
-                        deducted_quantity = min(product.stock, quantity)
-
-                        if deducted_quantity > 0:
-                            product.stock -= deducted_quantity
-                            product.save()
-
-                    except Product.DoesNotExist:
-                        raise ValueError(f"Producto con SKU {sku} no encontrado")
-
-            # prepare data to send email when payment is success
-            items = OrderProduct.objects.filter(order=order)
-            context = {
-                "user": request.data.get("first_name"),
-                "subscriber_name": request.data.get("email"),
-                "site_url": "https://avoberry.vercel.app/",
-                "year": datetime.datetime.now().year,
-                "order_date": order.created_at,
-                "customer_name": f"{order.user.first_name} {order.user.last_name}",
-                "payment_method": info["payment_method_id"],
-                "delivery_date": "Pending",
-                "subtotal": payment_obj.payment_amount,
-                "shipping_cost": info["shipping_amount"],
-                "discount": order.discount_value,
-                "total": info["total_paid_amount"],
-                "shipping_address": shipping_address,
-                "phone": order.user.phone,
-                "tracking_number": shipping_address.id,
-                "order_url": "https://avoberry.vercel.app/",
-                "faq_url": "https://avoberry.vercel.app/contact",
-                "contact_url": "https://avoberry.vercel.app/contact",
-                "order_items": items,
-                "image_url": "https://ecommerce-api-v2-production.up.railway.app",
-            }
-            send_email(
-                "Gracias por tu compra",
-                f"{order.user.email}",
-                [],
-                context,
-                "email/order-confirmation.html",
-                success_message="Your purchase was created successfully",
-            )
-
+            queued = PaymentEventService().receive(payment_id, request.data)
             return Response(
                 {
-                    "message": "Payment successfully received",
+                    "message": "Payment event received",
                     "payment_id": payment_id,
-                    "status": info.get("status"),
+                    "duplicated": not queued,
                 },
                 status=status.HTTP_200_OK,
             )
 
         except Exception as e:
-            print("Error general:", e)
             return Response(
                 {"error": f"Error general: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-    def extract_payment_data(self, payment_data: dict) -> dict:
-        payer_info = payment_data.get("payer", {})
-        additional_info = payment_data.get("additional_info", {})
-        shipping_info = additional_info.get("payer", {}).get("address", {})
-        transaction_details = payment_data.get("transaction_details", {})
-
-        return {
-            "payment_id": payment_data.get("id"),
-            "order_id": payment_data.get("order", {}).get("id"),
-            "external_reference": payment_data.get("external_reference"),
-            "status": payment_data.get("status"),
-            "status_detail": payment_data.get("status_detail"),
-            "date_approved": payment_data.get("date_approved"),
-            # Totales
-            "transaction_amount": payment_data.get(
-                "transaction_amount"
-            ),  # Solo productos
-            "shipping_amount": payment_data.get("shipping_amount"),  # Solo envío
-            "total_paid_amount": transaction_details.get(
-                "total_paid_amount"
-            ),  # Total con envío
-            "net_received_amount": transaction_details.get("net_received_amount"),
-            "currency_id": payment_data.get("currency_id"),
-            # Métodos de pago
-            "payment_type_id": payment_data.get("payment_type_id"),
-            "payment_method_id": payment_data.get("payment_method_id"),
-            # Info del comprador
-            "payer_email": payer_info.get("email"),
-            "payer_id": payer_info.get("id"),
-            "payer_identification_type": payer_info.get("identification", {}).get(
-                "type"
-            ),
-            "payer_identification_number": payer_info.get("identification", {}).get(
-                "number"
-            ),
-            # Dirección del comprador
-            "payer_street_name": shipping_info.get("street_name"),
-            "payer_street_number": shipping_info.get("street_number"),
-            "payer_zip_code": shipping_info.get("zip_code"),
-            # Productos comprados
-            "items": additional_info.get("items", []),
-        }
-
 
 class MercadoPagoPaymentView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        sdk = mercadopago.SDK(MP_ACCESS_TOKEN)
+        sdk = get_sdk()
         request_options = mercadopago.config.RequestOptions()
         request_options.custom_headers = {
             "x-idempotency-key": self.get_idempotency_key(request)
@@ -671,3 +412,21 @@ class CouponCodeCheckView(APIView):
             return Response(
                 {"message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class GatewayStatsAPIView(APIView):
+    """
+    Rolling latency percentiles and outcomes of the Mercado Pago calls of
+    this worker process. DELETE clears them.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {"endpoints": gateway_stats.summary()}, status=status.HTTP_200_OK
+        )
+
+    def delete(self, request):
+        gateway_stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
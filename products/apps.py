@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class ProductsConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "products"
+
+    def ready(self):
+        # Connect the catalog cache invalidation receivers
+        import products.services.catalog_cache
+
+        # Keep the in-process search index in sync with product saves
+        import products.services.search_index
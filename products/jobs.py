@@ -0,0 +1,17 @@
+from jobs.services.job_queue import delete_upload, job_handler, open_upload
+from products.services.excel_file_handler import (
+    ExcelProductParser,
+    ProductBulkCreateService,
+)
+
+
+@job_handler("products.import")
+def import_products(job):
+    name = job.payload["file"]
+    try:
+        with open_upload(name) as file:
+            products_data = ExcelProductParser().parse(file)
+            service = ProductBulkCreateService(mode=job.payload.get("mode", "create"))
+            return service.execute(products_data)
+    finally:
+        delete_upload(name)
@@ -62,5 +62,22 @@ class Product(models.Model):
         upload_to="products/", default="products/dummie_image.jpeg"
     )
 
+    class Meta:
+        indexes = [
+            # ProductFilterService: category + price range
+            models.Index(fields=["category", "price"], name="product_category_price_idx"),
+            # Partial indexes, only a few products carry these flags
+            models.Index(
+                fields=["category", "price"],
+                condition=models.Q(recommended=True),
+                name="product_recommended_idx",
+            ),
+            models.Index(
+                fields=["category", "price"],
+                condition=models.Q(best_seller=True),
+                name="product_best_seller_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Product: {self.name} (SKU: {self.sku}, Stock: {self.stock}, Price: ${self.price})"
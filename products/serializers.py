@@ -1,6 +1,7 @@
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from purchases.models import SuggestedRetailPrice
-from reviews.models import ProductReview
+from reviews.models import ProductReview, ReviewResponse
 from reviews.serializers import ProductReviewSerializer
 from users.models import User
 from .models import Product, Category, UnitOfMeasure
@@ -54,6 +55,21 @@ class ProductCreateSerializer(serializers.ModelSerializer):
         ]
 
 
+class ProductBulkRowSerializer(ProductCreateSerializer):
+    """
+    A row of a product import. The category id is resolved and the SKU
+    uniqueness checked for the whole batch by `ProductBulkCreateService`,
+    validating a row runs no query.
+    """
+
+    category = serializers.IntegerField(
+        source="category_id", allow_null=True, required=False
+    )
+
+    class Meta(ProductCreateSerializer.Meta):
+        extra_kwargs = {"sku": {"validators": []}}
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -61,6 +77,33 @@ class CategorySerializer(serializers.ModelSerializer):
         depth = 2
 
 
+def get_reviews_prefetch():
+    """
+    Prefetch used to load the reviews of many products at once, together with
+    the reviewer and the responses (and their authors) of every review.
+    """
+    responses = ReviewResponse.objects.select_related("user")
+    return Prefetch(
+        "reviewed_product",
+        queryset=ProductReview.objects.select_related("user").prefetch_related(
+            Prefetch("responses", queryset=responses)
+        ),
+    )
+
+
+class ProductListSerializer(serializers.ListSerializer):
+    """
+    Serialize a page of products in a fixed number of queries.
+    Categories, reviews, reviewers and review responses are fetched once for
+    the whole page and grouped by product in memory before serialization.
+    """
+
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, "all") else data)
+        prefetch_related_objects(products, "category", get_reviews_prefetch())
+        return super().to_representation(products)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(), source="category"
@@ -76,7 +119,8 @@ class ProductSerializer(serializers.ModelSerializer):
         return obj.measure_unity.unity if obj.measure_unity else None
 
     def get_reviews(self, obj):
-        reviews = ProductReview.objects.filter(product=obj)
+        # uses the prefetched reviews when the product comes from a list
+        reviews = obj.reviewed_product.all()
         return ProductReviewSerializer(reviews, many=True).data
 
     def get_weight(self, obj):
@@ -84,6 +128,7 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
+        list_serializer_class = ProductListSerializer
         fields = [
             "name",
             "price",
@@ -0,0 +1,123 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from products.models import Category, Product, UnitOfMeasure
+from reviews.models import ProductReview, ReviewResponse
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+def get_catalog_cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def get_catalog_version() -> int:
+    """
+    Returns the current catalog version, initializing it when the cache is empty.
+    """
+    cache = get_catalog_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version() -> None:
+    """
+    Invalidates every cached catalog payload at once.
+    Old entries are never read again because the version is part of their keys,
+    the cache backend evicts them when their timeout expires.
+    """
+    cache = get_catalog_cache()
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # the key was evicted or never initialized
+        cache.set(CATALOG_VERSION_KEY, 2, timeout=None)
+
+
+def get_category_ids() -> dict:
+    """
+    Category name (lowercase) -> id, cached until the catalog changes.
+    Bulk imports use it to map the category column without a query per row.
+    """
+    cache = get_catalog_cache()
+    key = f"catalog:{get_catalog_version()}:category-ids"
+    ids = cache.get(key)
+    if ids is None:
+        ids = {
+            name.strip().lower(): pk
+            for pk, name in Category.objects.values_list("pk", "name")
+        }
+        cache.set(key, ids, getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 60))
+    return ids
+
+
+class CatalogCache:
+    """
+    Stores the rendered JSON of catalog read endpoints keyed by the catalog version.
+
+    Usage:
+        CatalogCache("products-list").response(request, lambda: build_response())
+
+    Only `200 OK` responses are cached, any other response (or one marked
+    `Cache-Control: no-store`) is returned as it is.
+    """
+
+    renderer = JSONRenderer()
+
+    def __init__(self, namespace: str) -> None:
+        self.namespace = namespace
+        self.cache = get_catalog_cache()
+        self.timeout = getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 60)
+
+    def get_key(self, request) -> str:
+        # pagination links are absolute, so the host is part of the key
+        digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return f"catalog:{get_catalog_version()}:{self.namespace}:{digest}"
+
+    def response(self, request, builder):
+        key = self.get_key(request)
+        payload = self.cache.get(key)
+        if payload is not None:
+            return HttpResponse(payload, content_type="application/json")
+
+        response = builder()
+        if (
+            response.status_code == status.HTTP_200_OK
+            and "no-store" not in response.get("Cache-Control", "")
+        ):
+            payload = self.renderer.render(response.data)
+            self.cache.set(key, payload, self.timeout)
+        return response
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=UnitOfMeasure)
+@receiver(post_delete, sender=UnitOfMeasure)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+@receiver(post_save, sender=ReviewResponse)
+@receiver(post_delete, sender=ReviewResponse)
+def invalidate_catalog_cache(sender, **kwargs):
+    # once committed, or a concurrent reader could cache the old rows under
+    # the new version
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(m2m_changed, sender=ProductReview.responses.through)
+def invalidate_catalog_cache_on_responses(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        transaction.on_commit(bump_catalog_version)
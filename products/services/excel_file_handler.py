@@ -1,35 +1,50 @@
-from io import BytesIO
-from openpyxl import load_workbook
+import time
+from collections.abc import Iterable, Iterator
+
 from django.db import transaction
+from rest_framework import serializers
+
 from products.models import Product
-from products.serializers import ProductCreateSerializer
+from products.serializers import ProductBulkRowSerializer
+from products.services.catalog_cache import bump_catalog_version, get_category_ids
+from products.services.inventory import InventoryService
+from utils.ingestion import DEFAULT_BATCH_SIZE, batched, iter_rows, parse_bool
+
+# columns an upsert refreshes, the ones the supplier file owns. Score,
+# recommended and best seller come from reviews and sales, the category, tag
+# and slug from the catalog. The stock changes through InventoryService.
+UPSERT_FIELDS = [
+    "name",
+    "description",
+    "price",
+    "discount_price",
+    "purchase_price",
+    "weight",
+    "last_updated",
+]
 
 
 class ExcelProductParser:
     """
-    Parses an Excel (.xlsx) file and returns a list of product dictionaries
+    Parses an Excel (.xlsx) or CSV file and yields product dictionaries
     ready to be validated by a DRF serializer.
+    Rows are read lazily, the file is never loaded in memory.
+
+    `category` is the cell as it is (a category name or id), `row` is the
+    row number in the file, for the errors.
     """
 
-    def parse(self, file) -> list[dict]:
+    def parse(self, file) -> Iterator[dict]:
         """
         file: InMemoryUploadedFile | TemporaryUploadedFile
         """
-        workbook = load_workbook(
-            filename=BytesIO(file.read()), read_only=True, data_only=True
-        )
-        sheet = workbook.active
-
-        products: list[dict] = []
-
-        for index, row in enumerate(
-            sheet.iter_rows(min_row=2, values_only=True), start=2
-        ):
+        for row_number, row in enumerate(iter_rows(file), start=2):
             # Skip empty rows
             if not row or not row[0]:
                 continue
 
             product = {
+                "row": row_number,
                 "sku": str(row[0]).strip(),
                 "name": row[1],
                 "description": row[2],
@@ -37,36 +52,158 @@ class ExcelProductParser:
                 "discount_price": float(row[4]) if row[4] else None,
                 "purchase_price": float(row[5]) if row[5] is not None else 0,
                 "stock": int(row[6]) if row[6] is not None else 0,
-                "category": 1,  # row[7],  # FK id
+                "category": row[7],
                 "score": int(row[8]) if row[8] else None,
-                "recommended": bool(row[9]) if row[9] is not None else False,
-                "best_seller": bool(row[10]) if row[10] is not None else False,
+                "recommended": parse_bool(row[9]) if row[9] is not None else False,
+                "best_seller": parse_bool(row[10]) if row[10] is not None else False,
                 "tag": row[11] or "",
                 "quality": row[12] or "",
                 "weight": float(row[13]) if row[13] is not None else 0,
                 "slug": row[14],
             }
 
-            products.append(product)
-
-        workbook.close()
-        return products
+            yield product
 
 
 class ProductBulkCreateService:
     """
-    Class performs a `Model.objects.bulk_create()` operation
-    Raise an Exception if the operation can't be performanced
+    Imports products in batches of `batch_size` with a fixed number of
+    queries per batch, whatever its size:
+
+    - rows are validated without queries (`ProductBulkRowSerializer`),
+    - category names or ids are resolved with the cached `get_category_ids()`,
+    - the existing SKUs of the batch are read with one `__in` query.
+
+    mode="create" rejects SKUs that already exist. mode="upsert" updates
+    their supplier columns (`UPSERT_FIELDS`: prices, name, description and
+    weight) with `bulk_create(update_conflicts=True)` and sets their stock
+    through `InventoryService.set_levels()`, which records the ADJUST
+    movements.
+    A SKU repeated in an upsert keeps its last row.
+
+    Everything runs in one transaction: an invalid row rolls back the import
+    and the errors of its batch are raised as a `ValidationError`.
     """
 
-    def execute(self, products_data: list[dict]) -> dict:
-        serializer = ProductCreateSerializer(data=products_data, many=True)
+    MODES = ("create", "upsert")
 
-        serializer.is_valid(raise_exception=True)
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, mode: str = "create"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown import mode '{mode}'")
+        self.batch_size = batch_size
+        self.mode = mode
+        self.serializer = ProductBulkRowSerializer()
 
-        products = [Product(**data) for data in serializer.validated_data]
+    def execute(self, products_data: Iterable[dict]) -> dict:
+        started = time.perf_counter()
+        categories = get_category_ids()
+        seen = set()
+        rows = created = updated = 0
 
         with transaction.atomic():
-            Product.objects.bulk_create(products)
+            for index, batch in enumerate(batched(products_data, self.batch_size)):
+                rows += len(batch)
+                products = self._validate(
+                    batch, index * self.batch_size, categories, seen
+                )
+                existing = set(
+                    Product.objects.filter(sku__in=list(products)).values_list(
+                        "sku", flat=True
+                    )
+                )
+
+                if self.mode == "create":
+                    if existing:
+                        message = "A product with this sku already exists."
+                        errors = [
+                            self._error(products[sku][0], {"sku": [message]})
+                            for sku in sorted(existing)
+                        ]
+                        raise serializers.ValidationError({"errors": errors})
+                    Product.objects.bulk_create(
+                        [Product(**data) for _, data in products.values()]
+                    )
+                else:
+                    Product.objects.bulk_create(
+                        [Product(**data) for _, data in products.values()],
+                        update_conflicts=True,
+                        unique_fields=["sku"],
+                        update_fields=UPSERT_FIELDS,
+                    )
+                    InventoryService().set_levels(
+                        {sku: products[sku][1]["stock"] for sku in existing}
+                    )
+
+                created += len(products) - len(existing)
+                updated += len(existing)
+
+            # bulk_create doesn't send post_save signals
+            transaction.on_commit(bump_catalog_version)
+
+        elapsed = time.perf_counter() - started
+        return {
+            "created": created,
+            "updated": updated,
+            "rows": rows,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed else rows,
+        }
+
+    def _validate(self, batch, offset, categories, seen) -> dict:
+        """
+        sku -> (row number, validated data) of a batch.
+        Raises a `ValidationError` with the errors of every invalid row.
+        """
+        category_ids = set(categories.values())
+        products, errors = {}, []
+
+        for position, data in enumerate(batch, start=offset + 2):
+            row = data.get("row", position)
+            category, category_error = self._category(
+                data.get("category"), categories, category_ids
+            )
+            try:
+                validated = self.serializer.run_validation(
+                    {**data, "category": category}
+                )
+            except serializers.ValidationError as e:
+                detail = e.detail if isinstance(e.detail, dict) else {}
+                errors.append(self._error(row, {**detail, **category_error}))
+                continue
+            if category_error:
+                errors.append(self._error(row, category_error))
+                continue
+
+            sku = validated["sku"]
+            if self.mode == "create" and sku in seen:
+                errors.append(self._error(row, {"sku": ["Repeated sku in the file."]}))
+                continue
+            seen.add(sku)
+            products[sku] = (row, validated)
+
+        if errors:
+            raise serializers.ValidationError({"errors": errors})
+        return products
+
+    def _category(self, value, categories, category_ids) -> tuple:
+        """
+        (category id, errors) of a category cell, a name or an id.
+        """
+        if value is None or str(value).strip() == "":
+            return None, {}
+        try:
+            category = int(value)
+        except (TypeError, ValueError):
+            category = categories.get(str(value).strip().lower())
+        if category is None or category not in category_ids:
+            return None, {"category": [f"Unknown category '{value}'."]}
+        return category, {}
 
-        return {"created": len(products)}
+    def _error(self, row, detail) -> dict:
+        return {
+            "row": row,
+            "errors": {
+                field: [str(message) for message in messages]
+                for field, messages in detail.items()
+            },
+        }
@@ -1,4 +1,5 @@
 from products.models import Product
+from products.services.search_index import product_search_index
 
 
 class ProductFilterService:
@@ -35,14 +36,6 @@ class ProductFilterService:
         if self.options.get("best_seller") is not None:
             filters["best_seller"] = self._to_bool(self.options["best_seller"])
 
-        # Quality
-        if self.options.get("quality"):
-            filters["quality__iexact"] = self.options["quality"]
-
-        # Tag
-        if self.options.get("tag"):
-            filters["tag__iexact"] = self.options["tag"]
-
         # Weight range (related model)
         if self.options.get("weight_min"):
             filters["weight__value__gte"] = self._to_float(self.options["weight_min"])
@@ -50,14 +43,28 @@ class ProductFilterService:
         if self.options.get("weight_max"):
             filters["weight__value__lte"] = self._to_float(self.options["weight_max"])
 
-        # Name related model
-        if self.options.get("name"):
-            filters["name__icontains"] = self.options["name"]
+        # Text, name, quality and tag are resolved by the search index
+        matches = product_search_index.match(
+            text=self.options.get("q"),
+            name=self.options.get("name"),
+            quality=self.options.get("quality"),
+            tag=self.options.get("tag"),
+        )
+        if matches is not None:
+            filters["sku__in"] = matches
 
         self.results = self.results.filter(**filters)
 
         return self.results
 
+    def facets(self) -> dict:
+        """
+        Facet counts (category, quality, tag and price bucket) of the whole
+        filtered result set, not only of the current page.
+        """
+        skus = self.results.values_list("sku", flat=True)
+        return product_search_index.facets(skus)
+
     def _to_bool(self, value):
         if isinstance(value, bool):
             return value
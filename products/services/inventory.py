@@ -0,0 +1,219 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+
+from orders.models import StockMovement
+from products.models import Product
+from products.services.catalog_cache import bump_catalog_version
+
+
+@dataclass
+class StockLine:
+    """
+    A quantity of a product moving in or out of the stock.
+    Every line becomes one `StockMovement` row.
+    """
+
+    sku: str
+    quantity: int
+    order: object = None  # orders.Order
+    reason: str = None
+
+
+@dataclass
+class StockResult:
+    # sku -> units actually moved
+    applied: dict = field(default_factory=dict)
+    # sku -> units that couldn't be taken out because of missing stock
+    shortfalls: dict = field(default_factory=dict)
+    # lines written as `StockMovement`, quantities already adjusted
+    lines: list = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.shortfalls
+
+
+class _StockConflict(Exception):
+    """A SKU in the batch didn't have enough stock, the UPDATE is rolled back."""
+
+
+class InventoryService:
+    """
+    The only place where `Product.stock` changes.
+
+    - `reserve()` takes stock out with one conditional UPDATE for the whole
+      batch: `SET stock = stock - qty WHERE stock >= qty`. The check and the
+      write are a single statement, so concurrent reservations can't oversell.
+    - `receive()` puts stock back in (purchases, returns).
+    - `set_levels()` replaces the stock with counted levels (supplier
+      refreshes), the differences are written as ADJUST movements.
+    - Both write the matching `StockMovement` rows in the same transaction.
+    """
+
+    # retries of a reservation when stock changes between attempts
+    max_attempts = 5
+
+    def reserve(
+        self, lines, reason: str = "SALE", partial: bool = False
+    ) -> StockResult:
+        """
+        Takes the lines out of the stock.
+
+        - partial=False: all or nothing, nothing is written when any SKU is
+          short and `result.shortfalls` tells how many units are missing.
+        - partial=True: takes what is available of every SKU, the rest is
+          reported in `result.shortfalls`.
+        """
+        lines = [line for line in lines if line.quantity > 0]
+        requested = self._totals(lines)
+        quantities = dict(requested)
+
+        for _ in range(self.max_attempts):
+            try:
+                with transaction.atomic():
+                    self._take(quantities)
+                    applied = {sku: qty for sku, qty in quantities.items() if qty}
+                    moved = self._distribute(lines, applied)
+                    self._write_movements(moved, "OUT", reason)
+            except _StockConflict:
+                pass
+            else:
+                shortfalls = {
+                    sku: qty - applied.get(sku, 0)
+                    for sku, qty in requested.items()
+                    if qty > applied.get(sku, 0)
+                }
+                return StockResult(applied, shortfalls, moved)
+
+            available = self._available(quantities)
+            if not partial:
+                shortfalls = {
+                    sku: qty - available.get(sku, 0)
+                    for sku, qty in quantities.items()
+                    if qty > available.get(sku, 0)
+                }
+                if shortfalls:
+                    return StockResult(shortfalls=shortfalls)
+                # restocked since the UPDATE, retry the whole batch
+                continue
+            # retry taking only what's available right now
+            quantities = {
+                sku: min(qty, available.get(sku, 0)) for sku, qty in requested.items()
+            }
+
+        return StockResult(shortfalls=requested)
+
+    def receive(self, lines, reason: str = "SOURCING") -> StockResult:
+        lines = [line for line in lines if line.quantity > 0]
+        quantities = self._totals(lines)
+
+        with transaction.atomic():
+            if quantities:
+                Product.objects.filter(sku__in=quantities).update(
+                    stock=self._stock_case(quantities, sign=1)
+                )
+                self._write_movements(lines, "IN", reason)
+
+        return StockResult(applied=quantities, lines=lines)
+
+    def set_levels(self, levels: dict, reason: str = "IMPORT") -> StockResult:
+        """
+        levels: sku -> new stock. Unknown SKUs are ignored. Returns the
+        signed change of every SKU that moved.
+        """
+        lines = []
+        with transaction.atomic():
+            current = dict(
+                Product.objects.select_for_update()
+                .filter(sku__in=list(levels))
+                .values_list("sku", "stock")
+            )
+            changes = {
+                sku: levels[sku] - stock
+                for sku, stock in current.items()
+                if levels[sku] != stock
+            }
+            if changes:
+                Product.objects.filter(sku__in=list(changes)).update(
+                    stock=Case(
+                        *[When(sku=sku, then=Value(levels[sku])) for sku in changes],
+                        default=F("stock"),
+                        output_field=PositiveIntegerField(),
+                    )
+                )
+                lines = [StockLine(sku, change) for sku, change in changes.items()]
+                self._write_movements(lines, "ADJUST", reason)
+
+        return StockResult(applied=changes, lines=lines)
+
+    def _take(self, quantities: dict) -> None:
+        """
+        Conditional UPDATE of every SKU with a positive quantity.
+        Raises `_StockConflict` when any row didn't match.
+        """
+        pending = {sku: qty for sku, qty in quantities.items() if qty > 0}
+        if not pending:
+            return
+
+        condition = Q()
+        for sku, qty in pending.items():
+            condition |= Q(sku=sku, stock__gte=qty)
+
+        updated = Product.objects.filter(condition).update(
+            stock=self._stock_case(pending, sign=-1)
+        )
+        if updated != len(pending):
+            raise _StockConflict()
+
+    def _available(self, quantities: dict) -> dict:
+        return dict(
+            Product.objects.filter(sku__in=quantities).values_list("sku", "stock")
+        )
+
+    def _stock_case(self, quantities: dict, sign: int):
+        return Case(
+            *[
+                When(sku=sku, then=F("stock") + sign * qty)
+                for sku, qty in quantities.items()
+            ],
+            default=F("stock"),
+            output_field=PositiveIntegerField(),
+        )
+
+    def _totals(self, lines) -> dict:
+        totals = defaultdict(int)
+        for line in lines:
+            totals[line.sku] += line.quantity
+        return dict(totals)
+
+    def _distribute(self, lines, applied: dict) -> list:
+        """
+        Spreads the applied quantity of every SKU over its lines, in order.
+        """
+        left = dict(applied)
+        moved = []
+        for line in lines:
+            quantity = min(line.quantity, left.get(line.sku, 0))
+            if quantity:
+                left[line.sku] -= quantity
+                moved.append(StockLine(line.sku, quantity, line.order, line.reason))
+        return moved
+
+    def _write_movements(self, lines, movement_type: str, reason: str) -> None:
+        StockMovement.objects.bulk_create(
+            [
+                StockMovement(
+                    product_id=line.sku,
+                    movement_type=movement_type,
+                    quantity=line.quantity,
+                    reason=line.reason or reason,
+                    related_order=line.order,
+                )
+                for line in lines
+            ]
+        )
+        # queryset updates don't send post_save signals
+        transaction.on_commit(bump_catalog_version)
@@ -0,0 +1,363 @@
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import Category, Product
+from products.services.catalog_cache import get_catalog_version
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9ñ]+")
+
+SPANISH_STOPWORDS = frozenset(
+    {
+        "a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los",
+        "o", "para", "por", "sin", "su", "un", "una", "y",
+    }
+)  # fmt: skip
+
+# (min, max) price ranges in COP, `None` means open-ended
+PRICE_BUCKETS = (
+    (0, 5000),
+    (5000, 10000),
+    (10000, 20000),
+    (20000, 50000),
+    (50000, None),
+)
+
+
+def fold(text) -> str:
+    """
+    Lowercases and removes accents, keeping the `ñ` because it changes the
+    meaning of Spanish words (`año` / `ano`).
+    """
+    text = str(text or "").lower().replace("ñ", "\0")
+    decomposed = unicodedata.normalize("NFKD", text)
+    folded = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return folded.replace("\0", "ñ")
+
+
+def stem(word: str) -> str:
+    """
+    Light Spanish plural folding: `limones` -> `limon`, `fresas` -> `fresa`.
+    """
+    if len(word) > 4 and word.endswith("es") and word[-3] not in "aeiou":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text) -> list[str]:
+    """
+    Splits a text into folded and stemmed tokens without stopwords.
+    """
+    return [
+        stem(token)
+        for token in TOKEN_RE.findall(fold(text))
+        if token not in SPANISH_STOPWORDS
+    ]
+
+
+def index_tokens(text) -> frozenset:
+    """
+    Tokens stored in the index: both the folded words and their stems, so a
+    stemmed query prefix-matches `tomate` as well as `tomates`.
+    """
+    words = [t for t in TOKEN_RE.findall(fold(text)) if t not in SPANISH_STOPWORDS]
+    return frozenset(words) | frozenset(stem(word) for word in words)
+
+
+@dataclass(frozen=True)
+class ProductDocument:
+    sku: str
+    name_tokens: frozenset
+    text_tokens: frozenset
+    category_id: int | None
+    quality: str
+    tag: str
+    price: float
+
+
+class ProductSearchIndex:
+    """
+    In-process inverted index of the catalog.
+
+    - Indexes names and descriptions (accent folded, prefix matching) and
+      keeps the facet attributes of every product.
+    - Built on first use, updated incrementally on `Product` saves.
+    - When the catalog version changed elsewhere (bulk operations, another
+      process sharing the cache) the stale index keeps serving the searches
+      while a background thread rebuilds it, at most once every
+      `SEARCH_INDEX_REBUILD_INTERVAL` seconds.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._reset()
+        self._rebuilding = False
+        self._built_at = None
+        self.version = None
+
+    def _reset(self) -> None:
+        self._documents: dict[str, ProductDocument] = {}
+        self._name_postings = defaultdict(set)
+        self._text_postings = defaultdict(set)
+        self._quality_postings = defaultdict(set)
+        self._tag_postings = defaultdict(set)
+        self._sorted_name_tokens: list[str] = []
+        self._sorted_text_tokens: list[str] = []
+        self._dirty = True
+
+    # ------------------------------------------------------------------ build
+    def build(self) -> None:
+        """
+        Reads the catalog into a new index and swaps it in, the searches use
+        the current one meanwhile.
+        """
+        version = get_catalog_version()
+        fresh = ProductSearchIndex()
+        products = Product.objects.values_list(
+            "sku", "name", "description", "category_id", "quality", "tag", "price"
+        )
+        for product in products.iterator(chunk_size=2000):
+            fresh._add(fresh._make_document(*product))
+
+        with self._lock:
+            self._documents = fresh._documents
+            self._name_postings = fresh._name_postings
+            self._text_postings = fresh._text_postings
+            self._quality_postings = fresh._quality_postings
+            self._tag_postings = fresh._tag_postings
+            self._dirty = True
+            self._built_at = time.monotonic()
+            self.version = version
+
+    def ensure_ready(self) -> None:
+        if self.version is None:
+            with self._lock:
+                # the first search waits, there is nothing to serve yet
+                if self.version is None:
+                    self.build()
+        elif self.version != get_catalog_version():
+            self.schedule_rebuild()
+
+    @property
+    def is_stale(self) -> bool:
+        """
+        Built before the last catalog change (the first search builds it).
+        """
+        return self.version is not None and self.version != get_catalog_version()
+
+    def schedule_rebuild(self) -> bool:
+        """
+        Starts a background rebuild unless one is running or the last one is
+        more recent than `SEARCH_INDEX_REBUILD_INTERVAL`.
+        """
+        interval = getattr(settings, "SEARCH_INDEX_REBUILD_INTERVAL", 60)
+        with self._lock:
+            if self._rebuilding or (
+                self._built_at is not None
+                and time.monotonic() - self._built_at < interval
+            ):
+                return False
+            self._rebuilding = True
+        threading.Thread(
+            target=self._rebuild, name="search-index-rebuild", daemon=True
+        ).start()
+        return True
+
+    def _rebuild(self) -> None:
+        try:
+            self.build()
+        except Exception:
+            logger.exception("Search index rebuild failed")
+        finally:
+            self._rebuilding = False
+            # the thread's own connection
+            connection.close()
+
+    def clear(self) -> None:
+        """
+        Drops the index, the next search builds it again.
+        """
+        with self._lock:
+            self._reset()
+            self._built_at = None
+            self.version = None
+
+    def update(self, product) -> None:
+        with self._lock:
+            if self.version is None:
+                return  # not built yet, the first search will build it
+            self._remove(product.sku)
+            self._add(
+                self._make_document(
+                    product.sku,
+                    product.name,
+                    product.description,
+                    product.category_id,
+                    product.quality,
+                    product.tag,
+                    product.price,
+                )
+            )
+            self._sync_version()
+
+    def remove(self, sku) -> None:
+        with self._lock:
+            if self.version is None:
+                return
+            self._remove(sku)
+            self._sync_version()
+
+    # ----------------------------------------------------------------- search
+    def match(self, text=None, name=None, quality=None, tag=None):
+        """
+        Returns the set of SKUs matching every given criteria, or `None` when
+        no criteria was given (meaning: do not restrict the results).
+        """
+        self.ensure_ready()
+        with self._lock:
+            self._sort_tokens()
+            criteria = []
+            if text:
+                criteria += [
+                    self._prefix_match(token, self._sorted_text_tokens, self._text_postings)
+                    for token in tokenize(text)
+                ]
+            if name:
+                criteria += [
+                    self._prefix_match(token, self._sorted_name_tokens, self._name_postings)
+                    for token in tokenize(name)
+                ]
+            if quality:
+                criteria.append(set(self._quality_postings.get(fold(quality).strip(), ())))
+            if tag:
+                criteria.append(set(self._tag_postings.get(fold(tag).strip(), ())))
+
+            if not criteria:
+                return None
+            criteria.sort(key=len)
+            return set.intersection(*criteria)
+
+    def facets(self, skus) -> dict:
+        """
+        Counts the given products by category, quality, tag and price bucket.
+        """
+        self.ensure_ready()
+        with self._lock:
+            documents = [self._documents[sku] for sku in skus if sku in self._documents]
+
+        categories = Counter(doc.category_id for doc in documents if doc.category_id)
+        qualities = Counter(doc.quality for doc in documents if doc.quality)
+        tags = Counter(doc.tag for doc in documents if doc.tag)
+        category_names = dict(
+            Category.objects.filter(id__in=categories).values_list("id", "name")
+        )
+
+        return {
+            "category": [
+                {"id": category_id, "name": category_names.get(category_id), "count": count}
+                for category_id, count in categories.most_common()
+            ],
+            "quality": [
+                {"value": value, "count": count} for value, count in qualities.most_common()
+            ],
+            "tag": [{"value": value, "count": count} for value, count in tags.most_common()],
+            "price": [
+                {
+                    "min": low,
+                    "max": high,
+                    "count": sum(
+                        1
+                        for doc in documents
+                        if doc.price >= low and (high is None or doc.price < high)
+                    ),
+                }
+                for low, high in PRICE_BUCKETS
+            ],
+        }
+
+    # ---------------------------------------------------------------- helpers
+    def _make_document(self, sku, name, description, category_id, quality, tag, price):
+        name_tokens = index_tokens(name)
+        return ProductDocument(
+            sku=sku,
+            name_tokens=name_tokens,
+            text_tokens=name_tokens | index_tokens(description),
+            category_id=category_id,
+            quality=quality or "",
+            tag=tag or "",
+            price=float(price or 0),
+        )
+
+    def _add(self, document: ProductDocument) -> None:
+        self._documents[document.sku] = document
+        for token in document.name_tokens:
+            self._name_postings[token].add(document.sku)
+        for token in document.text_tokens:
+            self._text_postings[token].add(document.sku)
+        self._quality_postings[fold(document.quality).strip()].add(document.sku)
+        self._tag_postings[fold(document.tag).strip()].add(document.sku)
+        self._dirty = True
+
+    def _remove(self, sku) -> None:
+        document = self._documents.pop(sku, None)
+        if document is None:
+            return
+        for postings, keys in (
+            (self._name_postings, document.name_tokens),
+            (self._text_postings, document.text_tokens),
+            (self._quality_postings, [fold(document.quality).strip()]),
+            (self._tag_postings, [fold(document.tag).strip()]),
+        ):
+            for key in keys:
+                postings[key].discard(sku)
+                if not postings[key]:
+                    del postings[key]
+        self._dirty = True
+
+    def _sort_tokens(self) -> None:
+        if self._dirty:
+            self._sorted_name_tokens = sorted(self._name_postings)
+            self._sorted_text_tokens = sorted(self._text_postings)
+            self._dirty = False
+
+    def _prefix_match(self, prefix, sorted_tokens, postings) -> set:
+        matches = set()
+        position = bisect_left(sorted_tokens, prefix)
+        while position < len(sorted_tokens) and sorted_tokens[position].startswith(prefix):
+            matches |= postings[sorted_tokens[position]]
+            position += 1
+        return matches
+
+    def _sync_version(self) -> None:
+        # Our own save bumped the catalog version by one, anything else means
+        # the catalog changed somewhere we didn't see, so keep it stale.
+        version = get_catalog_version()
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+
+
+product_search_index = ProductSearchIndex()
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, **kwargs):
+    product_search_index.update(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, **kwargs):
+    product_search_index.remove(instance.sku)
@@ -0,0 +1,512 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from orders.models import StockMovement
+from products.models import Category, Product
+from products.services.catalog_cache import bump_catalog_version, get_catalog_version
+from products.services.excel_file_handler import (
+    ExcelProductParser,
+    ProductBulkCreateService,
+)
+from products.services.inventory import InventoryService, StockLine
+from products.services.search_index import product_search_index
+from reviews.models import ProductReview, ReviewResponse
+from users.models import User
+
+
+class ProductListQueriesTest(TestCase):
+    """
+    The products list must be serialized in a fixed number of queries,
+    no matter how many products, reviews or responses are on the page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        users = [
+            User.objects.create_user(
+                username=f"user{i}", email=f"user{i}@test.com", dni=f"10000{i}"
+            )
+            for i in range(3)
+        ]
+        for i in range(20):
+            product = Product.objects.create(
+                sku=f"SKU{i:03}",
+                name=f"Producto {i}",
+                description="Producto de prueba",
+                price=1000 + i,
+                category=category,
+            )
+            for user in users:
+                review = ProductReview.objects.create(
+                    user=user, product=product, comment="Muy bueno", rating=5
+                )
+                response = ReviewResponse.objects.create(
+                    user=users[0], response="Gracias", product_review=review
+                )
+                review.responses.add(response)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        small_count, small_page = self._count_queries("/api/v2/products/list/?limit=2")
+        large_count, large_page = self._count_queries("/api/v2/products/list/?limit=20")
+
+        self.assertEqual(len(small_page["results"]), 2)
+        self.assertEqual(len(large_page["results"]), 20)
+        self.assertEqual(small_count, large_count)
+
+    def test_filter_query_count_does_not_grow_with_page_size(self):
+        # the first search builds the search index
+        self.client.get("/api/v2/products/filter/?limit=1")
+        small_count, _ = self._count_queries("/api/v2/products/filter/?limit=2")
+        large_count, _ = self._count_queries("/api/v2/products/filter/?limit=20")
+
+        self.assertEqual(small_count, large_count)
+
+    def test_list_includes_reviews_and_responses(self):
+        _, page = self._count_queries("/api/v2/products/list/?limit=1")
+        product = page["results"][0]
+
+        self.assertEqual(product["category"], "Frutas")
+        self.assertEqual(len(product["reviews"]), 3)
+        review = product["reviews"][0]
+        self.assertEqual(review["user"]["username"], "user0")
+        self.assertEqual(review["responses"][0]["response"], "Gracias")
+
+
+class CatalogCacheInvalidationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        cls.product = Product.objects.create(
+            sku="SKU000", name="Producto", description="Producto", category=category
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_version_moves_once_the_change_is_committed(self):
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+            # a reader before the commit still sees the old version
+            self.assertEqual(get_catalog_version(), version)
+
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_rolled_back_changes_keep_the_version(self):
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.product.save()
+                raise RuntimeError
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(get_catalog_version(), version)
+
+
+class ProductSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        frutas = Category.objects.create(name="Frutas", description="Frutas")
+        verduras = Category.objects.create(name="Verduras", description="Verduras")
+        Product.objects.create(
+            sku="FRE001",
+            name="Fresas orgánicas",
+            description="Dulces y frescas",
+            price=4000,
+            category=frutas,
+            quality="Primera",
+            tag="Orgánico",
+        )
+        Product.objects.create(
+            sku="LIM001",
+            name="Limón Tahití",
+            description="Ácido y jugoso",
+            price=12000,
+            category=frutas,
+            quality="Segunda",
+        )
+        Product.objects.create(
+            sku="TOM001",
+            name="Tomates chonto",
+            description="Para ensalada",
+            price=6000,
+            category=verduras,
+            quality="Primera",
+        )
+
+    def setUp(self):
+        cache.clear()
+        product_search_index.clear()
+        self.client = APIClient()
+
+    def _search(self, query):
+        response = self.client.get(f"/api/v2/products/filter/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _skus(self, query):
+        return sorted(product["sku"] for product in self._search(query)["results"])
+
+    def test_accent_folded_prefix_and_plural_matching(self):
+        self.assertEqual(self._skus("name=organi"), ["FRE001"])
+        self.assertEqual(self._skus("name=limones"), ["LIM001"])
+        self.assertEqual(self._skus("name=tomate"), ["TOM001"])
+        self.assertEqual(self._skus("q=acido"), ["LIM001"])
+        self.assertEqual(self._skus("tag=organico"), ["FRE001"])
+        self.assertEqual(self._skus("quality=primera"), ["FRE001", "TOM001"])
+
+    def test_index_follows_product_saves(self):
+        self.assertEqual(self._skus("name=mango"), [])
+
+        product = Product.objects.get(sku="LIM001")
+        product.name = "Mango Tommy"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        self.assertEqual(self._skus("name=mango"), ["LIM001"])
+        self.assertEqual(self._skus("name=limon"), [])
+
+    @override_settings(SEARCH_INDEX_REBUILD_INTERVAL=0)
+    def test_changes_made_elsewhere_are_rebuilt_in_the_background(self):
+        self.assertEqual(self._skus("name=mango"), [])
+        # a bulk update: no post_save, only the catalog version moves
+        Product.objects.filter(sku="LIM001").update(name="Mango Tommy")
+        bump_catalog_version()
+
+        with mock.patch("products.services.search_index.threading.Thread") as thread:
+            # the stale index keeps answering while it is rebuilt
+            response = self.client.get("/api/v2/products/filter/?name=mango")
+            self.assertEqual(response.json()["results"], [])
+            self.assertEqual(response["Cache-Control"], "no-store")
+            self.assertEqual(self._skus("name=mango"), [])
+        thread.assert_called_once()
+
+        with mock.patch("products.services.search_index.connection"):
+            thread.call_args.kwargs["target"]()
+        self.assertEqual(self._skus("name=mango"), ["LIM001"])
+
+    @override_settings(SEARCH_INDEX_REBUILD_INTERVAL=3600)
+    def test_rebuilds_are_throttled(self):
+        self._search("name=mango")
+        bump_catalog_version()
+
+        with mock.patch("products.services.search_index.threading.Thread") as thread:
+            self._search("name=mango")
+        thread.assert_not_called()
+
+    def test_facets_count_the_whole_result_set(self):
+        facets = self._search("quality=primera&limit=1")["facets"]
+
+        self.assertEqual(
+            {(c["name"], c["count"]) for c in facets["category"]},
+            {("Frutas", 1), ("Verduras", 1)},
+        )
+        self.assertEqual(facets["quality"], [{"value": "Primera", "count": 2}])
+        self.assertEqual(
+            [bucket["count"] for bucket in facets["price"]], [1, 1, 0, 0, 0]
+        )
+
+
+class RacingInventoryService(InventoryService):
+    """
+    Another order takes the stock of "B" during the first attempt and it is
+    restocked right after.
+    """
+
+    conflicts = 1
+
+    def _take(self, quantities):
+        if self.conflicts:
+            self.conflicts -= 1
+            Product.objects.filter(sku="B").update(stock=0)
+            try:
+                return super()._take(quantities)
+            finally:
+                Product.objects.filter(sku="B").update(stock=3)
+        return super()._take(quantities)
+
+
+class InventoryServiceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        for sku, stock in (("A", 10), ("B", 3)):
+            Product.objects.create(
+                sku=sku, name=sku, description=sku, stock=stock, category=category
+            )
+
+    def _stock(self, sku):
+        return Product.objects.get(sku=sku).stock
+
+    def test_reserve_is_all_or_nothing(self):
+        result = InventoryService().reserve(
+            [StockLine("A", 4), StockLine("B", 5), StockLine("MISSING", 1)]
+        )
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.shortfalls, {"B": 2, "MISSING": 1})
+        self.assertEqual((self._stock("A"), self._stock("B")), (10, 3))
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_reserve_retries_when_restocked_after_a_conflict(self):
+        result = RacingInventoryService().reserve(
+            [StockLine("A", 4), StockLine("B", 3)]
+        )
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.applied, {"A": 4, "B": 3})
+        self.assertEqual((self._stock("A"), self._stock("B")), (6, 0))
+        self.assertEqual(StockMovement.objects.count(), 2)
+
+    def test_reserve_writes_one_movement_per_line(self):
+        result = InventoryService().reserve(
+            [StockLine("A", 4), StockLine("A", 2), StockLine("B", 3)]
+        )
+
+        self.assertTrue(result.ok)
+        self.assertEqual((self._stock("A"), self._stock("B")), (4, 0))
+        self.assertEqual(
+            list(
+                StockMovement.objects.order_by("id").values_list(
+                    "product_id", "movement_type", "quantity"
+                )
+            ),
+            [("A", "OUT", 4), ("A", "OUT", 2), ("B", "OUT", 3)],
+        )
+
+    def test_partial_reserve_takes_what_is_available(self):
+        result = InventoryService().reserve(
+            [StockLine("A", 4), StockLine("B", 2), StockLine("B", 5)], partial=True
+        )
+
+        self.assertEqual(result.applied, {"A": 4, "B": 3})
+        self.assertEqual(result.shortfalls, {"B": 4})
+        self.assertEqual(self._stock("B"), 0)
+        self.assertEqual(
+            StockMovement.objects.filter(product_id="B").aggregate(
+                total=Sum("quantity")
+            )["total"],
+            3,
+        )
+
+    def test_receive(self):
+        InventoryService().receive([StockLine("B", 7)])
+
+        self.assertEqual(self._stock("B"), 10)
+        self.assertTrue(
+            StockMovement.objects.filter(
+                product_id="B", movement_type="IN", quantity=7
+            ).exists()
+        )
+
+    def test_set_levels_records_the_differences(self):
+        result = InventoryService().set_levels({"A": 12, "B": 3, "MISSING": 5})
+
+        self.assertEqual(result.applied, {"A": 2})
+        self.assertEqual(self._stock("A"), 12)
+        self.assertEqual(
+            list(
+                StockMovement.objects.values_list(
+                    "product_id", "movement_type", "quantity"
+                )
+            ),
+            [("A", "ADJUST", 2)],
+        )
+
+
+class ProductImportTest(TestCase):
+    header = (
+        "sku,name,description,price,discount_price,purchase_price,stock,category,"
+        "score,recommended,best_seller,tag,quality,weight,slug\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fruits = Category.objects.create(name="Frutas", description="Frutas")
+        cls.vegetables = Category.objects.create(
+            name="Verduras", description="Verduras"
+        )
+        Product.objects.create(
+            sku="OLD",
+            name="Mango",
+            description="Mango",
+            price=100,
+            stock=5,
+            category=cls.vegetables,
+            score=42,
+            best_seller=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _rows(self, *rows):
+        content = self.header + "\n".join(rows) + "\n"
+        file = SimpleUploadedFile(
+            "products.csv", content.encode(), content_type="text/csv"
+        )
+        return ExcelProductParser().parse(file)
+
+    def test_categories_are_mapped_by_name_or_id(self):
+        result = ProductBulkCreateService().execute(
+            self._rows(
+                "P1,Fresa,Fresa,10,,5,3,frutas,,,,Org,primera,1,",
+                f"P2,Papa,Papa,20,,5,3,{self.vegetables.pk},,,,Org,primera,1,",
+                "P3,Sal,Sal,30,,5,3,,,,,Org,primera,1,",
+            )
+        )
+
+        self.assertEqual((result["created"], result["updated"]), (3, 0))
+        self.assertEqual(
+            dict(
+                Product.objects.filter(sku__startswith="P").values_list(
+                    "sku", "category_id"
+                )
+            ),
+            {"P1": self.fruits.pk, "P2": self.vegetables.pk, "P3": None},
+        )
+
+    def test_queries_do_not_grow_with_the_rows(self):
+        def rows(count):
+            return [
+                f"N{i:03},Producto,Producto,10,,5,3,Frutas,,,,Org,primera,1,"
+                for i in range(count)
+            ]
+
+        with CaptureQueriesContext(connection) as small:
+            ProductBulkCreateService(batch_size=50).execute(self._rows(*rows(2)))
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(sku__startswith="N").delete()
+        with CaptureQueriesContext(connection) as big:
+            ProductBulkCreateService(batch_size=50).execute(self._rows(*rows(40)))
+
+        self.assertEqual(len(small.captured_queries), len(big.captured_queries))
+        self.assertEqual(Product.objects.filter(sku__startswith="N").count(), 40)
+
+    def test_create_rejects_existing_and_invalid_rows(self):
+        with self.assertRaises(ValidationError) as raised:
+            ProductBulkCreateService().execute(
+                self._rows(
+                    "OLD,Mango,Mango,10,,5,3,Frutas,,,,Org,primera,1,",
+                    "P1,Fresa,Fresa,10,,5,3,Carnes,,,,Org,primera,1,",
+                    "P2,,Papa,10,,5,3,Frutas,,,,Org,primera,1,",
+                )
+            )
+
+        errors = {
+            int(error["row"]): error["errors"]
+            for error in raised.exception.detail["errors"]
+        }
+        self.assertEqual(sorted(errors), [3, 4])
+        self.assertIn("category", errors[3])
+        self.assertIn("name", errors[4])
+        self.assertFalse(Product.objects.filter(sku__in=["P1", "P2"]).exists())
+
+        with self.assertRaises(ValidationError):
+            ProductBulkCreateService().execute(
+                self._rows("OLD,Mango,Mango,10,,5,3,Frutas,,,,Org,primera,1,")
+            )
+
+    def test_upsert_refreshes_supplier_columns_and_stock(self):
+        result = ProductBulkCreateService(mode="upsert").execute(
+            self._rows(
+                "OLD,Mango Tommy,Mango,150,,80,9,Frutas,,,,Org,primera,1,",
+                "NEW,Fresa,Fresa,10,,5,3,Frutas,,,,Org,primera,1,",
+            )
+        )
+
+        self.assertEqual((result["created"], result["updated"]), (1, 1))
+        mango = Product.objects.get(sku="OLD")
+        self.assertEqual(
+            (mango.name, mango.price, mango.stock), ("Mango Tommy", 150, 9)
+        )
+        # reviews, sales and the catalog own these
+        self.assertEqual(
+            (mango.score, mango.best_seller, mango.category_id),
+            (42, True, self.vegetables.pk),
+        )
+        self.assertEqual(
+            list(
+                StockMovement.objects.values_list(
+                    "product_id", "movement_type", "quantity"
+                )
+            ),
+            [("OLD", "ADJUST", 4)],
+        )
+        self.assertEqual(Product.objects.get(sku="NEW").stock, 3)
+
+
+class StockReservationConcurrencyTest(TransactionTestCase):
+    """
+    Many threads reserving the same SKU must never oversell it.
+    """
+
+    STOCK = 50
+    THREADS = 20
+    RESERVATIONS_PER_THREAD = 5
+
+    def setUp(self):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        Product.objects.create(
+            sku="HOT", name="Hot", description="Hot", stock=self.STOCK, category=category
+        )
+
+    def _worker(self, barrier, results):
+        barrier.wait()
+        try:
+            for _ in range(self.RESERVATIONS_PER_THREAD):
+                while True:
+                    try:
+                        result = InventoryService().reserve([StockLine("HOT", 1)])
+                        break
+                    except OperationalError:
+                        # SQLite allows one writer at a time, try again
+                        continue
+                results.append(result.ok)
+        finally:
+            connection.close()
+
+    def test_concurrent_reservations_never_oversell(self):
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+        threads = [
+            threading.Thread(target=self._worker, args=(barrier, results))
+            for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        total = self.THREADS * self.RESERVATIONS_PER_THREAD
+        self.assertEqual(len(results), total)
+        self.assertEqual(results.count(True), self.STOCK)
+        self.assertEqual(Product.objects.get(sku="HOT").stock, 0)
+        self.assertEqual(
+            StockMovement.objects.filter(product_id="HOT").aggregate(
+                total=Sum("quantity")
+            )["total"],
+            self.STOCK,
+        )
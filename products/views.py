@@ -5,7 +5,10 @@ from products.services.excel_file_handler import (
     ProductBulkCreateService,
 )
 from products.services.filter_service import ProductFilterService
+from products.services.search_index import product_search_index
+from products.services.catalog_cache import CatalogCache, bump_catalog_version
 from purchases.models import SuggestedRetailPrice
+from rest_framework.exceptions import APIException
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
@@ -25,20 +28,33 @@ from .serializers import (
     ProductImportSerializer,
 )
 from carts.serializers import ProductCartSerializer
+from carts.services.cart_items import MissingProductsError
+from carts.services.cart_store import CartBusyError, CartStore, content_hash
+from utils.pagination import get_list_paginator
+from jobs.services.job_queue import enqueue, save_upload
+from jobs.views import is_async_request, job_accepted_response
 
 
 class ProductFilterAPIView(APIView):
     def get(self, request):
-        results = self.get_queryset(request)
+        return CatalogCache("products-filter").response(
+            request, lambda: self.get_results(request)
+        )
+
+    def get_results(self, request):
+        stale = product_search_index.is_stale
+        service = ProductFilterService(request.query_params)
+        results = service.search()
         paginator = LimitOffsetPagination()
         paginated_queryset = paginator.paginate_queryset(results, request)
         serializer = ProductSerializer(paginated_queryset, many=True)
 
-        return paginator.get_paginated_response(serializer.data)
-
-    def get_queryset(self, request):
-        service = ProductFilterService(request.query_params)
-        return service.search()
+        response = paginator.get_paginated_response(serializer.data)
+        response.data["facets"] = service.facets()
+        if stale:
+            # answered by an index being rebuilt, not worth caching
+            response["Cache-Control"] = "no-store"
+        return response
 
 
 class UnitOfMeasureView(APIView):
@@ -108,18 +124,33 @@ class UnitOfMeasureView(APIView):
 
 
 class ProductImportView(APIView):
-    #permission_classes = [IsAdminUser]
+    # permission_classes = [IsAdminUser]
 
     def post(self, request):
         serializer = ProductImportSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         excel_file = serializer.validated_data["file"]
+        # ?mode=upsert updates the existing products (supplier refreshes)
+        mode = request.query_params.get("mode", "create")
+        if mode not in ProductBulkCreateService.MODES:
+            return Response(
+                {"message": f"Unknown import mode '{mode}'"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if is_async_request(request):
+            job = enqueue(
+                "products.import",
+                {"file": save_upload(excel_file), "mode": mode},
+                user=request.user,
+            )
+            return job_accepted_response(request, job)
 
         parser = ExcelProductParser()
         products_data = parser.parse(excel_file)
 
-        service = ProductBulkCreateService()
+        service = ProductBulkCreateService(mode=mode)
         result = service.execute(products_data)
 
         return Response(
@@ -139,7 +170,7 @@ class AdminProductAPIView(APIView):
             return Response(serializer.data)
         else:
             queryset = Product.objects.all()
-            paginator = LimitOffsetPagination()
+            paginator = get_list_paginator(request, ordering=("sku",))
             paginated_queryset = paginator.paginate_queryset(queryset, request)
             serializer = ProductSerializer(paginated_queryset, many=True)
             return paginator.get_paginated_response(serializer.data)
@@ -216,30 +247,43 @@ class AdminProductAPIView(APIView):
 class ProductListView(APIView):
     def get(self, request):
         try:
-            queryset = Product.objects.all()
-            paginator = LimitOffsetPagination()
-            paginated_queryset = paginator.paginate_queryset(queryset, request)
-            serializer = ProductSerializer(paginated_queryset, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            return CatalogCache("products-list").response(
+                request, lambda: self.get_results(request)
+            )
+        except APIException:
+            # an invalid cursor is a client error
+            raise
         except Exception as e:
             return Response(
                 {"message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def get_results(self, request):
+        queryset = Product.objects.all()
+        paginator = get_list_paginator(request, ordering=("sku",))
+        paginated_queryset = paginator.paginate_queryset(queryset, request)
+        serializer = ProductSerializer(paginated_queryset, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
 
 class RetrieveLatestProducts(ListAPIView):
     def get(self, request):
         try:
-            queryset = Product.objects.filter(recommended=True)[:3]
-            paginator = LimitOffsetPagination()
-            paginated_queryset = paginator.paginate_queryset(queryset, request)
-            serializer = ProductSerializer(paginated_queryset, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            return CatalogCache("products-latest").response(
+                request, lambda: self.get_results(request)
+            )
         except Exception as e:
             return Response(
                 {"message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def get_results(self, request):
+        queryset = Product.objects.filter(recommended=True)[:3]
+        paginator = LimitOffsetPagination()
+        paginated_queryset = paginator.paginate_queryset(queryset, request)
+        serializer = ProductSerializer(paginated_queryset, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
 
 # retrieve all details of a single product
 class ProductDetailsView(APIView):
@@ -252,9 +296,9 @@ class ProductDetailsView(APIView):
             )
 
         try:
-            product = Product.objects.get(sku=sku)
-            serializer = ProductSerializer(product)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return CatalogCache("product-details").response(
+                request, lambda: self.get_result(sku)
+            )
 
         except Product.DoesNotExist:
             return Response(
@@ -267,6 +311,11 @@ class ProductDetailsView(APIView):
                 {"message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def get_result(self, sku):
+        product = Product.objects.get(sku=sku)
+        serializer = ProductSerializer(product)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 class ProductCartCreateView(APIView):
     def post(self, request):
@@ -289,54 +338,19 @@ class ProductCartCreateView(APIView):
             )
 
         try:
-
-            product_skus = [product["sku"] for product in products]
-            products_db = Product.objects.filter(sku__in=product_skus)
-            product_map = {product.sku: product for product in products_db}
-
-            # Check that all SKU'S are valid
-            missing_skus = set(product_skus) - set(product_map.keys())
-            if missing_skus:
-                return Response(
-                    {
-                        "message": f"Products not found for SKUs: {', '.join(missing_skus)}"
-                    },
-                    status=status.HTTP_404_NOT_FOUND,
-                )
-
-            with transaction.atomic():
-                product_carts = []
-                for product_data in products:
-                    sku = product_data["sku"]
-                    quantity = product_data.get("quantity", 1)
-                    product = product_map[sku]
-
-                    product_cart = ProductCart.objects.create(
-                        cart=cart, product=product, quantity=quantity
-                    )
-                    product_carts.append(product_cart)
-
-                serializer = ProductCartSerializer(product_carts, many=True)
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        except Exception as e:
-            return Response(
-                {"message": f"An error occurred: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            # through the cached cart, the list reads it and the flush writes it
+            items = CartStore().update(
+                cart,
+                ((product["sku"], product.get("quantity", 1)) for product in products),
             )
+            serializer = ProductCartSerializer(items, many=True)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        # handling exceptions
-        except Cart.DoesNotExist:
-            return Response(
-                {"message": f"Cart with ID {cart_id} doesn't exists."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        except MissingProductsError as e:
+            return Response({"message": str(e)}, status=status.HTTP_404_NOT_FOUND)
 
-        except Product.DoesNotExist:
-            return Response(
-                {"message": f"Product doesn't exists."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        except CartBusyError as e:
+            return Response({"message": str(e)}, status=status.HTTP_409_CONFLICT)
 
         except Exception as e:
             return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -356,7 +370,7 @@ class ProductCartUserList(APIView):
         try:
             user = User.objects.get(pk=user_id)
             cart = Cart.objects.filter(name=cart_id, user=user).first()
-            products = ProductCart.objects.filter(cart=cart)
+            products = CartStore().rows(cart) if cart else []
             serializer = ProductCartSerializer(products, many=True)
             return Response(serializer.data, status.HTTP_200_OK)
 
@@ -384,25 +398,21 @@ class ProductCartHasChanged(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        try:
-            order = Order.objects.filter(user=user, status="PENDING").first()
-            order_products = OrderProduct.objects.filter(
-                order=order
-            )  # Filtrar todos los productos de la orden
-        except Order.DoesNotExist:
+        order_id = (
+            Order.objects.filter(user=user, status="PENDING")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if order_id is None:
             return Response(
                 {"changed": True, "message": "No active order found"},
                 status=status.HTTP_200_OK,
             )
 
-        order_product_map = {op.product.sku: op.quantity for op in order_products}
-
+        # compares content hashes, the order one is cached until its products change
         request_product_map = {item["sku"]: item["quantity"] for item in items}
-
-        if order_product_map != request_product_map:
-            return Response({"changed": True}, status=status.HTTP_200_OK)
-
-        return Response({"changed": False}, status=status.HTTP_200_OK)
+        changed = CartStore().order_hash(order_id) != content_hash(request_product_map)
+        return Response({"changed": changed}, status=status.HTTP_200_OK)
 
 
 class SuggestedRetailPricesAPIView(APIView):
@@ -425,6 +435,8 @@ class SuggestedRetailPricesAPIView(APIView):
 
         with transaction.atomic():
             Product.objects.bulk_update(to_update_products, ["price"])
+            # bulk_update doesn't send post_save signals
+            transaction.on_commit(bump_catalog_version)
             return Response(
                 {
                     "message": f"{len(to_update_products)} products prices has been updates."
@@ -454,14 +466,18 @@ class ProductCartUserRemove(APIView):
         try:
             user = User.objects.get(pk=user_id)
             cart = Cart.objects.filter(pk=cart_id, user=user).first()
-            product = ProductCart.objects.filter(pk=product_id, cart=cart).first()
-
             if not cart:
                 raise Cart.DoesNotExist
-            if not product:
+
+            store = CartStore()
+            ids = store.get(cart.pk)["ids"]
+            sku = next(
+                (sku for sku, pk in ids.items() if str(pk) == str(product_id)), None
+            )
+            if not sku:
                 raise ProductCart.DoesNotExist
 
-            product.delete()
+            store.remove(cart.pk, [sku])
             return Response(
                 {"message": "Product cart was deleted successfully"},
                 status=status.HTTP_204_NO_CONTENT,
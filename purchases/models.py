@@ -3,6 +3,8 @@ import string
 from datetime import datetime
 import uuid
 from django.db import models
+from django.db.models import ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
 
 from products.models import Product, UnitOfMeasure
 from orders.models import Order
@@ -30,14 +32,39 @@ class Purchase(models.Model):
             self.id = generate_unique_id("000", purchase="True")
         super().save(*args, **kwargs)
 
-    def update_totals(self):
-        """Recalculates the total purchase amount and the estimated profit."""
-        total_cost = sum(item.subtotal() for item in self.purchase_items.all())
+    def update_totals(self, items=None):
+        """Recalculates and saves the total purchase amount and the estimated profit."""
+        self.set_totals(items)
+        self.save(update_fields=["total_amount", "estimated_profit", "last_updated"])
+
+    def set_totals(self, items=None):
+        """
+        Sets the totals without saving them. `items` (the purchase items being
+        written) are summed in one pass in memory, otherwise the saved items
+        are aggregated in SQL.
+        """
+        if items is not None:
+            total_cost = estimated_profit = 0
+            for item in items:
+                total_cost += item.subtotal()
+                estimated_profit += item.estimated_profit()
+        else:
+            cost = ExpressionWrapper(
+                F("quantity") * F("purchase_price"), output_field=models.FloatField()
+            )
+            percentage = Coalesce(
+                F("sell_percentage"),
+                Value(float(self.global_sell_percentage)),
+                output_field=models.FloatField(),
+            )
+            totals = self.purchase_items.aggregate(
+                total_cost=Sum(cost), estimated_profit=Sum(cost * percentage / 100)
+            )
+            total_cost = totals["total_cost"] or 0
+            estimated_profit = totals["estimated_profit"] or 0
+
         self.total_amount = total_cost + self.additional_costs
-        self.estimated_profit = sum(
-            item.estimated_profit() for item in self.purchase_items.all()
-        )
-        self.save()
+        self.estimated_profit = estimated_profit
 
     def __str__(self):
         return f"Purchase {self.id} | Total: ${self.total_amount} | Profit: ${self.estimated_profit}"
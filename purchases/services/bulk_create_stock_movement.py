@@ -1,29 +1,30 @@
 from django.db import transaction
-from orders.models import StockMovement
 from products.models import Product
+from products.services.inventory import InventoryService, StockLine
 from purchases.models import SuggestedRetailPrice
 
 
 class StockMoventSignal:
+    """
+    Registers the stock of bulk created purchase items, `bulk_create` skips
+    the `PurchaseItem` post_save signal that does it for single items.
+    """
+
     def __init__(self, type: str = "IN") -> None:
         self.movement_type = type
 
     def bulk_create(self, items):
-        parsed_items = []
+        lines = []
         for prod in items:
             if not isinstance(prod.product, Product):
                 raise TypeError("prod must be an Product instance")
-            product = prod.product
-            parsed_items.append(
-                StockMovement(
-                    product=product,
-                    movement_type=self.movement_type,
-                    quantity=prod.quantity,
-                    reason="SOURCING",
-                )
-            )
-        with transaction.atomic():
-            StockMovement.objects.bulk_create(parsed_items)
+            lines.append(StockLine(prod.product.sku, prod.quantity))
+
+        service = InventoryService()
+        if self.movement_type == "IN":
+            service.receive(lines, reason="SOURCING")
+        else:
+            service.reserve(lines, reason="SOURCING", partial=True)
 
 
 class RetailSuggestedPriceService:
@@ -0,0 +1,48 @@
+from orders.models import OrderProduct
+from purchases.models import MissingItems
+
+OPEN_ORDER_STATUS = ("PENDING", "PROCESSING")
+
+
+def refresh_missing_items() -> int:
+    """
+    Records the products the open orders are missing with the current stock.
+    The order lines are read with one query and the `MissingItems` rows are
+    written in bulk. Returns the number of lines short of stock.
+    """
+    missing = {}
+    lines = OrderProduct.objects.filter(
+        order__status__in=OPEN_ORDER_STATUS
+    ).values_list("order_id", "product_id", "quantity", "product__stock")
+    for order_id, sku, quantity, stock in lines:
+        # several lines of a product in an order: the last short one wins
+        if quantity > stock:
+            missing[(order_id, sku)] = (quantity - stock, stock)
+    if not missing:
+        return 0
+
+    existing = MissingItems.objects.filter(
+        order_id__in={order_id for order_id, _ in missing},
+        product_id__in={sku for _, sku in missing},
+    )
+    to_update, found = [], set()
+    for item in existing:
+        key = (item.order_id, item.product_id)
+        if key in missing:
+            item.missing_quantity, item.stock = missing[key]
+            to_update.append(item)
+            found.add(key)
+    MissingItems.objects.bulk_update(to_update, ["missing_quantity", "stock"])
+    MissingItems.objects.bulk_create(
+        [
+            MissingItems(
+                order_id=order_id,
+                product_id=sku,
+                missing_quantity=missing_quantity,
+                stock=stock,
+            )
+            for (order_id, sku), (missing_quantity, stock) in missing.items()
+            if (order_id, sku) not in found
+        ]
+    )
+    return len(missing)
@@ -0,0 +1,116 @@
+from django.db import transaction
+
+from products.models import Product, UnitOfMeasure
+from purchases.models import Purchase, PurchaseItem
+from purchases.services.bulk_create_stock_movement import (
+    RetailSuggestedPriceService,
+    StockMoventSignal,
+)
+from purchases.services.missing_items import refresh_missing_items
+from purchases.signals import bulk_purchase_write
+
+
+class InvalidPurchaseItemsError(Exception):
+    """The items of a purchase can't be written, nothing was saved."""
+
+
+class PurchaseItemsService:
+    """
+    Writes a purchase with its items in a fixed number of queries, whatever
+    the number of items:
+
+    - products and units are resolved with one `in_bulk` query each,
+    - the totals are summed in one pass over the new items and the purchase
+      is saved once,
+    - items, stock movements and suggested prices are written in bulk, the
+      per-item `post_save` receivers are skipped (`bulk_purchase_write`).
+
+    items: [{"product": sku, "quantity", "purchase_price", "sell_percentage",
+    "unity": unit id}], as sent by the dashboard.
+    """
+
+    def __init__(self, purchase: Purchase) -> None:
+        self.purchase = purchase
+
+    def create(self, items_data) -> list:
+        """
+        Saves the new purchase with its items, receives their stock and
+        records the suggested prices and missing items.
+        """
+        items = self.resolve(items_data)
+        self.purchase.set_totals(items)
+
+        with transaction.atomic(), bulk_purchase_write():
+            self.purchase.save()
+            PurchaseItem.objects.bulk_create(items)
+            StockMoventSignal().bulk_create(items)
+            # We're making a record with suggested prices by product
+            RetailSuggestedPriceService().bulk_create(items)
+            refresh_missing_items()
+        return items
+
+    def replace(self, items_data) -> list:
+        """
+        Replaces the items of a saved purchase and updates its totals.
+        """
+        items = self.resolve(
+            items_data, default_sell_percentage=self.purchase.global_sell_percentage
+        )
+
+        with transaction.atomic(), bulk_purchase_write():
+            self.purchase.purchase_items.all().delete()
+            PurchaseItem.objects.bulk_create(items)
+            self.purchase.set_totals(items)
+            self.purchase.save()
+        return items
+
+    def resolve(self, items_data, default_sell_percentage=None) -> list:
+        """
+        Unsaved `PurchaseItem`s of the purchase. Raises
+        `InvalidPurchaseItemsError` for incomplete items or unknown products
+        and units.
+        """
+        rows = []
+        for item in items_data:
+            product_sku = item.get("product")
+            quantity = item.get("quantity")
+            purchase_price = item.get("purchase_price")
+            unit_measure = item.get("unity")
+            if not all([product_sku, quantity, purchase_price, unit_measure]):
+                raise InvalidPurchaseItemsError(
+                    "Each item must have product, quantity, purchase_price, and unit_measure."
+                )
+            try:
+                sell_percentage = item.get("sell_percentage", default_sell_percentage)
+                rows.append(
+                    (
+                        str(product_sku),
+                        int(quantity),
+                        float(purchase_price),
+                        float(sell_percentage) if sell_percentage is not None else None,
+                        int(unit_measure),
+                    )
+                )
+            except (TypeError, ValueError):
+                raise InvalidPurchaseItemsError(
+                    "quantity, purchase_price, sell_percentage and unit_measure must be numbers."
+                )
+
+        products = Product.objects.in_bulk({row[0] for row in rows})
+        if len(products) < len({row[0] for row in rows}):
+            raise InvalidPurchaseItemsError("One or more products do not exist.")
+        units = UnitOfMeasure.objects.in_bulk({row[4] for row in rows})
+        if len(units) < len({row[4] for row in rows}):
+            raise InvalidPurchaseItemsError("One or more unit measures do not exist.")
+
+        return [
+            PurchaseItem(
+                purchase=self.purchase,
+                product=products[sku],
+                quantity=quantity,
+                purchase_price=purchase_price,
+                sell_percentage=sell_percentage,
+                unit_measure=units[unit],
+            )
+            for sku, quantity, purchase_price, sell_percentage, unit in rows
+        ]
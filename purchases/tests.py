@@ -1,3 +1,153 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from orders.models import Order, OrderProduct, StockMovement
+from products.models import Category, Product, UnitOfMeasure
+from purchases.models import MissingItems, Purchase, PurchaseItem, SuggestedRetailPrice
+from users.models import User
+
+
+class PurchaseCreateUpdateTest(TestCase):
+    url = "/api/v2/dashboard/purchases/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@test.com", dni="1", role="admin"
+        )
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        for i in range(10):
+            Product.objects.create(
+                sku=f"SKU{i}",
+                name=f"Producto {i}",
+                description="Producto",
+                price=1000,
+                stock=0,
+                category=category,
+            )
+        cls.unit = UnitOfMeasure.objects.create(unity="CAJA", weight=10)
+
+        customer = User.objects.create_user(
+            username="client", email="client@test.com", dni="2"
+        )
+        order = Order.objects.create(id="O1", user=customer, status="PENDING")
+        OrderProduct.objects.create(
+            order=order, product_id="SKU0", price=1, quantity=30
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _items(self, count):
+        return [
+            {
+                "product": f"SKU{i}",
+                "quantity": 5,
+                "purchase_price": 100,
+                "sell_percentage": 20 if i % 2 else None,
+                "unity": self.unit.pk,
+            }
+            for i in range(count)
+        ]
+
+    def _post(self, items):
+        return self.client.post(
+            self.url,
+            {
+                "purchase_date": "2026-10-01T10:00:00Z",
+                "global_sell_percentage": 10,
+                "additional_costs": 50,
+                "items": items,
+            },
+            format="json",
+        )
+
+    def test_create_resolves_items_in_bulk(self):
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self._post(self._items(2)).status_code, 201)
+        with CaptureQueriesContext(connection) as big:
+            response = self._post(self._items(10))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(small.captured_queries), len(big.captured_queries))
+
+        purchase = Purchase.objects.get(pk=response.json()["id"])
+        # 10 items of 500, half of them with 20% of profit and half with 10%
+        self.assertEqual(purchase.total_amount, 5050)
+        self.assertAlmostEqual(purchase.estimated_profit, 750)
+        self.assertEqual(purchase.purchased_by, self.admin)
+        self.assertEqual(len(response.json()["purchase_items"]), 10)
+
+        self.assertEqual(Product.objects.get(sku="SKU1").stock, 10)
+        self.assertEqual(
+            StockMovement.objects.filter(movement_type="IN", reason="SOURCING").count(),
+            12,
+        )
+        self.assertEqual(
+            SuggestedRetailPrice.objects.filter(
+                purchase_item__purchase=purchase
+            ).count(),
+            10,
+        )
+        # 30 units ordered, 5 received by each purchase
+        missing = MissingItems.objects.get()
+        self.assertEqual((missing.missing_quantity, missing.stock), (20, 10))
+
+    def test_unknown_products_save_nothing(self):
+        items = self._items(2) + [
+            {"product": "NOPE", "quantity": 1, "purchase_price": 1, "unity": 1}
+        ]
+
+        response = self._post(items)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Purchase.objects.exists())
+        self.assertEqual(Product.objects.get(sku="SKU0").stock, 0)
+
+    def test_update_replaces_the_items(self):
+        purchase_id = self._post(self._items(4)).json()["id"]
+
+        response = self.client.put(
+            self.url,
+            {
+                "purchase_id": purchase_id,
+                "global_sell_percentage": 30,
+                "items": [
+                    {
+                        "product": "SKU9",
+                        "quantity": 2,
+                        "purchase_price": 1000,
+                        "unity": self.unit.pk,
+                    }
+                ],
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        purchase = Purchase.objects.get(pk=purchase_id)
+        self.assertEqual(purchase.total_amount, 2050)
+        self.assertAlmostEqual(purchase.estimated_profit, 600)
+        self.assertEqual(purchase.purchase_items.get().sell_percentage, 30)
+
+    def test_single_items_still_use_the_signals(self):
+        purchase = Purchase.objects.create(global_sell_percentage=10)
+
+        PurchaseItem.objects.create(
+            purchase=purchase, product_id="SKU1", quantity=3, purchase_price=100
+        )
+        PurchaseItem.objects.create(
+            purchase=purchase,
+            product_id="SKU2",
+            quantity=1,
+            purchase_price=100,
+            sell_percentage=50,
+        )
+
+        purchase.refresh_from_db()
+        self.assertEqual(purchase.total_amount, 400)
+        self.assertAlmostEqual(purchase.estimated_profit, 80)
+        self.assertEqual(Product.objects.get(sku="SKU1").stock, 3)
@@ -1,4 +1,4 @@
-from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import status
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.pagination import LimitOffsetPagination
@@ -6,17 +6,17 @@ from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from products.models import Product, UnitOfMeasure
-from purchases.models import Purchase, PurchaseItem, MissingItems
+from purchases.models import Purchase, MissingItems
 from users.models import User
 from purchases.serializers import (
     PurchaseItemSerializer,
     PurchaseSerializer,
     MissingItemSerializer,
 )
-from purchases.services.bulk_create_stock_movement import (
-    RetailSuggestedPriceService,
-    StockMoventSignal,
+from utils.pagination import get_list_paginator
+from purchases.services.purchase_items import (
+    InvalidPurchaseItemsError,
+    PurchaseItemsService,
 )
 
 
@@ -75,6 +75,18 @@ class PurchaseListView(ListAPIView):
     )  # Últimas compras primero
     serializer_class = PurchaseSerializer
 
+    @property
+    def paginator(self):
+        """
+        Keyset pagination is opt-in (`?pagination=keyset` or `?cursor=`),
+        offset pagination stays as default.
+        """
+        if not hasattr(self, "_paginator"):
+            self._paginator = get_list_paginator(
+                self.request, ordering=("-purchase_date", "-id")
+            )
+        return self._paginator
+
 
 class PurchaseDetailView(RetrieveAPIView):
     """
@@ -140,85 +152,35 @@ class PurchaseCreateUpdateView(APIView):
             )
         items_data = request.data.get("items", [])
         purchase_date = request.data.get("purchase_date")
-        additional_costs = request.data.get('additional_costs', 0)
+        additional_costs = request.data.get("additional_costs", 0)
         #
         if not items_data:
             return Response(
                 {"error": "At least one purchase item is required."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        if len(items_data) > 0:
-
-            try:
-                with transaction.atomic():
-                    # Crear la compra
-                    purchase = Purchase.objects.create(
-                        purchased_by_id=request.user,
-                        global_sell_percentage=global_sell_percentage,
-                        purchase_date=purchase_date,
-                        additional_costs = additional_costs,
-                    )
-                    purchase.save()
-
-                    purchase_items = []
-                    for item in items_data:
-                        product_sku = item.get("product")
-                        quantity = item.get("quantity")
-                        purchase_price = item.get("purchase_price")
-                        sell_percentage = item.get("sell_percentage")
-                        unit_measure = item.get("unity")
-
-                        if not all(
-                            [product_sku, quantity, purchase_price, unit_measure]
-                        ):  
-
-                            return Response(
-                                {
-                                    "error": "Each item must have product, quantity, purchase_price, and unit_measure."
-                                },
-                                status=status.HTTP_400_BAD_REQUEST,
-                            )
-
-                        product = Product.objects.get(sku=product_sku)
-                        unit_measure = UnitOfMeasure.objects.get(pk=unit_measure)
-
-                        purchase_items.append(
-                                PurchaseItem(
-                                    purchase=purchase,
-                                    product=product,
-                                    quantity=quantity,
-                                    purchase_price=purchase_price,
-                                    sell_percentage=sell_percentage,
-                                    unit_measure=unit_measure,
-                                    )
-                                )
-
-                    PurchaseItem.objects.bulk_create(purchase_items)
-                    movements = StockMoventSignal()
-                    service = RetailSuggestedPriceService()
-                    movements.bulk_create(purchase_items)
-                    service.bulk_create(
-                        purchase_items
-                    )  # We're making a record with suggested prices by product
-                    purchase.update_totals()  # Update totals and estimated earnings
-
-                    return Response(
-                        PurchaseSerializer(purchase).data,
-                        status=status.HTTP_201_CREATED,
-                    )
-
-            except Exception as e:
-                print(e)
-                return Response(
-                    {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-            except UnitOfMeasure.DoesNotExist:
-
-                return Response(
-                    {"error": "One or more unit measures do not exist."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+
+        purchase = Purchase(
+            purchased_by=request.user,
+            global_sell_percentage=global_sell_percentage,
+            purchase_date=purchase_date,
+            additional_costs=float(additional_costs or 0),
+        )
+        try:
+            # Products and units in two queries, the purchase saved once
+            PurchaseItemsService(purchase).create(items_data)
+        except InvalidPurchaseItemsError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        prefetch_related_objects([purchase], "purchase_items__unit_measure")
+        return Response(
+            PurchaseSerializer(purchase).data,
+            status=status.HTTP_201_CREATED,
+        )
 
     def put(self, request):
         purchase_id = request.data.get("purchase_id")
@@ -252,65 +214,15 @@ class PurchaseCreateUpdateView(APIView):
             )
 
         try:
-            with transaction.atomic():
-                # Actualizar la compra
-                purchase.global_sell_percentage = global_sell_percentage
-                purchase.save()
-
-                # Eliminar los items anteriores y agregar los nuevos
-                purchase.purchase_items.all().delete()
-
-                purchase_items = []
-                for item in items_data:
-                    product_sku = item.get("product")
-                    quantity = item.get("quantity")
-                    purchase_price = item.get("purchase_price")
-                    sell_percentage = item.get(
-                        "sell_percentage", purchase.global_sell_percentage
-                    )
-                    unit_measure = item.get("unity")
-
-                    if not all([product_sku, quantity, purchase_price, unit_measure]):
-                        return Response(
-                            {
-                                "error": "Each item must have product, quantity, purchase_price, and unit_measure."
-                            },
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-
-                    product = Product.objects.get(sku=product_sku)
-                    unit_measure = UnitOfMeasure.objects.get(pk=unit_measure)
-
-                    purchase_item = PurchaseItem(
-                        purchase=purchase,
-                        product=product,
-                        quantity=quantity,
-                        purchase_price=purchase_price,
-                        sell_percentage=sell_percentage,
-                        unit_measure=unit_measure,
-                    )
-                    purchase_items.append(purchase_item)
-
-                PurchaseItem.objects.bulk_create(purchase_items)
-                purchase.update_totals()  # Recalcular totales
-
-                return Response(
-                    PurchaseSerializer(purchase).data, status=status.HTTP_200_OK
-                )
-
-        except Product.DoesNotExist:
-            return Response(
-                {"error": "One or more products do not exist."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        except UnitOfMeasure.DoesNotExist:
-            return Response(
-                {"error": "One or more unit measures do not exist."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
+            # Reemplazar los items y recalcular los totales
+            purchase.global_sell_percentage = global_sell_percentage
+            PurchaseItemsService(purchase).replace(items_data)
+        except InvalidPurchaseItemsError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+        prefetch_related_objects([purchase], "purchase_items__unit_measure")
+        return Response(PurchaseSerializer(purchase).data, status=status.HTTP_200_OK)
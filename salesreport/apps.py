@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SalesreportConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "salesreport"
+
+    def ready(self):
+        # Keeps the daily rollup tables up to date
+        import salesreport.signals
@@ -0,0 +1,27 @@
+from jobs.services.job_queue import job_handler
+from salesreport.serializers.report_params import ReportParamsSerializer
+from salesreport.services.analytics_snapshot import AnalyticsSnapshotService
+from salesreport.services.sales_report import SalesReportService
+from salesreport.services.stock_report import StockReportService
+from salesreport.views import BaseReportHandler
+
+
+@job_handler("reports.generate")
+def generate_report(job):
+    serializer = ReportParamsSerializer(data=job.payload["params"])
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    if job.payload.get("type") == "sales":
+        service = SalesReportService(group_by=data["group_by"])
+    else:
+        service = StockReportService(group_by=data["group_by"])
+
+    report = BaseReportHandler(serializer, service)
+    return list(report.result)
+
+
+@job_handler("analytics.refresh")
+def refresh_analytics(job):
+    AnalyticsSnapshotService().refresh()
+    return {"refreshed": True}
@@ -0,0 +1,36 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from salesreport.services.rollups import RollupService
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the daily sales and product rollup tables from the payments "
+        "and order items. Without dates every day is rebuilt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start", type=date.fromisoformat, help="First day (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--end", type=date.fromisoformat, help="Last day (YYYY-MM-DD)"
+        )
+
+    def handle(self, *args, **options):
+        start, end = options["start"], options["end"]
+        service = RollupService()
+
+        started = time.perf_counter()
+        sales = service.refresh_sales(start=start, end=end)
+        products = service.refresh_products(start=start, end=end)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {sales} daily sales rows and {products} daily product "
+                f"rows in {time.perf_counter() - started:.1f}s"
+            )
+        )
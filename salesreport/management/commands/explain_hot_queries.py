@@ -0,0 +1,173 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from orders.models import Order, OrderProduct, StockMovement
+from payments.models import Payment
+from products.models import Product
+from products.services.filter_service import ProductFilterService
+from salesreport.services.rollups import RollupService
+from salesreport.services.sales_report import SalesReportService
+from salesreport.services.stock_report import StockReportService
+from utils.synthetic_data import SyntheticDataGenerator
+
+# Indexes added for the hot filter paths, dropped for the "before" run
+HOT_PATH_INDEXES = {
+    Product: [
+        "product_category_price_idx",
+        "product_recommended_idx",
+        "product_best_seller_idx",
+    ],
+    Order: ["order_status_user_idx", "order_created_at_idx"],
+    OrderProduct: ["orderproduct_order_prod_idx"],
+    StockMovement: ["stockmovement_prod_date_idx"],
+    Payment: ["payment_status_date_idx"],
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic dataset and prints EXPLAIN plans and timings of the "
+        "hot report and filter queries without and with their indexes. "
+        "Everything runs in a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--no-plans", action="store_true", help="Only print the timings"
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+        self.show_plans = not options["no_plans"]
+
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Synthetic data and index changes rolled back.")
+
+    def _run(self, options):
+        self.stdout.write("Seeding synthetic data...")
+        started = time.perf_counter()
+        counts = SyntheticDataGenerator(
+            products=options["products"],
+            users=options["users"],
+            orders=options["orders"],
+        ).generate()
+        # the reports read the daily rollups, the generator uses bulk writes
+        RollupService().refresh_sales()
+        RollupService().refresh_products()
+        self.stdout.write(f"Seeded {counts} in {time.perf_counter() - started:.1f}s")
+
+        queries = self._get_queries()
+
+        self._set_indexes(enabled=False)
+        before = self._measure("WITHOUT hot path indexes", queries)
+
+        self._set_indexes(enabled=True)
+        after = self._measure("WITH hot path indexes", queries)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nSummary (best of runs, ms)"))
+        for name in queries:
+            speedup = before[name] / after[name] if after[name] else float("inf")
+            self.stdout.write(
+                f"{name:<28} {before[name]:>10.2f} {after[name]:>10.2f}  x{speedup:.1f}"
+            )
+
+    def _get_queries(self) -> dict:
+        """
+        The querysets behind ProductFilterService, the sales/stock reports and
+        the analytics endpoint, built with the same code paths when possible.
+        """
+        today = timezone.localdate()
+        start, end = today - timedelta(days=30), today
+        category_id = (
+            Product.objects.filter(sku__startswith="SYN")
+            .values_list("category_id", flat=True)
+            .first()
+        )
+        user_id = Order.objects.values_list("user_id", flat=True).first()
+        product_id = OrderProduct.objects.values_list("product_id", flat=True).first()
+
+        return {
+            "filter_category_price": Product.objects.filter(
+                category_id=category_id, price__gte=10000, price__lte=30000
+            ),
+            "filter_recommended": ProductFilterService(
+                {"category": category_id, "recommended": "true"}
+            ).search(),
+            "sales_report": SalesReportService("day").queryset(start, end),
+            "stock_report": StockReportService("day").queryset(start, end),
+            "orders_by_status_user": Order.objects.filter(
+                status="PENDING", user_id=user_id
+            ),
+            "latest_orders": Order.objects.order_by("-created_at", "-id")[:20],
+            "product_stock_movements": StockMovement.objects.filter(
+                product_id=product_id
+            ).order_by("-created_at")[:20],
+            "analytics_top_products": OrderProduct.objects.filter(
+                order__status="PROCESSING"
+            )
+            .values("product__sku", "product__name")
+            .annotate(sales=Sum("quantity"), revenue=Sum(F("quantity") * F("price")))
+            .order_by("-sales")[:5],
+            "analytics_prev_month": OrderProduct.objects.filter(
+                order__created_at__gte=timezone.now() - timedelta(days=60),
+                order__created_at__lt=timezone.now() - timedelta(days=30),
+            )
+            .values("product__sku")
+            .annotate(prev_sales=Sum("quantity")),
+            "analytics_payments_year": Payment.objects.filter(
+                payment_date__year=today.year
+            )
+            .values("payment_date__month")
+            .annotate(revenue=Sum("payment_amount"), orders=Count("id")),
+        }
+
+    def _set_indexes(self, enabled: bool):
+        # Not used as a context manager: SQLite refuses to enter it inside a
+        # transaction, and CREATE/DROP INDEX don't need its deferred SQL.
+        editor = connection.schema_editor()
+        editor.deferred_sql = []
+        for model, names in HOT_PATH_INDEXES.items():
+            for index in model._meta.indexes:
+                if index.name not in names:
+                    continue
+                if enabled:
+                    editor.add_index(model, index)
+                else:
+                    editor.remove_index(model, index)
+
+        # refresh the planner statistics
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def _measure(self, title, queries) -> dict:
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n=== {title} ==="))
+        timings = {}
+        for name, queryset in queries.items():
+            runs = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                runs.append((time.perf_counter() - started) * 1000)
+            timings[name] = min(runs)
+
+            self.stdout.write(self.style.SUCCESS(f"\n{name}: {timings[name]:.2f} ms"))
+            if self.show_plans:
+                self.stdout.write(queryset.explain())
+        return timings
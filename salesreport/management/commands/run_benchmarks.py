@@ -0,0 +1,103 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from products.services.catalog_cache import bump_catalog_version
+from salesreport.services.analytics_snapshot import AnalyticsSnapshotService
+from salesreport.services.rollups import RollupService
+from users.services.dashboard_metrics import invalidate_dashboard_metrics
+from utils.benchmark import BenchmarkRunner
+from utils.synthetic_data import SyntheticDataGenerator
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic dataset, drives the main API endpoints through the "
+        "test client and prints latency percentiles, queries per request and "
+        "peak memory as JSON. Everything is rolled back unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--reviews", type=int, default=5000)
+        parser.add_argument("--purchases", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--only", nargs="+", help="Scenario names to run, all by default"
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument(
+            "--no-seed",
+            action="store_true",
+            help="Benchmark the data already in the database",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Commit the synthetic data"
+        )
+
+    def handle(self, *args, **options):
+        # testserver host, in-memory email backend
+        setup_test_environment()
+        try:
+            with transaction.atomic():
+                report = self._run(options)
+                if not options["keep"]:
+                    raise Rollback
+        except Rollback:
+            self.stderr.write("Synthetic data rolled back.")
+        finally:
+            teardown_test_environment()
+
+        if options["keep"]:
+            # the site now serves the synthetic data too
+            bump_catalog_version()
+            AnalyticsSnapshotService().invalidate()
+            invalidate_dashboard_metrics()
+
+        payload = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(payload)
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(payload)
+
+    def _run(self, options) -> dict:
+        if not options["no_seed"]:
+            self.stderr.write("Seeding synthetic data...")
+            counts = SyntheticDataGenerator(
+                products=options["products"],
+                users=options["users"],
+                orders=options["orders"],
+                reviews=options["reviews"],
+                purchases=options["purchases"],
+                seed=options["seed"],
+            ).generate()
+            # the reports read the rollups, bulk writes don't maintain them
+            RollupService().refresh_sales()
+            RollupService().refresh_products()
+            self.stderr.write(f"Seeded {counts}")
+
+        runner = BenchmarkRunner(
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+        )
+        report = runner.run(only=options["only"])
+
+        for name, result in report["scenarios"].items():
+            latency = result["latency_ms"]
+            self.stderr.write(
+                f"{name:<22} p50 {latency['p50']:>8.1f}ms  p99 {latency['p99']:>8.1f}ms"
+                f"  queries {result['queries']['max']:>5}  errors {result['errors']}"
+            )
+        return report
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:45
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+BATCH_SIZE = 1000
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Fills the rollup tables with the history, the reports only read them.
+    Same aggregates as `RollupService`, on the historical models.
+    """
+    Payment = apps.get_model("payments", "Payment")
+    OrderProduct = apps.get_model("orders", "OrderProduct")
+    DailySalesRollup = apps.get_model("salesreport", "DailySalesRollup")
+    DailyProductRollup = apps.get_model("salesreport", "DailyProductRollup")
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    sales = (
+        Payment.objects.filter(payment_status="APPROVED")
+        .annotate(day=TruncDate("payment_date"))
+        .values("day")
+        .annotate(
+            total_sales=Coalesce(Sum("payment_amount"), Value(0), output_field=money),
+            net_sales=Coalesce(
+                Sum("net_received_amount"), Value(0), output_field=money
+            ),
+            taxes=Coalesce(Sum("taxes_amount"), Value(0), output_field=money),
+            total_transactions=Count("id"),
+        )
+        .order_by()
+    )
+    DailySalesRollup.objects.bulk_create(
+        [DailySalesRollup(date=row.pop("day"), **row) for row in sales],
+        batch_size=BATCH_SIZE,
+    )
+
+    products = (
+        OrderProduct.objects.exclude(order__status__in=["CANCELLED", "FAILED"])
+        .annotate(day=TruncDate("order__created_at"))
+        .values("day", "product_id")
+        .annotate(total_out=Sum("quantity"), orders_count=Count("order", distinct=True))
+        .order_by()
+    )
+    DailyProductRollup.objects.bulk_create(
+        [DailyProductRollup(date=row.pop("day"), **row) for row in products],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0005_order_indexes"),
+        ("payments", "0007_payment_indexes"),
+        ("salesreport", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
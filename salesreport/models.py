@@ -1,3 +1,47 @@
 from django.db import models
 
-# Create your models here.
+
+class DailySalesRollup(models.Model):
+    """
+    Approved payments aggregated per day (local time).
+    Maintained by `salesreport.signals` and `backfill_rollups`.
+    """
+
+    date = models.DateField(unique=True)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    taxes = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_transactions = models.PositiveIntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["date"]
+
+    def __str__(self):
+        return f"Sales {self.date} | ${self.total_sales} | {self.total_transactions} payments"
+
+
+class DailyProductRollup(models.Model):
+    """
+    Units sold per product and day (local time) of the orders that are not
+    cancelled or failed, grouped by the order creation date.
+    """
+
+    date = models.DateField()
+    product = models.ForeignKey(
+        "products.Product", on_delete=models.CASCADE, related_name="daily_rollups"
+    )
+    total_out = models.IntegerField(default=0)
+    orders_count = models.PositiveIntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "product"], name="unique_daily_product_rollup"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.date} | -{self.total_out}"
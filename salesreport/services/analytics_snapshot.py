@@ -0,0 +1,250 @@
+import json
+import time
+from calendar import month_abbr
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from django.utils.timesince import timesince
+from rest_framework.renderers import JSONRenderer
+
+from jobs.services.job_queue import enqueue
+from orders.models import Order, OrderProduct
+from payments.models import Payment
+from salesreport.serializers.serializers import (
+    CustomerSegmentsAnalyticsSerializer,
+    RecentActivityAnalyticsSerializer,
+    SalesDataReportSerializer,
+    TopProductsAnalyticsSerializer,
+)
+from users.models import User
+
+SNAPSHOT_KEY = "analytics:snapshot"
+REFRESH_LOCK_KEY = "analytics:snapshot:refreshing"
+
+
+class AnalyticsSnapshotService:
+    """
+    The analytics dashboard (sales data, top products, customer segments and
+    recent activity) computed with a handful of set-based queries and cached.
+
+    - `get()` returns the cached snapshot. When it is older than
+      `ANALYTICS_SNAPSHOT_TTL` the stale copy is still returned and a
+      `analytics.refresh` job recomputes it in the background.
+    - Only the very first request (empty cache) computes it inline.
+    """
+
+    renderer = JSONRenderer()
+
+    def __init__(self) -> None:
+        self.cache = caches[getattr(settings, "ANALYTICS_CACHE_ALIAS", "default")]
+        self.ttl = getattr(settings, "ANALYTICS_SNAPSHOT_TTL", 5 * 60)
+
+    def get(self) -> dict:
+        snapshot = self.cache.get(SNAPSHOT_KEY)
+        if snapshot is None:
+            return self.refresh()
+
+        if time.time() - snapshot["generated_at"] > self.ttl:
+            self.schedule_refresh()
+        return snapshot["data"]
+
+    def refresh(self) -> dict:
+        data = self.compute()
+        # kept for a while after it goes stale, so readers never wait
+        self.cache.set(
+            SNAPSHOT_KEY,
+            {"generated_at": time.time(), "data": data},
+            timeout=max(self.ttl * 12, 60 * 60),
+        )
+        self.cache.delete(REFRESH_LOCK_KEY)
+        return data
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached snapshot, the next `get()` computes it inline.
+        """
+        self.cache.delete(SNAPSHOT_KEY)
+
+    def schedule_refresh(self) -> bool:
+        """
+        Enqueues a refresh job unless one is already on its way.
+        """
+        if not self.cache.add(REFRESH_LOCK_KEY, True, timeout=max(self.ttl, 60)):
+            return False
+        enqueue("analytics.refresh")
+        return True
+
+    def compute(self) -> dict:
+        now = timezone.localtime()
+        data = {
+            "sales_data": SalesDataReportSerializer(
+                self._sales_data(now.year), many=True
+            ).data,
+            "top_products": TopProductsAnalyticsSerializer(
+                self._top_products(now), many=True
+            ).data,
+            "customer_segments": CustomerSegmentsAnalyticsSerializer(
+                self._customer_segments(now), many=True
+            ).data,
+            "recent_activity": RecentActivityAnalyticsSerializer(
+                self._recent_activity(), many=True
+            ).data,
+        }
+        # plain JSON types, safe to pickle in any cache backend
+        return json.loads(self.renderer.render(data))
+
+    # ===============================
+    # 📊 SALES DATA: 2 queries
+    # ===============================
+    def _sales_data(self, year) -> list:
+        payments = (
+            Payment.objects.filter(payment_date__year=year)
+            .values("payment_date__month")
+            .annotate(revenue=Sum("payment_amount"), orders=Count("id"))
+            .order_by()
+        )
+        customers = (
+            User.objects.filter(date_joined__year=year)
+            .values("date_joined__month")
+            .annotate(customers=Count("dni"))
+            .order_by()
+        )
+
+        payments_map = {p["payment_date__month"]: p for p in payments}
+        customers_map = {c["date_joined__month"]: c["customers"] for c in customers}
+
+        return [
+            {
+                "month": month_abbr[month],
+                "revenue": payments_map.get(month, {}).get("revenue", 0),
+                "orders": payments_map.get(month, {}).get("orders", 0),
+                "customers": customers_map.get(month, 0),
+            }
+            for month in range(1, 13)
+        ]
+
+    # ===============================
+    # 🔥 TOP PRODUCTS: 1 query
+    # ===============================
+    def _top_products(self, now) -> list:
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        prev_month_start = (month_start - timedelta(days=1)).replace(day=1)
+
+        processing = Q(order__status="PROCESSING")
+        top_products = (
+            OrderProduct.objects.values("product__sku", "product__name")
+            .annotate(
+                sales=Sum("quantity", filter=processing),
+                revenue=Sum(F("quantity") * F("price"), filter=processing),
+                prev_sales=Sum(
+                    "quantity",
+                    filter=Q(
+                        order__created_at__gte=prev_month_start,
+                        order__created_at__lt=month_start,
+                    ),
+                ),
+            )
+            .filter(sales__gt=0)
+            .order_by("-sales")[:5]
+        )
+
+        return [
+            {
+                "name": p["product__name"],
+                "sales": p["sales"],
+                "revenue": p["revenue"],
+                "growth": p["sales"] - (p["prev_sales"] or 0),
+            }
+            for p in top_products
+        ]
+
+    # ===============================
+    # 👥 CUSTOMER SEGMENTS: 2 queries
+    # ===============================
+    def _customer_segments(self, now) -> list:
+        users = User.objects.aggregate(
+            total=Count("pk"),
+            new=Count("pk", filter=Q(date_joined__gte=now - timedelta(days=30))),
+        )
+        total_customers = users["total"]
+
+        # orders and paid orders per customer, counted in the same pass
+        buyers = (
+            Order.objects.values("user")
+            .annotate(orders_count=Count("id"), paid_count=Count("payment"))
+            .order_by()
+            .aggregate(
+                recurrent=Count("user", filter=Q(orders_count__gt=1)),
+                payers=Count("user", filter=Q(paid_count__gt=0)),
+            )
+        )
+        # the top 20% spenders among the customers that paid something
+        vip_customers = min(buyers["payers"], max(1, total_customers // 5))
+
+        def percent(value):
+            return int((value / total_customers) * 100) if total_customers else 0
+
+        return [
+            {
+                "name": "New Customer",
+                "value": users["new"],
+                "percentage": percent(users["new"]),
+                "color": "#3B82F6",
+            },
+            {
+                "name": "Recurrent Customers",
+                "value": buyers["recurrent"],
+                "percentage": percent(buyers["recurrent"]),
+                "color": "#10B981",
+            },
+            {
+                "name": "VIP Customers",
+                "value": vip_customers,
+                "percentage": percent(vip_customers),
+                "color": "#8B5CF6",
+            },
+        ]
+
+    # ===============================
+    # 🕒 RECENT ACTIVITY: 3 queries
+    # ===============================
+    def _recent_activity(self) -> list:
+        recent_activity = []
+
+        for order in Order.objects.select_related("user").order_by("-created_at")[:3]:
+            recent_activity.append(
+                {
+                    "action": "New Order",
+                    "customer": str(order.user),
+                    "amount": order.total,
+                    "time": timesince(order.created_at) + " ago",
+                }
+            )
+
+        recent_payments = Payment.objects.select_related("order__user").order_by(
+            "-payment_date"
+        )[:2]
+        for payment in recent_payments:
+            recent_activity.append(
+                {
+                    "action": "New Payment",
+                    "customer": str(payment.order.user),
+                    "amount": payment.payment_amount,
+                    "time": timesince(payment.payment_date) + " ago",
+                }
+            )
+
+        for user in User.objects.order_by("-date_joined")[:2]:
+            recent_activity.append(
+                {
+                    "action": "New Customer",
+                    "customer": user.username if user.username else user.first_name,
+                    "amount": 0,
+                    "time": timesince(user.date_joined) + " ago",
+                }
+            )
+
+        return recent_activity
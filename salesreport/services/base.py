@@ -1,16 +1,33 @@
+from datetime import datetime, time
+
 from django.db.models.functions import TruncDay, TruncMonth, TruncYear
+from django.utils.timezone import make_aware
 
 
 class BaseReportService:
+    """
+    Reports built from the daily rollup tables: the pre-aggregated rows are
+    summed per day, month or year of their `date`.
+    """
 
-    def __init__(self, queryset, group_by):
-        self.queryset = queryset
+    def __init__(self, group_by):
         self.group_by = group_by
 
-    def _apply_grouping(self):
+    def _apply_grouping(self, queryset, field="date"):
         if self.group_by == "day":
-            return self.queryset.annotate(period=TruncDay("created_at"))
+            return queryset.annotate(period=TruncDay(field))
         if self.group_by == "month":
-            return self.queryset.annotate(period=TruncMonth("created_at"))
+            return queryset.annotate(period=TruncMonth(field))
         if self.group_by == "year":
-            return self.queryset.annotate(period=TruncYear("created_at"))
+            return queryset.annotate(period=TruncYear(field))
+
+    def generate(self, start_date, end_date):
+        rows = list(self.queryset(start_date, end_date))
+        # the periods are returned as local midnights, like the reports
+        # computed from the raw datetimes used to
+        for row in rows:
+            row["period"] = make_aware(datetime.combine(row["period"], time.min))
+        return rows
+
+    def queryset(self, start_date, end_date):
+        raise NotImplementedError
@@ -0,0 +1,262 @@
+import threading
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from orders.models import Order, OrderProduct
+from payments.models import Payment
+from salesreport.models import DailyProductRollup, DailySalesRollup
+
+# orders that don't count as sold stock (same rule as the stock report)
+EXCLUDED_ORDER_STATUS = ("CANCELLED", "FAILED")
+
+BATCH_SIZE = 1000
+
+
+def local_date(value):
+    """
+    Day of a datetime in the current time zone, the same day `__date`
+    lookups and `TruncDate` use. Accepts the ISO strings Mercado Pago sends.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = parse_datetime(value)
+        if value is None:
+            return None
+    if not isinstance(value, datetime):
+        return value
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return timezone.localtime(value).date()
+
+
+class RollupService:
+    """
+    Rebuilds the daily rollup rows of a set of days from the raw tables.
+
+    Every refresh is set based: one aggregate query for the whole scope,
+    an upsert of the resulting rows and a delete of the rows of the scope
+    that have nothing left (e.g. a payment that got refunded).
+    """
+
+    def refresh_sales(self, days=None, start=None, end=None) -> int:
+        scope = self._date_scope("date", days, start, end)
+        if scope is None:
+            return 0
+
+        payments = Payment.objects.filter(
+            payment_status="APPROVED",
+            **self._date_scope("payment_date__date", days, start, end),
+        )
+        money = DecimalField(max_digits=14, decimal_places=2)
+        rows = (
+            payments.annotate(day=TruncDate("payment_date"))
+            .values("day")
+            .annotate(
+                total_sales=Coalesce(
+                    Sum("payment_amount"), Value(0), output_field=money
+                ),
+                net_sales=Coalesce(
+                    Sum("net_received_amount"), Value(0), output_field=money
+                ),
+                taxes=Coalesce(Sum("taxes_amount"), Value(0), output_field=money),
+                total_transactions=Count("id"),
+            )
+            .order_by()
+        )
+        rollups = [
+            DailySalesRollup(
+                date=row["day"],
+                total_sales=row["total_sales"],
+                net_sales=row["net_sales"],
+                taxes=row["taxes"],
+                total_transactions=row["total_transactions"],
+            )
+            for row in rows
+        ]
+
+        return self._store(
+            DailySalesRollup,
+            rollups,
+            DailySalesRollup.objects.filter(**scope),
+            key_fields=["date"],
+            unique_fields=["date"],
+            update_fields=[
+                "total_sales",
+                "net_sales",
+                "taxes",
+                "total_transactions",
+                "last_updated",
+            ],
+        )
+
+    def refresh_products(
+        self, days=None, start=None, end=None, product_ids=None
+    ) -> int:
+        scope = self._date_scope("date", days, start, end)
+        if scope is None:
+            return 0
+
+        items = OrderProduct.objects.filter(
+            **self._date_scope("order__created_at__date", days, start, end)
+        ).exclude(order__status__in=EXCLUDED_ORDER_STATUS)
+        existing = DailyProductRollup.objects.filter(**scope)
+        if product_ids is not None:
+            items = items.filter(product_id__in=product_ids)
+            existing = existing.filter(product_id__in=product_ids)
+
+        rows = (
+            items.annotate(day=TruncDate("order__created_at"))
+            .values("day", "product_id")
+            .annotate(
+                total_out=Sum("quantity"),
+                orders_count=Count("order", distinct=True),
+            )
+            .order_by()
+        )
+        rollups = [
+            DailyProductRollup(
+                date=row["day"],
+                product_id=row["product_id"],
+                total_out=row["total_out"],
+                orders_count=row["orders_count"],
+            )
+            for row in rows
+        ]
+
+        return self._store(
+            DailyProductRollup,
+            rollups,
+            existing,
+            key_fields=["date", "product_id"],
+            unique_fields=["date", "product"],
+            update_fields=["total_out", "orders_count", "last_updated"],
+        )
+
+    def refresh_orders(self, order_ids) -> int:
+        """
+        Refreshes the product rollups of the days the given orders belong to,
+        for bulk writes that don't send signals.
+        """
+        order_ids = set(order_ids)
+        if not order_ids:
+            return 0
+        days = set(
+            Order.objects.filter(pk__in=order_ids)
+            .annotate(day=TruncDate("created_at"))
+            .values_list("day", flat=True)
+            .distinct()
+        )
+        return self.refresh_products(days=days)
+
+    def _date_scope(self, field, days, start, end):
+        """
+        Filter kwargs for an explicit set of days or a (possibly open) range.
+        Returns `None` when the set of days is empty.
+        """
+        if days is not None:
+            days = set(days) - {None}
+            return {f"{field}__in": days} if days else None
+
+        scope = {}
+        if start:
+            scope[f"{field}__gte"] = start
+        if end:
+            scope[f"{field}__lte"] = end
+        return scope
+
+    def _store(
+        self, model, rollups, existing, key_fields, unique_fields, update_fields
+    ):
+        keep = {
+            tuple(getattr(rollup, field) for field in key_fields) for rollup in rollups
+        }
+
+        with transaction.atomic():
+            stale = [
+                pk
+                for pk, *key in existing.values_list("pk", *key_fields)
+                if tuple(key) not in keep
+            ]
+            for start in range(0, len(stale), BATCH_SIZE):
+                model.objects.filter(pk__in=stale[start : start + BATCH_SIZE]).delete()
+
+            model.objects.bulk_create(
+                rollups,
+                batch_size=BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=update_fields,
+            )
+
+        return len(rollups)
+
+
+# ===============================
+# Incremental maintenance
+# ===============================
+# The signals only mark days as dirty, the refresh runs once per transaction
+# after it commits so a checkout with many items recomputes its day once.
+_pending = threading.local()
+
+
+def _get_pending():
+    if not hasattr(_pending, "sales"):
+        _pending.sales = set()
+        # day -> set of product ids, `None` refreshes every product of the day
+        _pending.products = {}
+        _pending.orders = set()
+    return _pending
+
+
+def mark_sales_dirty(*days) -> None:
+    pending = _get_pending()
+    pending.sales.update(day for day in days if day)
+    transaction.on_commit(flush_pending, robust=True)
+
+
+def mark_products_dirty(day, product_ids=None) -> None:
+    if day is None:
+        return
+    pending = _get_pending()
+    if product_ids is None:
+        pending.products[day] = None
+    elif pending.products.get(day, set()) is not None:
+        pending.products.setdefault(day, set()).update(product_ids)
+    transaction.on_commit(flush_pending, robust=True)
+
+
+def mark_orders_dirty(order_ids) -> None:
+    pending = _get_pending()
+    pending.orders.update(order_ids)
+    transaction.on_commit(flush_pending, robust=True)
+
+
+def flush_pending() -> None:
+    """
+    Refreshes everything marked as dirty in this thread. Callbacks registered
+    after the first one of a transaction find nothing left to do.
+    """
+    pending = _get_pending()
+    sales, products, orders = pending.sales, pending.products, pending.orders
+    if not (sales or products or orders):
+        return
+    _pending.sales, _pending.products, _pending.orders = set(), {}, set()
+
+    service = RollupService()
+    service.refresh_sales(days=sales)
+    service.refresh_orders(orders)
+
+    whole_days = {day for day, ids in products.items() if ids is None}
+    service.refresh_products(days=whole_days)
+
+    partial = {day: ids for day, ids in products.items() if ids is not None}
+    if partial:
+        service.refresh_products(
+            days=partial.keys(), product_ids=set().union(*partial.values())
+        )
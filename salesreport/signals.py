@@ -0,0 +1,52 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from orders.models import Order, OrderProduct
+from payments.models import Payment
+from salesreport.services.rollups import (
+    local_date,
+    mark_products_dirty,
+    mark_sales_dirty,
+)
+
+# The rollups are refreshed after the transaction commits, see
+# `salesreport.services.rollups.flush_pending`. Bulk writes (order imports)
+# don't send these signals and mark their orders dirty themselves.
+
+
+@receiver(post_init, sender=Payment)
+def remember_payment_date(sender, instance, **kwargs):
+    # a payment moved to another day leaves the previous one outdated
+    instance._rollup_payment_date = instance.__dict__.get("payment_date")
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def refresh_sales_rollup(sender, instance, **kwargs):
+    mark_sales_dirty(
+        local_date(instance.payment_date),
+        local_date(getattr(instance, "_rollup_payment_date", None)),
+    )
+    instance._rollup_payment_date = instance.payment_date
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._rollup_status = instance.__dict__.get("status")
+
+
+@receiver(post_save, sender=Order)
+def refresh_order_rollup(sender, instance, created, **kwargs):
+    # only a status change moves the order in or out of the stock report
+    if not created and instance.status != instance._rollup_status:
+        mark_products_dirty(local_date(instance.created_at))
+    instance._rollup_status = instance.status
+
+
+@receiver(post_save, sender=OrderProduct)
+@receiver(pre_delete, sender=OrderProduct)
+def refresh_product_rollup(sender, instance, **kwargs):
+    # pre_delete: the order still exists when its items are cascade deleted
+    mark_products_dirty(
+        local_date(instance.order.created_at), product_ids=[instance.product_id]
+    )
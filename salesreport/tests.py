@@ -1,3 +1,208 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from importlib import import_module
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs.models import Job
+from orders.models import Order, OrderProduct
+from payments.models import Payment
+from products.models import Category, Product
+from salesreport.models import DailyProductRollup, DailySalesRollup
+from salesreport.services.sales_report import SalesReportService
+from salesreport.services.stock_report import StockReportService
+from users.models import User
+
+
+class RollupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        for sku in ("A", "B"):
+            Product.objects.create(
+                sku=sku, name=sku, description=sku, stock=100, category=category
+            )
+        cls.user = User.objects.create_user(
+            username="buyer", email="buyer@test.com", dni="123456"
+        )
+
+    def _order(self, order_id, items, paid=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(id=order_id, user=self.user)
+            for sku, quantity in items:
+                OrderProduct.objects.create(
+                    order=order, product_id=sku, price=1000, quantity=quantity
+                )
+            if paid is not None:
+                Payment.objects.create(
+                    order=order,
+                    payment_status="APPROVED",
+                    payment_amount=paid,
+                    net_received_amount=paid - 10,
+                    taxes_amount=10,
+                    payment_date=timezone.now(),
+                )
+        return order
+
+    def test_signals_keep_the_rollups_updated(self):
+        self._order("O1", [("A", 2), ("B", 1)], paid=Decimal("300"))
+        self._order("O2", [("A", 3)], paid=Decimal("200"))
+        today = timezone.localdate()
+
+        sales = DailySalesRollup.objects.get(date=today)
+        self.assertEqual(sales.total_sales, Decimal("500"))
+        self.assertEqual(sales.taxes, Decimal("20"))
+        self.assertEqual(sales.total_transactions, 2)
+        self.assertEqual(
+            set(
+                DailyProductRollup.objects.values_list(
+                    "product_id", "total_out", "orders_count"
+                )
+            ),
+            {("A", 5, 2), ("B", 1, 1)},
+        )
+
+    def test_refunds_and_cancellations_leave_the_rollups(self):
+        order = self._order("O1", [("A", 2)], paid=Decimal("300"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = Payment.objects.get(order=order)
+            payment.payment_status = "REFUNDED"
+            payment.save()
+            order.status = "CANCELLED"
+            order.save()
+
+        self.assertFalse(DailySalesRollup.objects.exists())
+        self.assertFalse(DailyProductRollup.objects.exists())
+
+    def test_reports_group_the_daily_rows(self):
+        self._order("O1", [("A", 2)], paid=Decimal("300"))
+        self._order("O2", [("A", 1)], paid=Decimal("100"))
+        today = timezone.localdate()
+
+        sales = SalesReportService("month").generate(today, today)
+        self.assertEqual(len(sales), 1)
+        self.assertEqual(sales[0]["total_sales"], Decimal("400"))
+        self.assertEqual(sales[0]["total_transactions"], 2)
+        self.assertEqual(sales[0]["period"].date(), today.replace(day=1))
+
+        stock = StockReportService("day").generate(today, today)
+        self.assertEqual(
+            [
+                (row["product_id"], row["total_out"], row["orders_count"])
+                for row in stock
+            ],
+            [("A", 3, 2)],
+        )
+
+    def test_backfill_rebuilds_bulk_written_days(self):
+        order = self._order("O1", [("A", 2)], paid=Decimal("300"))
+        yesterday = timezone.now() - timedelta(days=1)
+        # queryset updates don't send signals, the rollups are left behind
+        Order.objects.filter(pk=order.pk).update(created_at=yesterday)
+        Payment.objects.filter(order=order).update(payment_date=yesterday)
+
+        call_command("backfill_rollups", stdout=StringIO())
+
+        day = timezone.localtime(yesterday).date()
+        self.assertEqual(
+            list(DailySalesRollup.objects.values_list("date", "total_sales")),
+            [(day, Decimal("300"))],
+        )
+        self.assertEqual(
+            list(DailyProductRollup.objects.values_list("date", "total_out")),
+            [(day, 2)],
+        )
+
+
+    def test_migration_fills_the_rollups_with_the_history(self):
+        self._order("O1", [("A", 2), ("B", 1)], paid=Decimal("300"))
+        self._order("O2", [("A", 3)])
+        # as they are after the migration that creates them
+        DailySalesRollup.objects.all().delete()
+        DailyProductRollup.objects.all().delete()
+
+        migration = import_module("salesreport.migrations.0002_backfill_rollups")
+        migration.backfill_rollups(apps, None)
+
+        today = timezone.localdate()
+        self.assertEqual(
+            list(DailySalesRollup.objects.values_list("date", "total_sales")),
+            [(today, Decimal("300"))],
+        )
+        self.assertEqual(
+            set(
+                DailyProductRollup.objects.values_list(
+                    "product_id", "total_out", "orders_count"
+                )
+            ),
+            {("A", 5, 2), ("B", 1, 1)},
+        )
+
+
+class AnalyticsSnapshotTest(TestCase):
+    url = "/api/v2/dashboard/analytics/"
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        products = [
+            Product.objects.create(
+                sku=f"P{i}", name=f"P{i}", description="P", stock=100, category=category
+            )
+            for i in range(5)
+        ]
+        for i in range(10):
+            user = User.objects.create_user(
+                username=f"user{i}", email=f"user{i}@test.com", dni=f"20000{i}"
+            )
+            for j in range(2):
+                order = Order.objects.create(
+                    id=f"O{i}-{j}", user=user, status="PROCESSING", total=1000
+                )
+                for product in products:
+                    OrderProduct.objects.create(
+                        order=order, product=product, price=1000, quantity=1
+                    )
+            Payment.objects.create(
+                order=order, payment_amount=1000, payment_date=timezone.now()
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_queries_do_not_grow_with_the_data(self):
+        with self.assertNumQueries(8):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        data = response.json()
+        self.assertEqual(len(data["top_products"]), 5)
+        self.assertEqual(data["top_products"][0]["sales"], 20)
+        segments = {s["name"]: s["value"] for s in data["customer_segments"]}
+        self.assertEqual(segments["Recurrent Customers"], 10)
+        self.assertEqual(segments["VIP Customers"], 2)
+        self.assertEqual(len(data["recent_activity"]), 7)
+
+        # served from the cache
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    @override_settings(ANALYTICS_SNAPSHOT_TTL=0)
+    def test_stale_snapshot_is_refreshed_in_the_background(self):
+        self.client.get(self.url)
+        time.sleep(0.01)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Job.objects.filter(kind="analytics.refresh").count(), 1)
+
+        # a single refresh is scheduled while one is pending
+        self.client.get(self.url)
+        self.assertEqual(Job.objects.count(), 1)
@@ -0,0 +1,15 @@
+from jobs.services.job_queue import delete_upload, job_handler, open_upload
+from users.services.handle_excel_file import ExcelUserParser, UsersBulkCreate
+
+
+@job_handler("users.import")
+def import_users(job):
+    name = job.payload["file"]
+    try:
+        with open_upload(name) as file:
+            users_data = ExcelUserParser().parse(file)
+            return UsersBulkCreate(on_chunk=lambda rows: job.heartbeat()).execute(
+                users_data
+            )
+    finally:
+        delete_upload(name)
@@ -1,6 +1,4 @@
-from calendar import monthrange
 from datetime import timedelta
-from decimal import Decimal, ROUND_HALF_UP
 
 from django.contrib.auth.hashers import check_password
 from django.db.models import Sum
@@ -13,6 +11,7 @@ from products.models import Product, Category, UnitOfMeasure
 from reviews.models import ProductReview
 from shipments.models import DeliveryAddress, Shipment
 from .models import User, ReferralDiscount, NewsletterSubscription, UserProfileSettings
+from .services.dashboard_metrics import DashboardMetricsService
 from purchases.models import Purchase
 
 
@@ -63,6 +62,8 @@ class BulkCreateUserSerializer(serializers.ModelSerializer):
             "password",
             "referral_code",
         ]
+        # checked for the whole file by `UsersBulkCreate`, not row by row
+        extra_kwargs = {"dni": {"validators": []}, "email": {"validators": []}}
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -105,22 +106,34 @@ class UserSerializer(serializers.ModelSerializer):
         ]
         extra_kwargs = {"password": {"write_only": True}}
 
+    # The counters are read from the annotations of `with_user_counters()`
+    # when present, otherwise they are queried for the single user.
     def get_orders(self, obj):
+        if hasattr(obj, "orders_count"):
+            return obj.orders_count
         return Order.objects.filter(user=obj).count()
 
     def get_pending_orders_counter(self, obj):
+        if hasattr(obj, "pending_orders_count"):
+            return obj.pending_orders_count
         return Shipment.objects.filter(customer=obj, status="PENDING").count()
 
     def get_addresses_counter(self, obj):
+        if hasattr(obj, "addresses_count"):
+            return obj.addresses_count
         return DeliveryAddress.objects.filter(customer=obj).count()
 
     def get_reviews_counter(self, obj):
+        if hasattr(obj, "reviews_count"):
+            return obj.reviews_count
         return ProductReview.objects.filter(user=obj).count()
 
     def get_rewards_counter(self, obj):
-        return sum(
-            reward.is_valid() for reward in ReferralDiscount.objects.filter(user=obj)
-        )
+        if hasattr(obj, "rewards_count"):
+            return obj.rewards_count
+        return ReferralDiscount.objects.filter(
+            user=obj, has_discount=True, expires_at__gt=timezone.now()
+        ).count()
 
     def create(self, validated_data):
         password = validated_data.pop("password", None)
@@ -197,8 +210,9 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
     def get_total_spend(self, obj):
-        total = sum(order.total for order in Order.objects.filter(user=obj))
-        return total
+        if hasattr(obj, "total_spend_amount"):
+            return obj.total_spend_amount
+        return Order.objects.filter(user=obj).aggregate(total=Sum("total"))["total"] or 0
 
 
 class AdminDashboardSerializer(serializers.ModelSerializer):
@@ -229,98 +243,29 @@ class AdminDashboardSerializer(serializers.ModelSerializer):
             'measures'
         ]
 
-    def _get_month_range(self, months_ago=0):
-        """Devuelve el rango de fechas de un mes anterior"""
-        today = timezone.now()
-        first_day_this_month = today.replace(day=1)
-        for _ in range(months_ago):
-            first_day_this_month = (first_day_this_month - timedelta(days=1)).replace(
-                day=1
-            )
-        last_day = first_day_this_month.replace(
-            day=monthrange(first_day_this_month.year, first_day_this_month.month)[1]
-        )
-        return first_day_this_month, last_day
-
-    def _calculate_change(self, current, previous, total):
-        """Calcula el cambio porcentual entre valores y añade el total global"""
-        epsilon = Decimal("1e-5")
-        current = Decimal(current)
-        previous = Decimal(previous)
-
-        change = ((current - previous) / (previous + epsilon)) * Decimal(100)
-        return {
-            "current": int(current),
-            "previous": int(previous),
-            "percentage_change": float(
-                change.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            ),
-            "total": int(total),
-        }
+    def _get_metrics(self):
+        # orders, revenue and customers share one cached computation
+        if not hasattr(self, "_metrics"):
+            self._metrics = DashboardMetricsService().get()
+        return self._metrics
+
     def get_measures(self, obj):
-        data = []
-        measures = UnitOfMeasure.objects.all()
-        for ms in measures:
-            data.append({'id': ms.id, 'name': ms.unity, 'weight': ms.weight, 'value': 'Lbs'})
-        return data
+        return [
+            {"id": ms["id"], "name": ms["unity"], "weight": ms["weight"], "value": "Lbs"}
+            for ms in UnitOfMeasure.objects.values("id", "unity", "weight")
+        ]
 
     def get_categories(self, obj):
-        categories_list = []
-        categories = Category.objects.all()
-        for ca in categories:
-            categories_list.append(
-                {'id': ca.id, 'name': ca.name}
-            )
-
-        return categories_list
+        return list(Category.objects.values("id", "name"))
 
     def get_orders(self, obj):
-        current_start, current_end = self._get_month_range(0)
-        previous_start, previous_end = self._get_month_range(1)
-
-        current_count = Order.objects.filter(
-            created_at__range=(current_start, current_end)
-        ).count()
-        previous_count = Order.objects.filter(
-            created_at__range=(previous_start, previous_end)
-        ).count()
-        total = Order.objects.all().count()
-
-        return self._calculate_change(current_count, previous_count, total)
+        return self._get_metrics()["orders"]
 
     def get_revenue(self, obj):
-        current_start, current_end = self._get_month_range(0)
-        previous_start, previous_end = self._get_month_range(1)
-
-        current_total = (
-            Order.objects.filter(
-                created_at__range=(current_start, current_end)
-            ).aggregate(total=Sum("total"))["total"]
-            or 0
-        )
-        previous_total = (
-            Order.objects.filter(
-                created_at__range=(previous_start, previous_end)
-            ).aggregate(total=Sum("total"))["total"]
-            or 0
-        )
-        total = Order.objects.aggregate(total=Sum("total"))["total"] or 0
-
-        return self._calculate_change(current_total, previous_total, total)
+        return self._get_metrics()["revenue"]
 
     def get_customers(self, obj):
-        current_start, current_end = self._get_month_range(0)
-        previous_start, previous_end = self._get_month_range(1)
-
-        current = User.objects.filter(
-            role="client", date_joined__range=(current_start, current_end)
-        ).count()
-        previous = User.objects.filter(
-            role="client", date_joined__range=(previous_start, previous_end)
-        ).count()
-        total = User.objects.filter(role="client").count()
-
-        return self._calculate_change(current, previous, total)
+        return self._get_metrics()["customers"]
 
     def get_purchases(self, obj):
         return Purchase.objects.all().count()
@@ -0,0 +1,149 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Q, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from orders.models import Order
+from users.models import User
+
+METRICS_VERSION_KEY = "dashboard:metrics:version"
+
+
+def get_metrics_cache():
+    return caches[getattr(settings, "DASHBOARD_METRICS_CACHE_ALIAS", "default")]
+
+
+def get_metrics_version() -> int:
+    cache = get_metrics_cache()
+    version = cache.get(METRICS_VERSION_KEY)
+    if version is None:
+        cache.add(METRICS_VERSION_KEY, 1, timeout=None)
+        version = cache.get(METRICS_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_dashboard_metrics() -> None:
+    """
+    Drops every cached metrics window, new orders or customers changed them.
+    """
+    cache = get_metrics_cache()
+    try:
+        cache.incr(METRICS_VERSION_KEY)
+    except ValueError:
+        cache.set(METRICS_VERSION_KEY, 2, timeout=None)
+
+
+class DashboardMetricsService:
+    """
+    Orders, revenue and customers of the admin dashboard: current month,
+    previous month and all-time values.
+
+    Every table is read once with conditional aggregation and the result is
+    cached per month window until an order or a customer is created.
+    """
+
+    def __init__(self) -> None:
+        self.cache = get_metrics_cache()
+        self.timeout = getattr(settings, "DASHBOARD_METRICS_TIMEOUT", 60 * 60)
+
+    def get(self) -> dict:
+        current, previous, next_month = self._month_windows()
+        key = f"dashboard:metrics:{get_metrics_version()}:{current:%Y-%m}"
+
+        metrics = self.cache.get(key)
+        if metrics is None:
+            metrics = self.compute(current, previous, next_month)
+            self.cache.set(key, metrics, self.timeout)
+        return metrics
+
+    def compute(self, current, previous, next_month) -> dict:
+        this_month = Q(created_at__gte=current, created_at__lt=next_month)
+        last_month = Q(created_at__gte=previous, created_at__lt=current)
+        orders = Order.objects.aggregate(
+            current_count=Count("id", filter=this_month),
+            previous_count=Count("id", filter=last_month),
+            total_count=Count("id"),
+            current_total=Sum("total", filter=this_month),
+            previous_total=Sum("total", filter=last_month),
+            total=Sum("total"),
+        )
+
+        customers = User.objects.filter(role="client").aggregate(
+            current=Count(
+                "pk", filter=Q(date_joined__gte=current, date_joined__lt=next_month)
+            ),
+            previous=Count(
+                "pk", filter=Q(date_joined__gte=previous, date_joined__lt=current)
+            ),
+            total=Count("pk"),
+        )
+
+        return {
+            "orders": self._calculate_change(
+                orders["current_count"],
+                orders["previous_count"],
+                orders["total_count"],
+            ),
+            "revenue": self._calculate_change(
+                orders["current_total"] or 0,
+                orders["previous_total"] or 0,
+                orders["total"] or 0,
+            ),
+            "customers": self._calculate_change(
+                customers["current"], customers["previous"], customers["total"]
+            ),
+        }
+
+    def _month_windows(self) -> tuple:
+        """
+        Local midnights of the first day of the current, previous and next
+        month.
+        """
+        today = timezone.localdate()
+        current = today.replace(day=1)
+        previous = (current - timedelta(days=1)).replace(day=1)
+        next_month = (current + timedelta(days=32)).replace(day=1)
+        return tuple(
+            timezone.make_aware(datetime.combine(day, time.min))
+            for day in (current, previous, next_month)
+        )
+
+    def _calculate_change(self, current, previous, total):
+        """Calcula el cambio porcentual entre valores y añade el total global"""
+        epsilon = Decimal("1e-5")
+        current = Decimal(current)
+        previous = Decimal(previous)
+
+        change = ((current - previous) / (previous + epsilon)) * Decimal(100)
+        return {
+            "current": int(current),
+            "previous": int(previous),
+            "percentage_change": float(
+                change.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            ),
+            "total": int(total),
+        }
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_on_orders(sender, **kwargs):
+    # totals are updated after the order is created, any save counts
+    invalidate_dashboard_metrics()
+
+
+@receiver(post_save, sender=User)
+def invalidate_on_new_customers(sender, created, **kwargs):
+    # logins save the user too, only new users change the counts
+    if created:
+        invalidate_dashboard_metrics()
+
+
+@receiver(post_delete, sender=User)
+def invalidate_on_deleted_customers(sender, **kwargs):
+    invalidate_dashboard_metrics()
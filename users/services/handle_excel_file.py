@@ -1,60 +1,67 @@
-from io import BytesIO
+import multiprocessing
+import time
 import uuid
-from django.db import transaction
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
 
-# from openpyxl import load_workbook
-from users.models import User
-from openpyxl import load_workbook
 from users.models import User
+from users.services.dashboard_metrics import invalidate_dashboard_metrics
 from users.serializers import BulkCreateUserSerializer
+from utils.ingestion import batched, iter_rows
+
+# checked with one `__in` query per chunk instead of one query per row
+UNIQUE_FIELDS = ("dni", "email", "referral_code")
 
 
 class ExcelUserParser:
     """
-    Parses an Excel (.xlsx) file and returns a list of product dictionaries
+    Parses an Excel (.xlsx) or CSV file and yields user dictionaries
     ready to be validated by a DRF serializer.
+    Rows are read lazily, the file is never loaded in memory.
+
+    Passwords are yielded in clear text (the DNI), `UsersBulkCreate` hashes
+    them in parallel. `row` is the row number in the file, for the errors.
     """
 
-    def parse(self, file) -> list[dict]:
+    def parse(self, file) -> Iterator[dict]:
         """
         file: InMemoryUploadedFile | TemporaryUploadedFile
         """
-
-        workbook = load_workbook(
-            filename=BytesIO(file.read()), read_only=True, data_only=True
-        )
-
-        sheet = workbook.active
-        users: list[dict] = []
-
-        for idx, row in enumerate(
-            sheet.iter_rows(min_row=2, values_only=True), start=2
-        ):
+        for row_number, row in enumerate(iter_rows(file), start=2):
             # Skip empty rows
             if not row or not row[0]:
                 continue
 
+            dni = self.clean_dni(row[0])
             user = {
-                "dni": str(int(row[0])).strip(),
+                "row": row_number,
+                "dni": dni,
                 "first_name": row[1],
                 "last_name": row[2],
                 "phone": row[3],
                 "email": row[4],
-                "password": make_password(str(int(row[0])).strip()),
-                "username": self.make_username(
-                    str(row[0]).strip(), str(row[1]).strip()
-                ),
+                "password": dni,
+                "username": self.make_username(dni, str(row[1]).strip()),
                 "referral_code": self.get_referral_code(),
                 "active": True,
                 "user_groups": [],
                 "role": row[5] or "customer",
             }
 
-            users.append(user)
+            yield user
 
-        workbook.close()
-        return users
+    def clean_dni(self, value) -> str:
+        # spreadsheets store numbers as floats, a bad cell is left for the
+        # validation to report
+        try:
+            return str(int(value)).strip()
+        except (TypeError, ValueError):
+            return str(value).strip()
 
     def make_username(self, dni: str, name: str) -> str:
         prefix_dni = str(dni[::-5])
@@ -70,19 +77,152 @@ class ExcelUserParser:
 
 class UsersBulkCreate:
     """
-    Class performs a `Model.objects.bulk_create()` operation
-    Raise an Exception if the operation can't be performanced
+    Imports the users of a parsed file in chunks:
+
+    - Every row is validated on its own, an invalid row is reported with its
+      errors and the rest of the file is still imported.
+    - `dni`, `email` and `referral_code` uniqueness is checked with one
+      `__in` query per field and chunk, plus the values already seen in the
+      file.
+    - Passwords are hashed on a process pool (`USERS_IMPORT_HASH_WORKERS`),
+      PBKDF2 is CPU bound and the GIL would serialize it on threads.
+    - Each chunk is inserted with `bulk_create` and committed on its own.
     """
 
-    @classmethod
-    def execute(cls, users_data: list[dict]) -> dict:
-        serializer = BulkCreateUserSerializer(data=users_data, many=True)
-
-        serializer.is_valid(raise_exception=True)
-
-        users = [User(**data) for data in serializer.validated_data]
-
-        with transaction.atomic():
-            User.objects.bulk_create(users)
-
-        return {"created": len(users)}
+    def __init__(
+        self, chunk_size: int = None, workers: int = None, on_chunk=None
+    ) -> None:
+        self.chunk_size = chunk_size or settings.USERS_IMPORT_CHUNK_SIZE
+        # optional callable(rows read) called as each chunk starts, the file
+        # is streamed and has no known total
+        self.on_chunk = on_chunk
+        self.workers = workers or settings.USERS_IMPORT_HASH_WORKERS
+        self.serializer = BulkCreateUserSerializer()
+        self.seen = {field: set() for field in UNIQUE_FIELDS}
+        self.errors = []
+
+    def execute(self, users_data: Iterable[dict]) -> dict:
+        started = time.perf_counter()
+        rows = created = 0
+
+        pool = None
+        if self.workers > 1:
+            # the jobs worker runs threads, forking it is not safe
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        try:
+            for index, chunk in enumerate(batched(users_data, self.chunk_size)):
+                rows += len(chunk)
+                if self.on_chunk:
+                    self.on_chunk(rows)
+                valid = self._validate(chunk, index * self.chunk_size)
+                if not valid:
+                    continue
+
+                passwords = [data["password"] for _, data in valid]
+                if pool and len(passwords) > 1:
+                    hashes = pool.map(
+                        make_password,
+                        passwords,
+                        chunksize=max(len(passwords) // (self.workers * 4), 1),
+                    )
+                else:
+                    hashes = map(make_password, passwords)
+                for (_, data), hashed in zip(valid, hashes):
+                    data["password"] = hashed
+
+                created += self._insert(valid)
+        finally:
+            if pool:
+                pool.shutdown()
+
+        if created:
+            # bulk_create doesn't send post_save
+            invalidate_dashboard_metrics()
+
+        elapsed = time.perf_counter() - started
+        return {
+            "created": created,
+            "rows": rows,
+            "errors": self.errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed else rows,
+        }
+
+    def _validate(self, chunk, offset) -> list:
+        """
+        [(row number, validated data)] of the rows of a chunk that can be
+        inserted, the others are added to the errors.
+        """
+        checked = []
+        for position, data in enumerate(chunk, start=offset + 1):
+            row = data.get("row", position)
+            try:
+                data = self.serializer.run_validation(data)
+            except serializers.ValidationError as e:
+                self._error(row, e.detail)
+                continue
+            # bulk_create skips User.save(), which fills it in
+            if not data.get("referral_code"):
+                data["referral_code"] = ExcelUserParser().get_referral_code()
+            checked.append((row, data))
+
+        existing = {
+            field: set(
+                User.objects.filter(
+                    **{f"{field}__in": [data[field] for _, data in checked]}
+                ).values_list(field, flat=True)
+            )
+            for field in UNIQUE_FIELDS
+        }
+
+        valid = []
+        for row, data in checked:
+            errors = {}
+            for field in UNIQUE_FIELDS:
+                value = data[field]
+                if value in existing[field]:
+                    errors[field] = [f"A user with this {field} already exists."]
+                elif value in self.seen[field]:
+                    errors[field] = [f"Repeated {field} in the file."]
+            if errors:
+                self._error(row, errors)
+                continue
+            for field in UNIQUE_FIELDS:
+                self.seen[field].add(data[field])
+            valid.append((row, data))
+        return valid
+
+    def _insert(self, valid) -> int:
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([User(**data) for _, data in valid])
+            return len(valid)
+        except IntegrityError:
+            # a user created meanwhile, find the row one by one
+            pass
+
+        created = 0
+        for row, data in valid:
+            try:
+                with transaction.atomic():
+                    User.objects.bulk_create([User(**data)])
+                created += 1
+            except IntegrityError as e:
+                self._error(row, {"non_field_errors": [str(e)]})
+        return created
+
+    def _error(self, row, detail) -> None:
+        if not isinstance(detail, dict):
+            detail = {"non_field_errors": detail}
+        self.errors.append(
+            {
+                "row": row,
+                "errors": {
+                    field: [str(message) for message in messages]
+                    for field, messages in detail.items()
+                },
+            }
+        )
@@ -0,0 +1,207 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders.models import Order
+from shipments.models import DeliveryAddress
+from users.models import ReferralDiscount, User
+from users.serializers import UserSerializer
+from users.services.handle_excel_file import ExcelUserParser, UsersBulkCreate
+from users.services.user_counters import with_user_counters
+
+
+class AdminDashboardMetricsTest(TestCase):
+    url = "/api/v2/users/data/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@test.com", dni="1", role="admin"
+        )
+        cls.clients = [
+            User.objects.create_user(
+                username=f"client{i}",
+                email=f"client{i}@test.com",
+                dni=f"10{i}",
+                role="client",
+            )
+            for i in range(3)
+        ]
+        for i, client in enumerate(cls.clients):
+            Order.objects.create(id=f"O{i}", user=client, total=1000)
+
+        # one order from the previous month and one older customer
+        last_month = timezone.localdate().replace(day=1) - timedelta(days=1)
+        Order.objects.filter(pk="O0").update(
+            created_at=timezone.make_aware(datetime.combine(last_month, time.min))
+        )
+        User.objects.filter(pk="100").update(
+            date_joined=timezone.now() - timedelta(days=62)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["user"]
+
+    def test_metrics_are_aggregated_per_table(self):
+        with self.assertNumQueries(6):
+            data = self._get()
+
+        self.assertEqual(
+            (
+                data["orders"]["current"],
+                data["orders"]["previous"],
+                data["orders"]["total"],
+            ),
+            (2, 1, 3),
+        )
+        self.assertEqual(
+            (data["revenue"]["current"], data["revenue"]["total"]), (2000, 3000)
+        )
+        self.assertEqual(
+            (data["customers"]["current"], data["customers"]["total"]), (2, 3)
+        )
+
+        # orders, revenue and customers come from the cache now
+        with self.assertNumQueries(4):
+            self._get()
+
+    def test_new_orders_invalidate_the_metrics(self):
+        self._get()
+        Order.objects.create(id="O9", user=self.clients[1], total=500)
+
+        data = self._get()
+        self.assertEqual(data["orders"]["current"], 3)
+        self.assertEqual(data["revenue"]["current"], 2500)
+
+
+class UserCountersTest(TestCase):
+    url = "/api/v2/dashboard/customers/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@test.com", dni="1", role="admin"
+        )
+        expires_at = timezone.now() + timedelta(days=30)
+        for i in range(4):
+            customer = User.objects.create_user(
+                username=f"customer{i}",
+                email=f"customer{i}@test.com",
+                dni=f"20{i}",
+                role="customer",
+            )
+            for j in range(i):
+                Order.objects.create(id=f"O{i}{j}", user=customer, total=1000)
+            ReferralDiscount.objects.create(
+                user=customer, has_discount=bool(i % 2), expires_at=expires_at
+            )
+            DeliveryAddress.objects.create(
+                customer=customer, zip_code="110111", quarter="Q", recipient="R"
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_counters_match_the_per_user_queries(self):
+        annotated = {
+            user.pk: UserSerializer(user).data
+            for user in with_user_counters(User.objects.filter(role="customer"))
+        }
+        for user in User.objects.filter(role="customer"):
+            expected = UserSerializer(user).data
+            self.assertEqual(annotated[user.pk], expected)
+            self.assertEqual(expected["orders"], int(user.dni[-1]))
+
+    def test_customer_list_queries_do_not_grow_with_the_page(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {"limit": 4})
+        self.assertEqual(response.status_code, 200)
+
+        data = {user["dni"]: user for user in response.json()["results"]}
+        self.assertEqual(data["203"]["orders"], 3)
+        self.assertEqual(float(data["203"]["total_spend"]), 3000)
+        self.assertEqual(data["201"]["rewards_counter"], 1)
+        self.assertEqual(data["202"]["rewards_counter"], 0)
+        self.assertEqual(data["202"]["addresses_counter"], 1)
+
+
+class UsersImportTest(TestCase):
+    header = "dni,first_name,last_name,phone,email,role\n"
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username="old", email="old@test.com", dni="500")
+
+    def _file(self, rows):
+        content = self.header + "\n".join(rows) + "\n"
+        return SimpleUploadedFile(
+            "users.csv", content.encode(), content_type="text/csv"
+        )
+
+    def _import(self, rows, **kwargs):
+        users = ExcelUserParser().parse(self._file(rows))
+        return UsersBulkCreate(**kwargs).execute(users)
+
+    def test_invalid_rows_are_reported_and_the_rest_imported(self):
+        result = self._import(
+            [
+                "501,Ana,Ruiz,300,ana@test.com,customer",
+                "502,Beto,Diaz,301,ana@test.com,customer",
+                "500,Carla,Mora,302,carla@test.com,customer",
+                "503,Dario,Paz,303,not-an-email,customer",
+                "504,Eva,Sol,304,eva@test.com,",
+                "501,Fer,Gil,305,fer@test.com,customer",
+            ],
+            chunk_size=2,
+            workers=1,
+        )
+
+        self.assertEqual((result["created"], result["rows"]), (2, 6))
+        errors = {error["row"]: error["errors"] for error in result["errors"]}
+        self.assertEqual(sorted(errors), [3, 4, 5, 7])
+        self.assertIn("email", errors[3])
+        self.assertIn("dni", errors[4])
+        self.assertIn("email", errors[5])
+        self.assertIn("dni", errors[7])
+
+        eva = User.objects.get(pk="504")
+        self.assertEqual(eva.role, "customer")
+        self.assertTrue(eva.referral_code)
+        self.assertTrue(check_password("504", eva.password))
+
+    @override_settings(
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+    )
+    def test_queries_do_not_grow_with_the_rows(self):
+        rows = [f"6{i:02},User,{i},3{i:02},user{i}@test.com,customer" for i in range(40)]
+
+        # per chunk: 3 uniqueness checks and the insert (with its savepoint)
+        with self.assertNumQueries(4 * 3):
+            result = self._import(rows, chunk_size=20, workers=1)
+
+        self.assertEqual(result["created"], 40)
+        self.assertEqual(result["errors"], [])
+
+    def test_passwords_are_hashed_on_a_process_pool(self):
+        result = self._import(
+            [f"70{i},User,{i},300,pool{i}@test.com,customer" for i in range(3)],
+            workers=2,
+        )
+
+        self.assertEqual(result["created"], 3)
+        for user in User.objects.filter(email__startswith="pool"):
+            self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+            self.assertTrue(check_password(user.dni, user.password))
@@ -1,9 +1,7 @@
 import datetime
 
-from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from rest_framework import status, generics
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
@@ -27,6 +25,10 @@ from .serializers import (
 
 
 from users.services.handle_excel_file import ExcelUserParser, UsersBulkCreate
+from users.services.user_counters import with_user_counters
+from emails.services.outbox import queue_email
+from jobs.services.job_queue import enqueue, save_upload
+from jobs.views import is_async_request, job_accepted_response
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
@@ -215,7 +217,7 @@ class UserDetailsView(APIView):
                 {"message": "User ID is required"}, status=status.HTTP_400_BAD_REQUEST
             )
         try:
-            user = User.objects.get(pk=user_id)
+            user = with_user_counters(User.objects.all()).get(pk=user_id)
             serializer = UserSerializer(user, many=False)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except User.DoesNotExist:
@@ -236,7 +238,7 @@ class ClientUserListView(APIView):
 
     def get(self, request):
         try:
-            queryset = User.objects.filter(role="customer")
+            queryset = with_user_counters(User.objects.filter(role="customer"))
             paginator = LimitOffsetPagination()
             paginated_queryset = paginator.paginate_queryset(queryset, request)
             serializer = UserSerializer(paginated_queryset, many=True)
@@ -368,22 +370,15 @@ class NewsletterSubscriptionView(APIView):
             "year": datetime.datetime.now().year,
         }
 
-        html_content = render_to_string("email/newsletter-subscription.html", context)
-        text_content = strip_tags(html_content)
-
         try:
-            email_msg = EmailMultiAlternatives(
-                subject,
-                text_content,
-                "no-reply@avoberry.com",
-                [email],
-            )
-            email_msg.attach_alternative(html_content, "text/html")
-            email_msg.send()
-
             serializer = NewsletterSubscriptionSerializer(data=request.data)
             if serializer.is_valid():
-                serializer.save()
+                with transaction.atomic():
+                    serializer.save()
+                    # sent by the jobs worker, see emails.services.outbox
+                    queue_email(
+                        subject, email, context, "email/newsletter-subscription.html"
+                    )
                 return Response(
                     {
                         "message": "Subscription successful. Check your email for more details.."
@@ -433,9 +428,13 @@ class UserUploadFileAPIView(APIView):
         serializer.is_valid(raise_exception=True)
         file = request.data.get("file")
 
+        if is_async_request(request):
+            job = enqueue("users.import", {"file": save_upload(file)}, user=request.user)
+            return job_accepted_response(request, job)
+
         # lets to create a user by any register inside the xlsx file
 
         service = ExcelUserParser()
         result = service.parse(file)
-        response = UsersBulkCreate.execute(result)
+        response = UsersBulkCreate().execute(result)
         return Response(response, status=status.HTTP_201_CREATED)
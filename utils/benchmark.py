@@ -0,0 +1,267 @@
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders.models import Order
+from products.models import Category, Product
+from products.services.catalog_cache import bump_catalog_version
+from salesreport.services.analytics_snapshot import AnalyticsSnapshotService
+from users.models import User
+from utils.stats import percentiles
+from utils.synthetic_data import SYNTHETIC_PREFIX
+
+
+@dataclass
+class Scenario:
+    """
+    One endpoint call of the benchmark.
+    `data` and `setup` are called before every request.
+    """
+
+    name: str
+    path: str
+    method: str = "get"
+    data: Callable = None
+    setup: Callable = None
+    expected_status: tuple = (200,)
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: list = field(default_factory=list)  # ms
+    queries: list = field(default_factory=list)
+    peak_memory: list = field(default_factory=list)  # KiB
+    response_bytes: list = field(default_factory=list)
+    errors: dict = field(default_factory=dict)  # status code -> count
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "latency_ms": percentiles(self.latencies)
+            | {"mean": round(statistics.fmean(self.latencies), 2)},
+            "queries": percentiles(self.queries),
+            "peak_memory_kib": percentiles(self.peak_memory),
+            "response_bytes": percentiles(self.response_bytes),
+        }
+
+
+class BenchmarkRunner:
+    """
+    Drives the main API endpoints through the test client over the current
+    database (usually seeded by `SyntheticDataGenerator`) and reports latency
+    percentiles, queries per request and peak Python memory per request.
+
+    Latency and queries are measured over `iterations` requests, memory over
+    a separate, shorter pass because tracemalloc slows the requests down.
+
+    The requests use their own local memory caches, so the pages, snapshots
+    and metrics of the benchmark data never reach the shared cache of the
+    running site.
+    """
+
+    def __init__(self, iterations=20, warmup=2, memory_iterations=3):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.memory_iterations = memory_iterations
+        self.client = APIClient()
+
+    def run(self, scenarios=None, only=None) -> dict:
+        self.admin = self._get_admin()
+        self.client.force_authenticate(self.admin)
+        scenarios = scenarios or self.default_scenarios()
+        if only:
+            scenarios = [scenario for scenario in scenarios if scenario.name in only]
+
+        started = time.perf_counter()
+        # the carts of the site live in the shared cache, write them through
+        with override_settings(CACHES=self._caches(), CART_WRITE_BEHIND=False):
+            # nothing left from an earlier run in this process
+            for alias in settings.CACHES:
+                caches[alias].clear()
+            results = {
+                scenario.name: self.run_scenario(scenario) for scenario in scenarios
+            }
+
+        return {
+            "meta": self.meta(time.perf_counter() - started),
+            "scenarios": {name: result.as_dict() for name, result in results.items()},
+        }
+
+    def run_scenario(self, scenario: Scenario) -> ScenarioResult:
+        result = ScenarioResult(scenario.name)
+
+        for _ in range(self.warmup):
+            self._request(scenario)
+
+        for _ in range(self.iterations):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = self._request(scenario)
+                elapsed = time.perf_counter() - started
+
+            result.latencies.append(elapsed * 1000)
+            result.queries.append(len(queries.captured_queries))
+            result.response_bytes.append(len(response.content))
+            if response.status_code not in scenario.expected_status:
+                code = str(response.status_code)
+                result.errors[code] = result.errors.get(code, 0) + 1
+
+        tracemalloc.start()
+        try:
+            for _ in range(self.memory_iterations):
+                tracemalloc.reset_peak()
+                self._request(scenario)
+                result.peak_memory.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+
+        return result
+
+    def _request(self, scenario: Scenario):
+        if scenario.setup:
+            scenario.setup()
+        data = scenario.data() if scenario.data else None
+        if scenario.method == "get":
+            return self.client.get(scenario.path, data)
+        return getattr(self.client, scenario.method)(scenario.path, data, format="json")
+
+    def default_scenarios(self) -> list:
+        today = timezone.localdate()
+        category = Category.objects.values_list("id", flat=True).first()
+        skus = list(Product.objects.values_list("sku", flat=True)[:50])
+        customers = list(
+            User.objects.filter(is_superuser=False).values_list("pk", flat=True)[:50]
+        )
+        order_id = Order.objects.values_list("pk", flat=True).first()
+        report = {
+            "start_date": today - timedelta(days=365),
+            "end_date": today,
+        }
+        counter = iter(range(10**9))
+
+        def order_payload():
+            # a different customer and basket on every request
+            index = next(counter)
+            return {
+                "client": customers[index % len(customers)],
+                "is_paid": False,
+                "order_items": [
+                    {"sku": skus[(index + i) % len(skus)], "quantity": 1, "price": 1000}
+                    for i in range(3)
+                ],
+            }
+
+        catalog = [
+            ("products_list", "/api/v2/products/list/?limit=20"),
+            ("products_filter", f"/api/v2/products/filter/?category={category}"),
+            ("products_search", "/api/v2/products/filter/?q=producto"),
+        ]
+        # warm: served by the catalog cache, cold: a catalog change before
+        # every request, the queries behind the cache
+        scenarios = [Scenario(name, path) for name, path in catalog] + [
+            Scenario(f"{name}_cold", path, setup=bump_catalog_version)
+            for name, path in catalog
+        ]
+        scenarios += [
+            Scenario("orders_list", "/api/v2/dashboard/orders/?limit=20"),
+            Scenario(
+                "reports_sales_month",
+                "/api/v2/reports/",
+                data=lambda: {"type": "sales", "group_by": "month", **report},
+            ),
+            Scenario(
+                "reports_stock_day",
+                "/api/v2/reports/",
+                data=lambda: {"type": "stock", "group_by": "day", **report},
+            ),
+            Scenario("analytics", "/api/v2/dashboard/analytics/"),
+            Scenario(
+                "analytics_cold",
+                "/api/v2/dashboard/analytics/",
+                setup=lambda: AnalyticsSnapshotService().invalidate(),
+            ),
+            Scenario("admin_dashboard", "/api/v2/users/data/"),
+        ]
+        if order_id:
+            scenarios.append(
+                Scenario(
+                    "order_details",
+                    f"/api/v2/dashboard/orders/details/?order={order_id}",
+                )
+            )
+        if skus and customers:
+            scenarios.append(
+                Scenario(
+                    "order_create",
+                    "/api/v2/dashboard/orders/create/",
+                    method="post",
+                    data=order_payload,
+                    expected_status=(201,),
+                )
+            )
+        return scenarios
+
+    def meta(self, elapsed: float) -> dict:
+        return {
+            "commit": self._git_commit(),
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "iterations": self.iterations,
+            "warmup": self.warmup,
+            "elapsed_seconds": round(elapsed, 2),
+            "dataset": {
+                "products": Product.objects.count(),
+                "users": User.objects.count(),
+                "orders": Order.objects.count(),
+            },
+        }
+
+    def _caches(self) -> dict:
+        return {
+            alias: {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": f"benchmark-{alias}",
+            }
+            for alias in settings.CACHES
+        }
+
+    def _get_admin(self):
+        admin, _ = User.objects.get_or_create(
+            dni=f"{SYNTHETIC_PREFIX}-ADMIN",
+            defaults={
+                "email": "synthetic-admin@example.com",
+                "username": "synthetic-admin",
+                "referral_code": f"{SYNTHETIC_PREFIX}-ADMIN",
+                "is_staff": True,
+                "is_superuser": True,
+            },
+        )
+        return admin
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
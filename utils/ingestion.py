@@ -0,0 +1,92 @@
+import csv
+import io
+import os
+from itertools import islice
+
+from openpyxl import load_workbook
+
+CSV_EXTENSIONS = (".csv",)
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def is_csv(file) -> bool:
+    name = getattr(file, "name", "") or ""
+    content_type = getattr(file, "content_type", "") or ""
+    return name.lower().endswith(CSV_EXTENSIONS) or content_type in CSV_CONTENT_TYPES
+
+
+def get_source(file):
+    """
+    Returns the temp path of a `TemporaryUploadedFile`, otherwise the file
+    handle itself, rewound. The upload is never copied into a new buffer.
+    """
+    if hasattr(file, "temporary_file_path"):
+        return file.temporary_file_path()
+    file.seek(0)
+    return file
+
+
+def iter_rows(file, sheet: str = None, min_row: int = 2):
+    """
+    Yields the rows of an uploaded `.xlsx` or `.csv` file as tuples, lazily.
+
+    - xlsx: openpyxl read-only mode, `sheet` defaults to the active one.
+    - csv: `sheet` is ignored, empty cells are returned as `None`.
+    - min_row: first row to yield, 2 skips the header.
+    """
+    if is_csv(file):
+        yield from _iter_csv_rows(file, min_row)
+    else:
+        yield from _iter_xlsx_rows(file, sheet, min_row)
+
+
+def _iter_xlsx_rows(file, sheet, min_row):
+    workbook = load_workbook(filename=get_source(file), read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        yield from worksheet.iter_rows(min_row=min_row, values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_csv_rows(file, min_row):
+    source = get_source(file)
+    owns_stream = isinstance(source, (str, os.PathLike))
+    if owns_stream:
+        stream = open(source, newline="", encoding="utf-8-sig")
+    else:
+        # uploaded files are binary, decode them on the fly
+        stream = io.TextIOWrapper(
+            getattr(source, "file", source), newline="", encoding="utf-8-sig"
+        )
+
+    try:
+        reader = csv.reader(stream)
+        for row in islice(reader, min_row - 1, None):
+            yield tuple(cell if cell != "" else None for cell in row)
+    finally:
+        if owns_stream:
+            stream.close()
+        else:
+            # don't close the uploaded file along with the wrapper
+            stream.detach()
+
+
+def batched(iterable, size: int = DEFAULT_BATCH_SIZE):
+    """
+    Groups an iterable in lists of `size` items, the last one may be shorter.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def parse_bool(value) -> bool:
+    """
+    Reads a boolean cell: xlsx gives real booleans, csv gives text.
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "si", "sí", "x")
+    return bool(value)
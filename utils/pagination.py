@@ -0,0 +1,182 @@
+import base64
+import datetime
+import json
+from functools import reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Keeps the microseconds `DjangoJSONEncoder` cuts to milliseconds, the seek
+    filter would skip the rows between the cut value and the real one.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a stable ordering.
+
+    Instead of `OFFSET n` the next page is requested with an opaque cursor that
+    holds the ordering values of the last row sent, so every page costs the same
+    whatever its depth, and no `COUNT(*)` query is issued.
+
+    - ordering: field names, prefixed with `-` for descending order.
+      The last field must be unique (`id`, `sku`) to break ties.
+    - NULL values are always sorted last.
+
+    Query params: `cursor` and `limit`.
+    """
+
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+    mode_query_param = "pagination"
+    max_limit = 100
+
+    def __init__(self, ordering) -> None:
+        self.ordering = tuple(ordering)
+        self.default_limit = settings.REST_FRAMEWORK.get("PAGE_SIZE", 10)
+
+    @classmethod
+    def is_requested(cls, request) -> bool:
+        params = request.query_params
+        return (
+            cls.cursor_query_param in params
+            or params.get(cls.mode_query_param) == "keyset"
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.model = queryset.model
+        queryset = queryset.order_by(*self._get_order_by())
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self._get_seek_filter(cursor))
+
+        results = list(queryset[: self.limit + 1])
+        self.has_next = len(results) > self.limit
+        self.page = results[: self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_limit(self, request) -> int:
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [getattr(last, field.lstrip("-")) for field in self.ordering]
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(values)
+        )
+
+    def encode_cursor(self, values) -> str:
+        raw = json.dumps(values, cls=CursorEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound("Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound("Invalid cursor")
+        try:
+            return [
+                self._get_field(field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except ValidationError:
+            raise NotFound("Invalid cursor")
+
+    def _get_field(self, field):
+        return self.model._meta.get_field(field.lstrip("-"))
+
+    def _get_order_by(self):
+        order_by = []
+        for field in self.ordering:
+            if field.startswith("-"):
+                order_by.append(F(field[1:]).desc(nulls_last=True))
+            else:
+                order_by.append(F(field).asc(nulls_last=True))
+        return order_by
+
+    def _get_seek_filter(self, values) -> Q:
+        """
+        Builds `(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...` honoring the
+        direction of every key and the NULLS LAST ordering.
+        """
+        branches = []
+        for position, field in enumerate(self.ordering):
+            equals = [
+                self._equals(self.ordering[i], values[i]) for i in range(position)
+            ]
+            branches.append(
+                reduce(and_, equals + [self._after(field, values[position])])
+            )
+        return reduce(or_, branches)
+
+    def _equals(self, field, value) -> Q:
+        name = field.lstrip("-")
+        if value is None:
+            return Q(**{f"{name}__isnull": True})
+        return Q(**{name: value})
+
+    def _after(self, field, value) -> Q:
+        name = field.lstrip("-")
+        if value is None:
+            # nothing is sorted after NULL values
+            return Q(pk__in=[])
+        lookup = "lt" if field.startswith("-") else "gt"
+        after = Q(**{f"{name}__{lookup}": value})
+        if self._get_field(field).null:
+            after |= Q(**{f"{name}__isnull": True})
+        return after
+
+
+def get_list_paginator(request, ordering):
+    """
+    Returns a `KeysetPagination` when the client asks for it
+    (`?pagination=keyset` or a `cursor` param), otherwise the default
+    `LimitOffsetPagination` so offset clients keep working.
+    """
+    if KeysetPagination.is_requested(request):
+        return KeysetPagination(ordering)
+    return LimitOffsetPagination()
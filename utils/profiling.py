@@ -0,0 +1,231 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from utils.stats import percentiles
+
+logger = logging.getLogger(__name__)
+
+# the profile of the request being handled by the current thread/task
+_current = ContextVar("request_profile", default=None)
+
+_NUMBERS = re.compile(r"\b\d+\b")
+_IN_LISTS = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Normalizes a query so the repetitions of an N+1 share the same print:
+    inlined numbers and `IN (...)` lists of any length are collapsed.
+    """
+    sql = _IN_LISTS.sub("(%s, ...)", sql)
+    return _NUMBERS.sub("N", sql)
+
+
+class RequestProfile:
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    # connection.execute_wrapper() hook
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self, threshold: int) -> dict:
+        return {
+            sql: count
+            for sql, count in self.fingerprints.most_common()
+            if count >= threshold
+        }
+
+
+def _timed_data(prop):
+    """
+    Wraps `Serializer.data` to add the time spent serializing to the current
+    request profile. Nested serializers only count once, through the outer one.
+    """
+
+    def data(self):
+        profile = _current.get()
+        if profile is None:
+            return prop.fget(self)
+
+        profile.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return prop.fget(self)
+        finally:
+            profile.serializer_depth -= 1
+            if not profile.serializer_depth:
+                profile.serializer_time += time.perf_counter() - started
+
+    return property(data)
+
+
+_instrumented = False
+
+
+def _instrument_serializers() -> None:
+    global _instrumented
+    if _instrumented:
+        return
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        cls.data = _timed_data(cls.data)
+    _instrumented = True
+
+
+class ProfilingStats:
+    """
+    Rolling window of the last `PROFILING_WINDOW` requests of every endpoint,
+    kept in the memory of each worker process.
+    """
+
+    METRICS = ("queries", "db_ms", "serializer_ms", "total_ms", "response_bytes")
+
+    def __init__(self, window: int = 500) -> None:
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+        self.duplicates = defaultdict(Counter)
+
+    def record(self, endpoint: str, sample: dict, duplicates: dict) -> None:
+        with self.lock:
+            self.samples[endpoint].append(sample)
+            self.duplicates[endpoint].update(duplicates)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.samples.clear()
+            self.duplicates.clear()
+
+    def summary(self) -> dict:
+        with self.lock:
+            snapshot = {
+                endpoint: (list(samples), self.duplicates[endpoint].most_common(5))
+                for endpoint, samples in self.samples.items()
+            }
+
+        return {
+            endpoint: {
+                "requests": len(samples),
+                **{
+                    metric: percentiles([s[metric] for s in samples])
+                    for metric in self.METRICS
+                },
+                "top_duplicates": [
+                    {"sql": sql, "count": count} for sql, count in duplicates
+                ],
+            }
+            for endpoint, (samples, duplicates) in sorted(snapshot.items())
+        }
+
+
+profiling_stats = ProfilingStats(getattr(settings, "PROFILING_WINDOW", 500))
+
+
+class QueryProfilingMiddleware:
+    """
+    Opt-in (`PROFILING_ENABLED`) per request profiling: SQL query count and
+    time, repeated query fingerprints (N+1), serializer time, total time and
+    response size, aggregated per endpoint in `profiling_stats`.
+
+    Requests over `PROFILING_QUERY_BUDGET` queries are logged along with
+    their repeated queries. Views don't need any change.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.budget = getattr(settings, "PROFILING_QUERY_BUDGET", 0)
+        self.duplicate_threshold = getattr(settings, "PROFILING_DUPLICATE_THRESHOLD", 3)
+        _instrument_serializers()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            with self._wrap_connections(profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_time = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return response
+
+        endpoint = f"{request.method} {match.url_name or match.route}"
+        duplicates = profile.duplicates(self.duplicate_threshold)
+        sample = {
+            "queries": profile.queries,
+            "db_ms": profile.db_time * 1000,
+            "serializer_ms": profile.serializer_time * 1000,
+            "total_ms": total_time * 1000,
+            "response_bytes": (
+                0 if response.streaming else len(getattr(response, "content", b""))
+            ),
+        }
+        profiling_stats.record(endpoint, sample, duplicates)
+
+        if self.budget and profile.queries > self.budget:
+            logger.warning(
+                "%s ran %s queries (budget %s) in %.1fms, repeated: %s",
+                endpoint,
+                profile.queries,
+                self.budget,
+                sample["db_ms"],
+                duplicates,
+            )
+        return response
+
+    def _wrap_connections(self, profile):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(profile))
+        return stack
+
+
+class ProfilingStatsAPIView(APIView):
+    """
+    Rolling percentiles of the profiled endpoints of this worker process.
+    DELETE clears them.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {
+                "enabled": getattr(settings, "PROFILING_ENABLED", False),
+                "query_budget": getattr(settings, "PROFILING_QUERY_BUDGET", 0),
+                "endpoints": profiling_stats.summary(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def delete(self, request):
+        profiling_stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,12 @@
+def percentiles(values) -> dict:
+    """
+    p50/p90/p99/max of a list of numbers (nearest rank).
+    """
+    values = sorted(values)
+    if not values:
+        return {}
+    last = len(values) - 1
+    return {
+        name: round(values[min(last, int(round(last * q)))], 2)
+        for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+    } | {"max": round(values[-1], 2)}
@@ -0,0 +1,229 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from orders.models import Order, OrderProduct, StockMovement
+from payments.models import Payment
+from products.models import Category, Product
+from purchases.models import Purchase, PurchaseItem
+from reviews.models import ProductReview
+from users.models import User
+
+SYNTHETIC_PREFIX = "SYN"
+# far above real Mercado Pago ids
+SYNTHETIC_PAYMENT_ID = 9_000_000_000_000
+
+
+class SyntheticDataGenerator:
+    """
+    Seeds a large synthetic dataset (categories, products, users, orders,
+    order items, stock movements, payments, reviews and purchases) with
+    `bulk_create`.
+
+    - Every primary key starts with `SYN` so the rows are easy to spot.
+    - Dates are spread over the last `days` days.
+    - The generator is deterministic for a given `seed`.
+    """
+
+    ORDER_STATUSES = [status for status, _ in Order.STATUS]
+    PAYMENT_STATUSES = ["APPROVED"] * 8 + ["PENDING", "REJECTED"]
+
+    def __init__(
+        self,
+        products=2000,
+        users=1000,
+        orders=20000,
+        reviews=5000,
+        purchases=500,
+        days=365,
+        batch_size=2000,
+        seed=42,
+    ) -> None:
+        self.products = products
+        self.users = users
+        self.orders = orders
+        self.reviews = reviews
+        self.purchases = purchases
+        self.days = days
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.now = timezone.now()
+
+    def generate(self) -> dict:
+        categories = self._create_categories()
+        products = self._create_products(categories)
+        users = self._create_users()
+        orders = self._create_orders(users)
+        items = self._create_order_products(orders, products)
+        payments = self._create_payments(orders)
+        reviews = self._create_reviews(users, products)
+        purchases, purchase_items = self._create_purchases(products)
+
+        return {
+            "categories": len(categories),
+            "products": len(products),
+            "users": len(users),
+            "orders": len(orders),
+            "order_products": items,
+            "payments": payments,
+            "reviews": reviews,
+            "purchases": purchases,
+            "purchase_items": purchase_items,
+        }
+
+    def _random_date(self):
+        return self.now - timedelta(seconds=self.random.randint(0, self.days * 86400))
+
+    def _create_categories(self):
+        categories = [
+            Category(name=f"{SYNTHETIC_PREFIX} {i}", description="Synthetic")
+            for i in range(20)
+        ]
+        return Category.objects.bulk_create(categories)
+
+    def _create_products(self, categories):
+        products = [
+            Product(
+                sku=f"{SYNTHETIC_PREFIX}{i:07}",
+                name=f"Producto sintético {i}",
+                description="Producto generado para pruebas de rendimiento",
+                price=Decimal(self.random.randint(500, 80000)),
+                stock=self.random.randint(0, 500),
+                category=self.random.choice(categories),
+                recommended=self.random.random() < 0.05,
+                best_seller=self.random.random() < 0.03,
+                quality=self.random.choice(["primera", "segunda", "tercera"]),
+            )
+            for i in range(self.products)
+        ]
+        return Product.objects.bulk_create(products, batch_size=self.batch_size)
+
+    def _create_users(self):
+        users = [
+            User(
+                dni=f"{SYNTHETIC_PREFIX}{i:09}",
+                email=f"synthetic{i}@example.com",
+                username=f"synthetic{i}",
+                password="!",
+                referral_code=f"{SYNTHETIC_PREFIX}-{i:09}",
+                date_joined=self._random_date(),
+            )
+            for i in range(self.users)
+        ]
+        return User.objects.bulk_create(users, batch_size=self.batch_size)
+
+    def _create_orders(self, users):
+        orders = [
+            Order(
+                id=f"{SYNTHETIC_PREFIX}{i:010}",
+                user=self.random.choice(users),
+                status=self.random.choice(self.ORDER_STATUSES),
+                subtotal=0,
+                total=0,
+            )
+            for i in range(self.orders)
+        ]
+        Order.objects.bulk_create(orders, batch_size=self.batch_size)
+
+        # `created_at` is auto_now_add, bulk_update writes the spread dates
+        for order in orders:
+            order.created_at = self._random_date()
+        Order.objects.bulk_update(orders, ["created_at"], batch_size=self.batch_size)
+        return orders
+
+    def _create_order_products(self, orders, products) -> int:
+        items, movements = [], []
+        for order in orders:
+            total = 0
+            for product in self.random.sample(products, self.random.randint(1, 5)):
+                quantity = self.random.randint(1, 10)
+                total += float(product.price) * quantity
+                items.append(
+                    OrderProduct(
+                        order=order,
+                        product=product,
+                        price=float(product.price),
+                        quantity=quantity,
+                    )
+                )
+                movements.append(
+                    StockMovement(
+                        product=product,
+                        movement_type="OUT",
+                        quantity=quantity,
+                        reason="Synthetic order",
+                        related_order=order,
+                    )
+                )
+            order.subtotal = order.total = Decimal(str(round(total, 2)))
+
+        OrderProduct.objects.bulk_create(items, batch_size=self.batch_size)
+        Order.objects.bulk_update(
+            orders, ["subtotal", "total"], batch_size=self.batch_size
+        )
+
+        StockMovement.objects.bulk_create(movements, batch_size=self.batch_size)
+        for movement in movements:
+            movement.created_at = movement.related_order.created_at
+        StockMovement.objects.bulk_update(
+            movements, ["created_at"], batch_size=self.batch_size
+        )
+        return len(items)
+
+    def _create_payments(self, orders) -> int:
+        payments = [
+            Payment(
+                order=order,
+                payment_id=SYNTHETIC_PAYMENT_ID + index,
+                payment_status=self.random.choice(self.PAYMENT_STATUSES),
+                payment_amount=order.total,
+                net_received_amount=order.total,
+                payment_date=order.created_at + timedelta(minutes=5),
+                external_reference=order.id,
+            )
+            for index, order in enumerate(orders)
+            if self.random.random() < 0.7
+        ]
+        Payment.objects.bulk_create(payments, batch_size=self.batch_size)
+        return len(payments)
+
+    def _create_reviews(self, users, products) -> int:
+        if not (users and products):
+            return 0
+        reviews = [
+            ProductReview(
+                user=self.random.choice(users),
+                product=self.random.choice(products),
+                comment="Reseña sintética",
+                rating=self.random.randint(1, 5),
+            )
+            for _ in range(self.reviews)
+        ]
+        ProductReview.objects.bulk_create(reviews, batch_size=self.batch_size)
+        return len(reviews)
+
+    def _create_purchases(self, products) -> tuple:
+        purchases, items = [], []
+        for i in range(self.purchases if products else 0):
+            purchase = Purchase(
+                id=f"{SYNTHETIC_PREFIX}-PURCH-{i:07}",
+                purchase_date=self._random_date(),
+            )
+            total = 0
+            for product in self.random.sample(products, min(len(products), 5)):
+                item = PurchaseItem(
+                    purchase=purchase,
+                    product=product,
+                    quantity=self.random.randint(10, 200),
+                    purchase_price=float(product.price) * 0.7,
+                )
+                total += item.subtotal()
+                items.append(item)
+            purchase.total_amount = round(total, 2)
+            purchases.append(purchase)
+
+        Purchase.objects.bulk_create(purchases, batch_size=self.batch_size)
+        PurchaseItem.objects.bulk_create(items, batch_size=self.batch_size)
+        return len(purchases), len(items)
@@ -0,0 +1,151 @@
+import datetime
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from orders.models import Order
+from products.models import Category, Product
+from products.services.catalog_cache import get_catalog_version
+from salesreport.services.analytics_snapshot import SNAPSHOT_KEY
+from users.models import User
+from utils.benchmark import BenchmarkRunner
+from utils.profiling import RequestProfile, fingerprint, profiling_stats
+from utils.synthetic_data import SyntheticDataGenerator
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_DUPLICATE_THRESHOLD=3)
+class QueryProfilingMiddlewareTest(TestCase):
+    stats_url = "/api/v2/dashboard/profiling/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@test.com", dni="1", role="admin"
+        )
+        category = Category.objects.create(name="Frutas", description="Frutas")
+        for i in range(3):
+            Product.objects.create(
+                sku=f"SKU{i}", name=f"P{i}", description="P", category=category
+            )
+
+    def setUp(self):
+        profiling_stats.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_fingerprint_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s) LIMIT 1"),
+        )
+
+    def test_repeated_queries_are_reported(self):
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            for sku in ("SKU0", "SKU1", "SKU2"):
+                Product.objects.get(sku=sku)
+            Category.objects.count()
+
+        self.assertEqual(profile.queries, 4)
+        self.assertEqual(list(profile.duplicates(3).values()), [3])
+
+    def test_requests_are_aggregated_per_endpoint(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get("/api/v2/users/data/").status_code, 200)
+
+        response = self.client.get(self.stats_url)
+        self.assertEqual(response.status_code, 200)
+
+        endpoints = response.json()["endpoints"]
+        endpoint = next(name for name in endpoints if "users/data" in name)
+        stats = endpoints[endpoint]
+        self.assertEqual(stats["requests"], 3)
+        self.assertGreater(stats["queries"]["p50"], 0)
+        self.assertGreater(stats["response_bytes"]["max"], 0)
+        self.assertIn("p99", stats["serializer_ms"])
+
+    def test_only_the_top_duplicates_are_summarized(self):
+        sample = dict.fromkeys(profiling_stats.METRICS, 0)
+        for n in range(7):
+            profiling_stats.record("GET x", sample, {f"SELECT {n}": n + 1})
+
+        duplicates = profiling_stats.summary()["GET x"]["top_duplicates"]
+        self.assertEqual(
+            [d["sql"] for d in duplicates], [f"SELECT {n}" for n in range(6, 1, -1)]
+        )
+        self.assertEqual(duplicates[0]["count"], 7)
+
+    def test_stats_are_admin_only(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.stats_url).status_code, 401)
+
+
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@test.com", dni="1", role="admin"
+        )
+        created_at = datetime.datetime(2026, 1, 1, 10, 0, 0, 500000, datetime.UTC)
+        for i in range(4):
+            Order.objects.create(id=f"O{i}", user=cls.admin)
+            # every order in the same millisecond
+            Order.objects.filter(id=f"O{i}").update(
+                created_at=created_at + datetime.timedelta(microseconds=i * 100)
+            )
+
+    def test_pages_keep_sub_millisecond_ties(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        ids = []
+        url = "/api/v2/dashboard/orders/?pagination=keyset&limit=1"
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [order["id"] for order in response.json()["results"]]
+            url = response.json()["next"]
+
+        self.assertEqual(ids, ["O3", "O2", "O1", "O0"])
+
+    def test_malformed_cursors_are_not_found(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        for url in (
+            "/api/v2/dashboard/orders/?cursor=not-a-cursor",
+            "/api/v2/products/list/?cursor=not-a-cursor",
+            "/api/v2/dashboard/products/?cursor=not-a-cursor",
+        ):
+            response = client.get(url)
+            self.assertEqual(response.status_code, 404, url)
+            self.assertEqual(response.json()["detail"], "Invalid cursor", url)
+
+
+class BenchmarkRunnerTest(TestCase):
+    def test_every_scenario_runs_on_a_synthetic_dataset(self):
+        SyntheticDataGenerator(
+            products=20, users=10, orders=30, reviews=10, purchases=2
+        ).generate()
+
+        cache.set("carts:1", {"items": {"SKU": 1}})
+        version = get_catalog_version()
+
+        report = BenchmarkRunner(iterations=1, warmup=1, memory_iterations=1).run()
+
+        self.assertEqual(report["meta"]["dataset"]["products"], 20)
+        self.assertIn("order_create", report["scenarios"])
+        for name, result in report["scenarios"].items():
+            self.assertEqual(result["errors"], {}, name)
+            self.assertEqual(result["requests"], 1, name)
+
+        scenarios = report["scenarios"]
+        self.assertEqual(scenarios["products_list"]["queries"]["max"], 0)
+        self.assertGreater(scenarios["products_list_cold"]["queries"]["max"], 0)
+        self.assertGreater(scenarios["analytics_cold"]["queries"]["max"], 0)
+        # the benchmark runs on its own cache, the site's is left alone
+        self.assertEqual(cache.get("carts:1"), {"items": {"SKU": 1}})
+        self.assertEqual(get_catalog_version(), version)
+        self.assertIsNone(cache.get(SNAPSHOT_KEY))
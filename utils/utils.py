@@ -1,10 +1,8 @@
-from django.core.mail import EmailMultiAlternatives
 from django.db.models import Sum
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from rest_framework import status
 from rest_framework.response import Response
 
+from emails.services.outbox import queue_email
 from orders.models import OrderProduct, Order
 from users.models import UserProfileSettings, User
 
@@ -18,32 +16,22 @@ def send_email(
     success_message: str = "Email sent successfully",
 ):
     """
-    Prepares and sends an HTML email to a given recipient.
+    Queues an HTML email to a given recipient in the outbox, the jobs worker
+    renders and sends it (see `emails.services.outbox`).
 
     Args:
         subject (str): The subject line of the email.
         email (str): The recipient's email address.
         recipient_list (list): Not used in this function. (Consider removing if unnecessary).
-        context (dict): Context data to render the email template.
+        context (dict): JSON serializable context data to render the email template.
         template_url (str, optional): Path to the HTML template used for the email body. Defaults to 'email/newsletter-subscription.html'.
-        success_message (str, optional): Message returned in the response upon successful email delivery. Defaults to 'Email sent successfully'.
+        success_message (str, optional): Message returned in the response once the email is queued. Defaults to 'Email sent successfully'.
 
     Returns:
         Response: A DRF Response object indicating success or failure with an appropriate message.
     """
-    html_content = render_to_string(template_url, context)
-    text_content = strip_tags(html_content)
-
     try:
-        email_msg = EmailMultiAlternatives(
-            subject=subject,
-            body=text_content,
-            from_email="no-reply@avoberry.com",
-            to=[email],
-        )
-        email_msg.attach_alternative(html_content, "text/html")
-        email_msg.send()
-
+        queue_email(subject, email, context, template_url)
         return Response({"message": success_message}, status=status.HTTP_200_OK)
 
     except Exception as e: